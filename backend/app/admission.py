@@ -0,0 +1,249 @@
+"""
+Admission control: per-client rate limits, per-route concurrency limits
+and load shedding on routes whose upstreams are slow
+"""
+
+import logging
+import math
+import random
+import sys
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from app.config import settings
+from app.metrics import Counter, Gauge, UPSTREAM_LATENCY_EWMA, register
+
+logger = logging.getLogger(__name__)
+
+ADMISSION_REJECTED = register(Counter(
+    "admission_rejected_total", "Requests refused by admission control", ("reason", "rule")
+))
+ADMISSION_IN_FLIGHT = register(Gauge(
+    "admission_in_flight", "Requests in flight per concurrency-limited route", ("rule",)
+))
+ADMISSION_SHED_PROBABILITY = register(Gauge(
+    "admission_shed_probability", "Share of requests shed per upstream", ("upstream",)
+))
+
+# How long a computed shed probability is reused before it is recomputed
+SHED_REFRESH = 0.1
+
+def parse_rules(spec: str) -> List[Tuple[str, str]]:
+    """Parse "prefix=value,prefix=value", longest prefix first"""
+    rules = []
+    for item in spec.split(","):
+        prefix, _, value = item.strip().partition("=")
+        if prefix and value:
+            rules.append((prefix.strip(), value.strip()))
+    return sorted(rules, key=lambda rule: len(rule[0]), reverse=True)
+
+def match(rules: list, path: str) -> Optional[tuple]:
+    for rule in rules:
+        if path.startswith(rule[0]):
+            return rule
+    return None
+
+class RateLimiter:
+    """Token buckets keyed by (rule, client), refilled lazily on use.
+
+    Buckets live in an LRU map bounded by RATE_LIMIT_MAX_CLIENTS; an evicted
+    client simply starts again with a full bucket.
+    """
+
+    def __init__(self, spec: str, max_clients: int):
+        self.rules: List[Tuple[str, float, float]] = []
+        for prefix, value in parse_rules(spec):
+            rate, _, burst = value.partition(":")
+            self.rules.append((prefix, float(rate), float(burst or rate)))
+        self.max_clients = max_clients
+        self._buckets: "OrderedDict[tuple, list]" = OrderedDict()
+
+    def acquire(self, rule: tuple, client: str) -> float:
+        """Take a token. Returns 0 if allowed, else seconds until one is available."""
+        prefix, rate, burst = rule
+        now = time.monotonic()
+        key = (prefix, client)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [burst, now]
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+            bucket[0] = min(burst, bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            return 0.0
+        return (1 - bucket[0]) / rate
+
+    def stats(self) -> dict:
+        return {"rules": len(self.rules), "clients": len(self._buckets)}
+
+class ConcurrencyLimiter:
+    """Caps requests in flight per route prefix"""
+
+    def __init__(self, spec: str):
+        self.rules: List[Tuple[str, int]] = [
+            (prefix, int(value)) for prefix, value in parse_rules(spec)
+        ]
+        self.in_flight: Dict[str, int] = {prefix: 0 for prefix, _ in self.rules}
+
+    def acquire(self, rule: tuple) -> bool:
+        prefix, limit = rule
+        if self.in_flight[prefix] >= limit:
+            return False
+        self.in_flight[prefix] += 1
+        return True
+
+    def release(self, rule: tuple):
+        self.in_flight[rule[0]] -= 1
+
+def shed_probability(upstream: str) -> float:
+    """Share of requests to shed given an upstream's smoothed latency.
+
+    Ramps from 0 at LOAD_SHED_LATENCY to 1 at twice that, so load is cut
+    gradually; the latency average fades while idle, so a fully shedding
+    upstream lets traffic back in after a few seconds.
+    """
+    threshold = settings.LOAD_SHED_LATENCY
+    average = UPSTREAM_LATENCY_EWMA.get(upstream)
+    if threshold <= 0 or average is None:
+        return 0.0
+    return min(1.0, max(0.0, (average.value() - threshold) / threshold))
+
+class LoadShedder:
+    """Sheds requests to routes whose upstreams are slow.
+
+    Each "path-prefix=upstream+upstream" rule names the upstreams a route
+    waits on; the route sheds by its slowest one, so a slow payment
+    provider does not turn away catalog reads. Routes without a rule are
+    never shed.
+    """
+
+    def __init__(self, spec: str):
+        self.rules: List[Tuple[str, Tuple[str, ...]]] = [
+            (prefix, tuple(name.strip() for name in value.split("+") if name.strip()))
+            for prefix, value in parse_rules(spec)
+        ]
+        self._probabilities: Dict[str, Tuple[float, float]] = {}
+
+    def probability(self, rule: tuple) -> float:
+        now = time.monotonic()
+        probability = 0.0
+        for upstream in rule[1]:
+            cached = self._probabilities.get(upstream)
+            if cached is None or now - cached[1] > SHED_REFRESH:
+                cached = self._probabilities[upstream] = (shed_probability(upstream), now)
+            probability = max(probability, cached[0])
+        return probability
+
+def client_key(scope) -> Optional[str]:
+    """Verified user id when the request's token was already verified, else client IP.
+
+    Client IPs are only used with TRUST_PROXY_HEADERS set. Behind a proxy
+    the socket address is the proxy's, so without it every anonymous client
+    would share one bucket; None means the client cannot be told apart.
+    """
+    authorization = None
+    forwarded = None
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            authorization = value
+        elif name == b"x-forwarded-for":
+            forwarded = value
+    # Only a token this process has verified counts; unverified tokens would
+    # otherwise let a client mint fresh buckets at will. Until the token
+    # service is imported no token can have been verified.
+    token_service = sys.modules.get("app.services.token_service")
+    if token_service is not None and authorization is not None and authorization[:7].lower() == b"bearer ":
+        token = authorization[7:].strip().decode("latin-1")
+        claims = token_service.claims_cache.peek(token_service.token_key(token))
+        if claims and claims.get("sub"):
+            return f"user:{claims['sub']}"
+    if not settings.TRUST_PROXY_HEADERS:
+        return None
+    if forwarded is not None and settings.TRUSTED_PROXY_HOPS > 0:
+        # Each proxy appends the address it received from, so only entries
+        # written by our own TRUSTED_PROXY_HOPS proxies can be believed; the
+        # left-most one is whatever the client chose to send
+        hops = forwarded.split(b",")
+        hop = hops[-min(len(hops), settings.TRUSTED_PROXY_HOPS)].strip()
+        if hop:
+            return "ip:" + hop.decode("latin-1")
+    client = scope.get("client")
+    return f"ip:{client[0]}" if client else "ip:unknown"
+
+def retry_after(seconds: float) -> bytes:
+    return str(max(1, math.ceil(seconds))).encode()
+
+class AdmissionController:
+    def __init__(self):
+        self.rate_limiter = RateLimiter(settings.RATE_LIMIT_RULES, settings.RATE_LIMIT_MAX_CLIENTS)
+        self.concurrency = ConcurrencyLimiter(settings.CONCURRENCY_LIMITS)
+        self.exempt = tuple(
+            path.strip() for path in settings.ADMISSION_EXEMPT_PATHS.split(",") if path.strip()
+        )
+        self.shedder = LoadShedder(settings.LOAD_SHED_UPSTREAMS)
+        if self.rate_limiter.rules and not settings.TRUST_PROXY_HEADERS:
+            logger.warning(
+                "Rate limits apply to signed-in users only: set TRUST_PROXY_HEADERS "
+                "and TRUSTED_PROXY_HOPS to limit anonymous clients by IP"
+            )
+
+    def check(self, scope) -> Tuple[Optional[tuple], Optional[tuple]]:
+        """Admit a request or refuse it.
+
+        Returns (refusal, concurrency rule). A refusal is (status, reason,
+        rule, retry_after). The concurrency rule, if any, must be released
+        when the request finishes.
+        """
+        path = scope["path"]
+        if path.startswith(self.exempt):
+            return None, None
+
+        rule = match(self.shedder.rules, path)
+        if rule is not None:
+            shed = self.shedder.probability(rule)
+            if shed and random.random() < shed:
+                return (503, "load_shed", rule[0], b"1"), None
+
+        rule = match(self.rate_limiter.rules, path)
+        client = client_key(scope) if rule is not None else None
+        if client is not None:
+            wait = self.rate_limiter.acquire(rule, client)
+            if wait:
+                return (429, "rate_limited", rule[0], retry_after(wait)), None
+
+        rule = match(self.concurrency.rules, path)
+        if rule is not None and not self.concurrency.acquire(rule):
+            return (503, "concurrency", rule[0], b"1"), None
+        return None, rule
+
+    def release(self, rule: tuple):
+        self.concurrency.release(rule)
+
+    def stats(self) -> dict:
+        for prefix, count in self.concurrency.in_flight.items():
+            ADMISSION_IN_FLIGHT.set(prefix, value=count)
+        shed = {name: round(shed_probability(name), 3) for name in UPSTREAM_LATENCY_EWMA}
+        for name, probability in shed.items():
+            ADMISSION_SHED_PROBABILITY.set(name, value=probability)
+        return {
+            **self.rate_limiter.stats(),
+            "concurrency_in_flight": dict(self.concurrency.in_flight),
+            "shed_probability": shed,
+            "upstream_latency_ewma": {
+                name: round(average.value(), 4) for name, average in UPSTREAM_LATENCY_EWMA.items()
+            },
+        }
+
+# Built by the first request through AdmissionMiddleware, so importing
+# the module reads no settings
+admission: Optional[AdmissionController] = None
+
+def get_admission() -> AdmissionController:
+    global admission
+    if admission is None:
+        admission = AdmissionController()
+    return admission
@@ -0,0 +1,200 @@
+"""
+In-process caching utilities
+"""
+
+import asyncio
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+MISSING = object()
+
+
+def approximate_size(value: Any) -> int:
+    """Approximate memory footprint of a cached value in bytes"""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        for key, item in value.items():
+            size += approximate_size(key) + approximate_size(item)
+    elif isinstance(value, (list, tuple, set)):
+        for item in value:
+            size += approximate_size(item)
+    return size
+
+
+class TTLCache:
+    """Bounded key/value cache with per-entry expiry and LRU eviction.
+
+    Entries expire after `ttl` seconds (or a per-entry ttl passed to set()).
+    When either `max_entries` or `max_bytes` is exceeded the least recently
+    used entries are evicted. Keys are usually tuples, which lets callers
+    drop a whole group of entries with invalidate_prefix().
+
+    Every invalidation bumps `generation`. A reader takes the generation
+    before it fetches and passes it to set(); if anything was invalidated
+    in between, the fetched value may predate the write and is not cached.
+    """
+
+    def __init__(self, name: str, ttl: float, max_entries: int, max_bytes: Optional[int] = None):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.generation = 0
+        self.stale_sets = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Get a cached value, or `default` if absent or expired"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            expires_at, size, value = entry
+            if expires_at <= time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def peek(self, key: Hashable, default: Any = None) -> Any:
+        """Like get(), but without touching recency or hit counters"""
+        entry = self._data.get(key)
+        if entry is None or entry[0] <= time.monotonic():
+            return default
+        return entry[2]
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None, generation: Optional[int] = None):
+        """Cache a value, evicting least recently used entries if needed.
+
+        With `generation`, the value is dropped if the cache has been
+        invalidated since that generation was read.
+        """
+        size = approximate_size(value)
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                self.stale_sets += 1
+                return
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (expires_at, size, value)
+            self._bytes += size
+            while len(self._data) > self.max_entries or (
+                self.max_bytes is not None and self._bytes > self.max_bytes
+            ):
+                oldest = next(iter(self._data))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def invalidate(self, key: Hashable):
+        """Drop a single entry"""
+        with self._lock:
+            self.generation += 1
+            if key in self._data:
+                self._remove(key)
+                self.invalidations += 1
+
+    def invalidate_many(self, keys):
+        """Drop several entries under a single lock acquisition"""
+        with self._lock:
+            self.generation += 1
+            for key in keys:
+                if key in self._data:
+                    self._remove(key)
+                    self.invalidations += 1
+
+    def invalidate_prefix(self, *prefix):
+        """Drop every tuple key whose leading elements equal `prefix`"""
+        length = len(prefix)
+        with self._lock:
+            self.generation += 1
+            stale = [
+                key for key in self._data
+                if isinstance(key, tuple) and key[:length] == prefix
+            ]
+            for key in stale:
+                self._remove(key)
+            self.invalidations += len(stale)
+
+    def clear(self):
+        """Drop every entry"""
+        with self._lock:
+            self.generation += 1
+            self.invalidations += len(self._data)
+            self._data.clear()
+            self._bytes = 0
+
+    def _remove(self, key: Hashable):
+        _, size, _ = self._data.pop(key)
+        self._bytes -= size
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        """Hit, miss and eviction counters plus current size"""
+        lookups = self.hits + self.misses
+        return {
+            "name": self.name,
+            "entries": len(self._data),
+            "max_entries": self.max_entries,
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+            "stale_sets": self.stale_sets,
+        }
+
+
+class SingleFlight:
+    """Coalesce concurrent calls for the same key into one.
+
+    The first caller for a key starts the work; callers arriving while it is
+    in flight await the same result instead of repeating the call.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: dict = {}
+        self.calls = 0
+        self.shared = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable]) -> Any:
+        task = self._calls.get(key)
+        if task is None:
+            self.calls += 1
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+        else:
+            self.shared += 1
+        # Shield so one cancelled caller does not cancel the shared call
+        return await asyncio.shield(task)
+
+    def stats(self) -> dict:
+        return {
+            "name": self.name,
+            "in_flight": len(self._calls),
+            "calls": self.calls,
+            "shared": self.shared,
+        }
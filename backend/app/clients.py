@@ -0,0 +1,271 @@
+"""
+Shared upstream clients: the Supabase registry with its pooled keep-alive
+transport, and the long-lived Cryptomus HTTP client
+"""
+
+import asyncio
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any, Callable, Optional
+import httpx
+from app.config import settings
+from app.metrics import caller_name, observe_upstream
+
+if TYPE_CHECKING:
+    from supabase import Client
+
+
+class _PooledTransport(httpx.HTTPTransport):
+    """HTTP transport that tracks how many requests are using the pool"""
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        SupabaseClient._track(1)
+        try:
+            return super().handle_request(request)
+        finally:
+            SupabaseClient._track(-1)
+
+
+class SupabaseClient:
+    """Registry of shared Supabase clients.
+
+    Every client in the registry sends its PostgREST traffic through one
+    keep-alive connection pool, so service calls reuse warm TLS connections
+    instead of building a client per request. The registry is opened at
+    application startup and closed at shutdown.
+    """
+
+    _instances: dict = {}
+    _transport: Optional[_PooledTransport] = None
+    _executor: Optional[ThreadPoolExecutor] = None
+    _semaphore: Optional[asyncio.Semaphore] = None
+    _waiting = 0
+    _lock = threading.Lock()
+    _stats_lock = threading.Lock()
+    _stats = {"requests": 0, "in_flight": 0, "peak_in_flight": 0}
+
+    @staticmethod
+    def startup():
+        """Create the shared connection pool and the default clients"""
+        SupabaseClient.get_instance()
+        SupabaseClient.get_instance("auth")
+        if settings.SUPABASE_SERVICE_KEY:
+            SupabaseClient.get_instance("service")
+
+    @staticmethod
+    def shutdown():
+        """Close every registered client and the shared connection pool"""
+        with SupabaseClient._lock:
+            for client in SupabaseClient._instances.values():
+                try:
+                    client.postgrest.session.close()
+                except Exception:
+                    pass
+            SupabaseClient._instances = {}
+            if SupabaseClient._transport is not None:
+                SupabaseClient._transport.close()
+                SupabaseClient._transport = None
+            if SupabaseClient._executor is not None:
+                SupabaseClient._executor.shutdown(wait=False)
+                SupabaseClient._executor = None
+            SupabaseClient._semaphore = None
+
+    @staticmethod
+    def get_instance(name: str = "data") -> "Client":
+        """Get a shared client by name, creating it on first use.
+
+        The "data" client is used for table access. The "auth" client is kept
+        separate because sign-in stores a user session on the client it runs
+        on, and that session must never leak into table queries. The
+        "service" client uses the service role key, which bypasses row level
+        security; it is only for server-side writes such as orders.
+        """
+        client = SupabaseClient._instances.get(name)
+        if client is None:
+            with SupabaseClient._lock:
+                client = SupabaseClient._instances.get(name)
+                if client is None:
+                    client = SupabaseClient._create(name)
+                    SupabaseClient._instances[name] = client
+        return client
+
+    @staticmethod
+    def _create(name: str) -> "Client":
+        # Imported here: the supabase package is slow to import and only
+        # needed once the first client is built
+        from supabase import create_client
+        from supabase.lib.client_options import ClientOptions
+        options = ClientOptions(
+            postgrest_client_timeout=settings.SUPABASE_TIMEOUT,
+            auto_refresh_token=False,
+            persist_session=False,
+        )
+        key = settings.SUPABASE_ANON_KEY
+        if name == "service":
+            if not settings.SUPABASE_SERVICE_KEY:
+                raise Exception("SUPABASE_SERVICE_ROLE_KEY is not set")
+            key = settings.SUPABASE_SERVICE_KEY
+        client = create_client(settings.SUPABASE_URL, key, options=options)
+        if name in ("data", "service"):
+            # Swap the per-client session for one backed by the shared pool
+            session = client.postgrest.session
+            client.postgrest.session = httpx.Client(
+                base_url=session.base_url,
+                headers=session.headers,
+                timeout=httpx.Timeout(settings.SUPABASE_TIMEOUT),
+                follow_redirects=True,
+                transport=SupabaseClient._get_transport(),
+            )
+            session.close()
+        return client
+
+    @staticmethod
+    def _get_transport() -> _PooledTransport:
+        if SupabaseClient._transport is None:
+            SupabaseClient._transport = _PooledTransport(
+                limits=httpx.Limits(
+                    max_connections=settings.SUPABASE_POOL_SIZE,
+                    max_keepalive_connections=settings.SUPABASE_POOL_KEEPALIVE,
+                    keepalive_expiry=settings.SUPABASE_KEEPALIVE_EXPIRY,
+                ),
+                retries=1,
+            )
+        return SupabaseClient._transport
+
+    @staticmethod
+    def _get_executor() -> ThreadPoolExecutor:
+        if SupabaseClient._executor is None:
+            with SupabaseClient._lock:
+                if SupabaseClient._executor is None:
+                    SupabaseClient._executor = ThreadPoolExecutor(
+                        max_workers=settings.SUPABASE_POOL_SIZE,
+                        thread_name_prefix="supabase"
+                    )
+        return SupabaseClient._executor
+
+    @staticmethod
+    def _get_semaphore() -> asyncio.Semaphore:
+        if SupabaseClient._semaphore is None:
+            SupabaseClient._semaphore = asyncio.Semaphore(settings.SUPABASE_POOL_SIZE)
+        return SupabaseClient._semaphore
+
+    @staticmethod
+    def _track(delta: int):
+        stats = SupabaseClient._stats
+        with SupabaseClient._stats_lock:
+            stats["in_flight"] += delta
+            if delta > 0:
+                stats["requests"] += 1
+                stats["peak_in_flight"] = max(stats["peak_in_flight"], stats["in_flight"])
+
+    @staticmethod
+    def pool_stats() -> dict:
+        """Report connection pool utilization"""
+        stats = dict(SupabaseClient._stats)
+        stats["waiting"] = SupabaseClient._waiting
+        open_connections = idle_connections = 0
+        transport = SupabaseClient._transport
+        if transport is not None:
+            connections = getattr(getattr(transport, "_pool", None), "connections", [])
+            open_connections = len(connections)
+            idle_connections = sum(1 for conn in connections if conn.is_idle())
+        stats.update({
+            "max_connections": settings.SUPABASE_POOL_SIZE,
+            "max_keepalive_connections": settings.SUPABASE_POOL_KEEPALIVE,
+            "open_connections": open_connections,
+            "idle_connections": idle_connections,
+            "utilization": round(stats["in_flight"] / settings.SUPABASE_POOL_SIZE, 3),
+        })
+        return stats
+
+
+class CryptomusClient:
+    """Long-lived async HTTP client for the Cryptomus API.
+
+    Owned by the application lifespan so checkouts reuse open connections
+    instead of paying DNS, TCP and TLS setup on every payment.
+    """
+
+    _client: Optional[httpx.AsyncClient] = None
+
+    @staticmethod
+    def get_instance() -> httpx.AsyncClient:
+        if CryptomusClient._client is None:
+            CryptomusClient._client = httpx.AsyncClient(
+                base_url=settings.CRYPTOMUS_API_URL,
+                http2=settings.CRYPTOMUS_HTTP2 and _h2_available(),
+                limits=httpx.Limits(
+                    max_connections=settings.CRYPTOMUS_POOL_SIZE,
+                    max_keepalive_connections=settings.CRYPTOMUS_POOL_KEEPALIVE,
+                    keepalive_expiry=settings.CRYPTOMUS_KEEPALIVE_EXPIRY,
+                ),
+                # A short pool timeout makes checkouts fail fast instead of
+                # queueing behind a slow upstream
+                timeout=httpx.Timeout(settings.CRYPTOMUS_TIMEOUT, pool=settings.CRYPTOMUS_POOL_TIMEOUT),
+            )
+        return CryptomusClient._client
+
+    @staticmethod
+    async def shutdown():
+        if CryptomusClient._client is not None:
+            await CryptomusClient._client.aclose()
+            CryptomusClient._client = None
+
+
+def _h2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def get_supabase() -> "Client":
+    return SupabaseClient.get_instance()
+
+
+def get_auth_client() -> "Client":
+    return SupabaseClient.get_instance("auth")
+
+
+def get_service_supabase() -> "Client":
+    return SupabaseClient.get_instance("service")
+
+
+async def run_blocking(fn: Callable, *args, **kwargs) -> Any:
+    """Run a blocking Supabase call on the worker pool.
+
+    At most SUPABASE_POOL_SIZE calls run at once, one per pooled connection.
+    Callers beyond that wait for a slot, and give up with an error after
+    SUPABASE_QUEUE_TIMEOUT seconds so a slow database sheds load instead of
+    queueing requests without bound.
+    """
+    return await _offload(caller_name(), functools.partial(fn, *args, **kwargs))
+
+
+async def execute(query) -> Any:
+    """Execute a PostgREST query builder without blocking the event loop"""
+    return await _offload(caller_name(), query.execute)
+
+
+async def _offload(operation: str, call: Callable) -> Any:
+    semaphore = SupabaseClient._get_semaphore()
+    SupabaseClient._waiting += 1
+    try:
+        await asyncio.wait_for(semaphore.acquire(), timeout=settings.SUPABASE_QUEUE_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise Exception("Database is busy, try again later")
+    finally:
+        SupabaseClient._waiting -= 1
+    started = time.perf_counter()
+    failed = True
+    try:
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(SupabaseClient._get_executor(), call)
+        failed = False
+        return result
+    finally:
+        semaphore.release()
+        observe_upstream("supabase", operation, time.perf_counter() - started, failed)
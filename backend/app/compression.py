@@ -0,0 +1,78 @@
+"""
+Response body codecs and Accept-Encoding negotiation
+"""
+
+import gzip
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional
+from app.config import settings
+from app.metrics import Counter, register
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSION_INPUT = register(Counter(
+    "compression_input_bytes_total", "Response bytes before compression", ("encoding",)
+))
+COMPRESSION_OUTPUT = register(Counter(
+    "compression_output_bytes_total", "Response bytes after compression", ("encoding",)
+))
+COMPRESSION_SECONDS = register(Counter(
+    "compression_cpu_seconds_total", "Time spent compressing response bodies", ("encoding",)
+))
+COMPRESSION_SKIPPED = register(Counter(
+    "compression_skipped_total", "Responses sent uncompressed by reason", ("reason",)
+))
+
+def _gzip(body: bytes) -> bytes:
+    # mtime=0 keeps output deterministic for identical bodies
+    return gzip.compress(body, compresslevel=settings.COMPRESSION_GZIP_LEVEL, mtime=0)
+
+@lru_cache(maxsize=None)
+def available_codecs() -> Dict[str, Callable[[bytes], bytes]]:
+    """Installed codecs, built on first use so importing reads no settings"""
+    codecs = {"gzip": _gzip}
+    if brotli is not None:
+        codecs["br"] = lambda body: brotli.compress(body, quality=settings.COMPRESSION_BROTLI_QUALITY)
+    if zstandard is not None:
+        compressor = zstandard.ZstdCompressor(level=settings.COMPRESSION_ZSTD_LEVEL)
+        codecs["zstd"] = compressor.compress
+    return codecs
+
+@lru_cache(maxsize=None)
+def preference() -> List[str]:
+    """Server preference among installed codecs, used to break q-value ties"""
+    return [
+        name.strip() for name in settings.COMPRESSION_ENCODINGS.split(",")
+        if name.strip() in available_codecs()
+    ]
+
+def negotiate(accept_encoding: str) -> Optional[str]:
+    """Pick the best codec the client accepts, or None for identity"""
+    accepted: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    best, best_quality = None, 0.0
+    for name in preference():
+        quality = accepted.get(name, accepted.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = name, quality
+    return best
+
+def compress(encoding: str, body: bytes) -> bytes:
+    return available_codecs()[encoding](body)
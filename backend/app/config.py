@@ -1,26 +1,29 @@
-import os
-from pydantic_settings import BaseSettings
+"""
+Application settings, read from the environment on first use
+"""
 
-class Settings(BaseSettings):
-    # Supabase
-    SUPABASE_URL: str = os.getenv("NEXT_PUBLIC_SUPABASE_URL", "")
-    SUPABASE_ANON_KEY: str = os.getenv("NEXT_PUBLIC_SUPABASE_ANON_KEY", "")
-    SUPABASE_SERVICE_KEY: str = os.getenv("SUPABASE_SERVICE_ROLE_KEY", "")
-    
-    # Cryptomus
-    CRYPTOMUS_MERCHANT_ID: str = os.getenv("CRYPTOMUS_MERCHANT_ID", "")
-    CRYPTOMUS_API_KEY: str = os.getenv("CRYPTOMUS_API_KEY", "")
-    CRYPTOMUS_API_URL: str = os.getenv("CRYPTOMUS_API_URL", "https://api.cryptomus.com/v1")
-    
-    # Site
-    SITE_URL: str = os.getenv("NEXT_PUBLIC_SITE_URL", "http://localhost:3000")
-    API_URL: str = os.getenv("API_URL", "http://localhost:8000")
-    
-    # CORS
-    CORS_ORIGINS: list = ["http://localhost:3000", "http://localhost:8000"]
-    
-    class Config:
-        env_file = ".env.local"
-        case_sensitive = True
+from functools import lru_cache
 
-settings = Settings()
+@lru_cache(maxsize=None)
+def get_settings() -> "Settings":
+    # pydantic_settings is imported here rather than at startup
+    from app.settings_model import Settings
+    return Settings()
+
+class LazySettings:
+    """Stand-in for Settings that reads the environment on first use.
+
+    Each attribute is copied onto the proxy the first time it is read, so
+    later reads cost the same as on a plain object.
+    """
+
+    def __getattr__(self, name):
+        value = getattr(get_settings(), name)
+        object.__setattr__(self, name, value)
+        return value
+
+    def __setattr__(self, name, value):
+        setattr(get_settings(), name, value)
+        object.__setattr__(self, name, value)
+
+settings = LazySettings()
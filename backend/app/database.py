@@ -3,35 +3,46 @@ Database models and utilities for direct database operations
 """
 
 from typing import Optional, List
-from app.services.seller_service import get_supabase
+from app.clients import get_service_supabase, execute
 
 class DatabaseModels:
-    """Database interaction utilities"""
+    """Database interaction utilities.
+
+    Orders are written by the server only (see sql/orders.sql), so these
+    queries run on the service role client.
+    """
     
     @staticmethod
     async def get_order_by_id(order_id: str):
         """Get order by ID"""
-        supabase = get_supabase()
-        response = supabase.table("orders").select("*").eq("id", order_id).execute()
+        supabase = get_service_supabase()
+        response = await execute(supabase.table("orders").select("*").eq("id", order_id))
         return response.data[0] if response.data else None
     
     @staticmethod
     async def create_order(order_data: dict):
         """Create a new order"""
-        supabase = get_supabase()
-        response = supabase.table("orders").insert(order_data).execute()
+        supabase = get_service_supabase()
+        response = await execute(supabase.table("orders").insert(order_data))
         return response.data[0] if response.data else None
     
     @staticmethod
     async def update_order(order_id: str, update_data: dict):
         """Update order"""
-        supabase = get_supabase()
-        response = supabase.table("orders").update(update_data).eq("id", order_id).execute()
+        supabase = get_service_supabase()
+        response = await execute(supabase.table("orders").update(update_data).eq("id", order_id))
         return response.data[0] if response.data else None
     
+    @staticmethod
+    async def update_orders_status(order_ids: List[str], status: str):
+        """Set the same status on many orders in one request"""
+        supabase = get_service_supabase()
+        response = await execute(supabase.table("orders").update({"status": status}).in_("id", order_ids))
+        return response.data
+    
     @staticmethod
     async def get_user_orders(user_id: str):
         """Get all orders for a user"""
-        supabase = get_supabase()
-        response = supabase.table("orders").select("*").eq("user_id", user_id).order("created_at", desc=True).execute()
+        supabase = get_service_supabase()
+        response = await execute(supabase.table("orders").select("*").eq("user_id", user_id).order("created_at", desc=True))
         return response.data
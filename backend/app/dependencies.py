@@ -0,0 +1,25 @@
+"""
+Reusable FastAPI dependencies
+"""
+
+from typing import Optional
+from fastapi import Depends, Header, HTTPException, Query
+from app.services.auth_service import AuthService
+
+async def get_access_token(
+    authorization: Optional[str] = Header(None),
+    access_token: Optional[str] = Query(None)
+) -> str:
+    """Read the bearer token from the Authorization header or query string"""
+    if authorization and authorization.lower().startswith("bearer "):
+        return authorization[7:].strip()
+    if access_token:
+        return access_token
+    raise HTTPException(status_code=401, detail="Missing access token")
+
+async def get_current_user(token: str = Depends(get_access_token)) -> dict:
+    """Resolve the calling user from a locally verified access token"""
+    try:
+        return await AuthService.get_user(token)
+    except Exception as e:
+        raise HTTPException(status_code=401, detail=str(e))
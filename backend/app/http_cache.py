@@ -0,0 +1,67 @@
+"""
+Conditional GET support: ETags, Cache-Control and 304 responses
+"""
+
+import hashlib
+import json
+from typing import Optional, Type, Union
+from fastapi import Request, Response
+from pydantic import BaseModel
+from app.serialization import fast_response
+
+def _row_version(row: dict) -> Optional[str]:
+    if isinstance(row, dict) and row.get("id") and row.get("updated_at"):
+        return f"{row['id']}:{row['updated_at']}"
+    return None
+
+def make_etag(content: Union[dict, list]) -> str:
+    """Weak ETag for a row or list of rows.
+
+    Rows carry an ``updated_at`` maintained by a database trigger, so the ids
+    and versions identify the representation without hashing the body. Any
+    other content falls back to a hash of its JSON encoding.
+    """
+    if isinstance(content, dict) and "items" in content:
+        # Cursor pages: the rows plus the cursor that follows them
+        rows, extra = content["items"], [str(content.get("next_cursor"))]
+    else:
+        rows, extra = (content if isinstance(content, list) else [content]), []
+    versions = [_row_version(row) for row in rows]
+    if all(versions):
+        source = "|".join(versions + extra)
+    else:
+        source = json.dumps(content, sort_keys=True, default=str)
+    return f'W/"{hashlib.sha1(source.encode()).hexdigest()}"'
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Weak comparison of `etag` against the request's If-None-Match"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+def conditional_response(
+    request: Request,
+    content: Union[dict, list],
+    cache_control: str,
+    model: Optional[Type[BaseModel]] = None
+) -> Response:
+    """Return 304 if the client's copy is current, else the full JSON body.
+
+    When `model` is given the body is projected onto its fields; that work
+    only happens when a body is actually sent.
+    """
+    etag = make_etag(content)
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    return fast_response(content, model, headers)
@@ -0,0 +1,56 @@
+"""
+Sortable unique ID generation
+"""
+
+import itertools
+import os
+import random
+import time
+from app.config import settings
+
+# Crockford base32: no I, L, O or U, so IDs survive being read aloud or retyped
+ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+
+NODE_BITS = 16
+SEQUENCE_BITS = 24
+ID_LENGTH = 18  # ceil((48 + NODE_BITS + SEQUENCE_BITS) / 5)
+
+def _node_id() -> int:
+    if settings.ID_NODE >= 0:
+        return settings.ID_NODE & ((1 << NODE_BITS) - 1)
+    # Random per process so workers and hosts need no coordination
+    return int.from_bytes(os.urandom(2), "big")
+
+class IdGenerator:
+    """Snowflake-style IDs: 48-bit millisecond time, node id, sequence.
+
+    IDs are fixed width, so they sort by creation time as plain strings.
+    The sequence comes from itertools.count, whose next() is atomic under
+    the GIL, so generation needs no lock. It starts at a random offset and
+    wraps after 2**24 IDs; the ID that wraps it moves on to the next
+    millisecond, so IDs keep ascending even within one.
+    """
+
+    def __init__(self, node: int):
+        self.node = node
+        self._sequence = itertools.count(random.getrandbits(SEQUENCE_BITS))
+        self._last_ms = 0
+
+    def new_id(self) -> str:
+        sequence = next(self._sequence) & ((1 << SEQUENCE_BITS) - 1)
+        # Never step backwards if the wall clock does
+        millis = max(time.time_ns() // 1_000_000, self._last_ms)
+        if sequence == 0:
+            millis = max(millis, self._last_ms + 1)
+        self._last_ms = millis
+        value = (((millis << NODE_BITS) | self.node) << SEQUENCE_BITS) | sequence
+        chars = []
+        for _ in range(ID_LENGTH):
+            chars.append(ALPHABET[value & 31])
+            value >>= 5
+        return "".join(reversed(chars))
+
+id_generator = IdGenerator(_node_id())
+
+def new_order_id() -> str:
+    return f"order_{id_generator.new_id()}"
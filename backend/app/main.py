@@ -1,37 +1,163 @@
+import time
+
+_import_started = time.perf_counter()
+
 from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
+from contextlib import asynccontextmanager
+import asyncio
+import importlib
 import logging
+import sys
 from app.config import settings
-from app.routes import auth, sellers, products, payments
+from app.middleware.middleware import (
+    MetricsMiddleware, ProfilerMiddleware, CompressionMiddleware, AdmissionMiddleware, SettingsCORSMiddleware
+)
+from app import metrics
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Create FastAPI app
-app = FastAPI(
-    title="Nova Ecart Backend",
-    description="Python backend for Nova Ecart e-commerce platform",
-    version="1.0.0"
-)
+# Router modules by URL prefix. They pull in supabase, httpx and every
+# service, so they are imported on first use instead of at import time
+ROUTERS = {
+    "/api/auth": "app.routes.auth",
+    "/api/sellers": "app.routes.sellers",
+    "/api/products": "app.routes.products",
+    "/api/cryptomus": "app.routes.payments",
+    "/admin": "app.routes.admin",
+}
 
-# Configure CORS
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=settings.CORS_ORIGINS,
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+# These pages describe every route, so they need every router loaded
+SCHEMA_PATHS = ("/docs", "/redoc", "/openapi.json")
+
+# Cold start timings in seconds, reported by /stats and /metrics
+startup_timings = {
+    "import": None,
+    "create_app": None,
+    "lifespan": None,
+    "first_response": None,
+}
+
+class LazyRouterMiddleware:
+    """ASGI middleware that includes a router the first time its prefix is hit.
+
+    The import runs in a worker thread so requests already being served are
+    not stalled by it. Also records the time to the first response.
+    """
+
+    def __init__(self, app, target: FastAPI):
+        self.app = app
+        self.target = target
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        pending = self.target.state.pending_routers
+        if pending:
+            path = scope["path"]
+            if path.startswith(SCHEMA_PATHS):
+                await load_routers(self.target)
+            else:
+                prefixes = [prefix for prefix in list(pending) if path.startswith(prefix)]
+                if prefixes:
+                    await load_routers(self.target, prefixes)
+
+        await self.app(scope, receive, send)
+        if startup_timings["first_response"] is None:
+            startup_timings["first_response"] = time.perf_counter() - _import_started
+
+async def load_routers(app: FastAPI, prefixes=None):
+    """Import and include pending routers, all of them by default"""
+    pending = app.state.pending_routers
+    for prefix in list(pending if prefixes is None else prefixes):
+        module_name = pending.get(prefix)
+        if module_name is None:
+            continue
+        module = await asyncio.to_thread(importlib.import_module, module_name)
+        # Another request may have included it while the import ran
+        if pending.pop(prefix, None) is not None:
+            app.include_router(module.router)
+            app.openapi_schema = None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Open shared clients and workers at startup and close them at shutdown.
+
+    With BACKGROUND_TASKS off (serverless) nothing is started eagerly:
+    clients are built on first use and routers load on first request.
+    """
+    started = time.perf_counter()
+    background = []
+    if settings.BACKGROUND_TASKS:
+        from app.clients import SupabaseClient, CryptomusClient
+        from app.services.callback_queue import callback_queue
+        from app.services.search_service import search_index
+        from app.services.stock_service import StockService
+        await load_routers(app)
+        SupabaseClient.startup()
+        CryptomusClient.get_instance()
+        await callback_queue.open()
+        background = [
+            asyncio.create_task(callback_queue.run_worker()),
+            asyncio.create_task(search_index.run_refresher()),
+            asyncio.create_task(StockService.run_sweeper()),
+        ]
+    startup_timings["lifespan"] = time.perf_counter() - started
+    yield
+    for task in background:
+        task.cancel()
+    await asyncio.gather(*background, return_exceptions=True)
+    # Close only what was actually imported
+    if "app.services.callback_queue" in sys.modules:
+        await sys.modules["app.services.callback_queue"].callback_queue.close()
+    if "app.clients" in sys.modules:
+        clients = sys.modules["app.clients"]
+        await clients.CryptomusClient.shutdown()
+        clients.SupabaseClient.shutdown()
+
+def create_app() -> FastAPI:
+    """Build the application without importing routers or services"""
+    started = time.perf_counter()
+    app = FastAPI(
+        title="Nova Ecart Backend",
+        description="Python backend for Nova Ecart e-commerce platform",
+        version="1.0.0",
+        lifespan=lifespan
+    )
+    app.state.pending_routers = dict(ROUTERS)
+
+    # Include routers on demand; innermost, so refused requests never load one
+    app.add_middleware(LazyRouterMiddleware, target=app)
+
+    # Refuse excess load before it reaches Supabase; inside CORS so refusals
+    # still carry CORS headers for browsers
+    app.add_middleware(AdmissionMiddleware)
+
+    # Configure CORS
+    app.add_middleware(SettingsCORSMiddleware)
+
+    # Compress large responses; added before metrics so sizes are wire sizes
+    app.add_middleware(CompressionMiddleware)
+
+    # Record per-route latency and response sizes
+    app.add_middleware(MetricsMiddleware)
+
+    # Sample stack traces of selected requests when profiling is turned on
+    app.add_middleware(ProfilerMiddleware)
+
+    app.add_api_route("/", root, methods=["GET"])
+    app.add_api_route("/health", health_check, methods=["GET"])
+    app.add_api_route("/stats", stats, methods=["GET"])
+    app.add_api_route("/metrics", prometheus_metrics, methods=["GET"], response_class=PlainTextResponse)
+    app.add_exception_handler(Exception, global_exception_handler)
 
-# Include routes
-app.include_router(auth.router)
-app.include_router(sellers.router)
-app.include_router(products.router)
-app.include_router(payments.router)
+    startup_timings["create_app"] = time.perf_counter() - started
+    return app
 
-@app.get("/")
 async def root():
     """Root endpoint"""
     return {
@@ -41,7 +167,6 @@ async def root():
         "redoc": "/redoc"
     }
 
-@app.get("/health")
 async def health_check():
     """Health check endpoint"""
     return {
@@ -49,7 +174,87 @@ async def health_check():
         "service": "Nova Ecart Backend"
     }
 
-@app.exception_handler(Exception)
+# Objects reported by /stats and /metrics: (section, module, attribute).
+# Only modules something else already imported are read, so neither
+# endpoint loads services or opens the callback journal on a cold instance
+MONITORED = [
+    ("supabase", "app.clients", "SupabaseClient"),
+    ("caches", "app.services.product_service", "product_cache"),
+    ("caches", "app.services.token_service", "claims_cache"),
+    ("caches", "app.services.token_service", "revoked_tokens"),
+    ("caches", "app.services.order_service", "order_status_cache"),
+    ("caches", "app.services.seller_service", "seller_cache"),
+    ("caches", "app.services.payment_service", "payment_idempotency_cache"),
+    ("single_flight", "app.services.product_service", "product_fetches"),
+    ("single_flight", "app.services.payment_service", "payment_creations"),
+    ("circuit_breakers", "app.services.payment_service", "cryptomus_breaker"),
+    ("callback_queue", "app.services.callback_queue", "callback_queue"),
+    ("search_index", "app.services.search_service", "search_index"),
+    ("stock_reservations", "app.services.stock_service", "ledger"),
+    ("admission", "app.admission", "admission"),
+]
+
+LISTED = ("caches", "single_flight", "circuit_breakers")
+
+def _monitored() -> dict:
+    """Pools, caches and workers of the modules loaded so far"""
+    monitored = {section: [] for section in LISTED}
+    for section, module_name, attribute in MONITORED:
+        module = sys.modules.get(module_name)
+        if module is None:
+            continue
+        value = getattr(module, attribute)
+        if value is None:
+            continue
+        if section in LISTED:
+            monitored[section].append(value)
+        else:
+            monitored[section] = value
+    return monitored
+
+async def stats():
+    """Startup timings, connection pool and cache statistics"""
+    from app.profiler import profiler
+    monitored = _monitored()
+    result = {"startup": startup_timings}
+    if "supabase" in monitored:
+        result["supabase_pool"] = monitored["supabase"].pool_stats()
+    result["caches"] = [cache.stats() for cache in monitored["caches"]]
+    result["single_flight"] = [flight.stats() for flight in monitored["single_flight"]]
+    result["circuit_breakers"] = [breaker.stats() for breaker in monitored["circuit_breakers"]]
+    if "callback_queue" in monitored:
+        result["callback_queue"] = await monitored["callback_queue"].stats()
+    for section in ("search_index", "stock_reservations", "admission"):
+        if section in monitored:
+            result[section] = monitored[section].stats()
+    result["profiler"] = profiler.summary()
+    return result
+
+async def prometheus_metrics():
+    """Prometheus text exposition of request, upstream, pool and cache metrics"""
+    monitored = _monitored()
+    extra = []
+    if "supabase" in monitored:
+        extra += metrics.render_stats("supabase_pool", monitored["supabase"].pool_stats())
+    for cache in monitored["caches"]:
+        extra += metrics.render_stats("cache", cache.stats(), {"cache": cache.name})
+    for flight in monitored["single_flight"]:
+        extra += metrics.render_stats("single_flight", flight.stats(), {"name": flight.name})
+    for breaker in monitored["circuit_breakers"]:
+        extra += metrics.render_stats("circuit_breaker", breaker.stats(), {"name": breaker.name})
+    if "callback_queue" in monitored:
+        extra += metrics.render_stats("callback_queue", await monitored["callback_queue"].stats())
+    for section in ("search_index", "stock_reservations", "admission"):
+        if section in monitored:
+            extra += metrics.render_stats(section, monitored[section].stats())
+    for name, average in metrics.UPSTREAM_LATENCY_EWMA.items():
+        extra.append(f'upstream_latency_ewma_seconds{{upstream="{name}"}} {average.value()}')
+    extra += metrics.render_stats("startup_seconds", startup_timings)
+    return PlainTextResponse(
+        metrics.render(extra),
+        media_type="text/plain; version=0.0.4"
+    )
+
 async def global_exception_handler(request, exc):
     logger.error(f"Unhandled exception: {str(exc)}")
     return JSONResponse(
@@ -57,6 +262,10 @@ async def global_exception_handler(request, exc):
         content={"detail": "Internal server error"}
     )
 
+startup_timings["import"] = time.perf_counter() - _import_started
+
+app = create_app()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(
@@ -0,0 +1,178 @@
+"""
+Lightweight Prometheus-style metrics
+"""
+
+import bisect
+import math
+import sys
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount: float = 1.0):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for label_values, value in list(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labels, label_values)} {value}")
+        return lines
+
+
+class Gauge(Counter):
+    def set(self, *label_values, value: float):
+        self._values[label_values] = value
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        lines[1] = f"# TYPE {self.name} gauge"
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = (), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # label values -> [per-bucket counts..., +Inf count, sum]
+        self._series: Dict[Tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for label_values, series in list(self._series.items()):
+            labels = _format_labels(self.labels, label_values)
+            prefix = labels[:-1] + "," if labels else "{"
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series[:-1]):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{prefix}le="{bound}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{labels} {series[-1]}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "Request latency by route",
+    ("method", "route", "status")
+)
+RESPONSE_SIZE = Histogram(
+    "http_response_size_bytes", "Response body size by route",
+    ("method", "route"), buckets=SIZE_BUCKETS
+)
+REQUESTS_IN_FLIGHT = Gauge("http_requests_in_flight", "Requests currently being served")
+UPSTREAM_LATENCY = Histogram(
+    "upstream_call_duration_seconds", "Time spent in upstream calls by service method",
+    ("upstream", "operation")
+)
+UPSTREAM_ERRORS = Counter(
+    "upstream_call_errors_total", "Failed upstream calls by service method",
+    ("upstream", "operation")
+)
+
+
+
+class DecayingAverage:
+    """Exponentially weighted moving average that fades while idle.
+
+    Without fresh observations the value decays with time constant `window`,
+    so a signal used to shed load recovers once calls stop.
+    """
+
+    def __init__(self, window: float, weight: float = 0.2):
+        self.window = window
+        self.weight = weight
+        self._value = 0.0
+        self._updated = time.monotonic()
+
+    def value(self, now: Optional[float] = None) -> float:
+        now = time.monotonic() if now is None else now
+        return self._value * math.exp(-(now - self._updated) / self.window)
+
+    def observe(self, sample: float):
+        now = time.monotonic()
+        current = self.value(now)
+        self._value = current + self.weight * (sample - current)
+        self._updated = now
+
+
+# Smoothed upstream latency per upstream, read by admission control
+UPSTREAM_LATENCY_EWMA: Dict[str, DecayingAverage] = {}
+
+METRICS = [REQUEST_LATENCY, RESPONSE_SIZE, REQUESTS_IN_FLIGHT, UPSTREAM_LATENCY, UPSTREAM_ERRORS]
+
+
+def register(metric):
+    """Add a metric to the /metrics output"""
+    METRICS.append(metric)
+    return metric
+
+
+def caller_name(depth: int = 2) -> str:
+    """Qualified name of the function `depth` frames up, e.g. ProductService.get_product"""
+    code = sys._getframe(depth).f_code
+    return getattr(code, "co_qualname", code.co_name)
+
+
+def observe_upstream(upstream: str, operation: str, seconds: float, failed: bool = False):
+    UPSTREAM_LATENCY.observe(seconds, upstream, operation)
+    average = UPSTREAM_LATENCY_EWMA.get(upstream)
+    if average is None:
+        average = UPSTREAM_LATENCY_EWMA[upstream] = DecayingAverage(window=5.0)
+    average.observe(seconds)
+    if failed:
+        UPSTREAM_ERRORS.inc(upstream, operation)
+
+
+def render_stats(prefix: str, stats: dict, labels: Optional[Dict[str, str]] = None) -> List[str]:
+    """Expose the numeric fields of a stats() dict as gauges"""
+    names = tuple(labels or ())
+    values = tuple((labels or {}).values())
+    label_text = _format_labels(names, values)
+    lines = []
+    for key, value in stats.items():
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            continue
+        lines.append(f"{prefix}_{key}{label_text} {value}")
+    return lines
+
+
+def render(extra: Iterable[str] = ()) -> str:
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    lines.extend(extra)
+    return "\n".join(lines) + "\n"
@@ -1,7 +1,16 @@
 from fastapi import Request, HTTPException
 from fastapi.responses import JSONResponse
+from fastapi.middleware.cors import CORSMiddleware as StarletteCORSMiddleware
 from typing import Callable
+import asyncio
 import logging
+import sys
+import time
+from app.config import settings
+from app.metrics import REQUEST_LATENCY, RESPONSE_SIZE, REQUESTS_IN_FLIGHT
+from app.profiler import profiler
+from app import compression
+from app.admission import get_admission, ADMISSION_REJECTED
 
 logger = logging.getLogger(__name__)
 
@@ -36,3 +45,229 @@ class CORSMiddleware:
             response.headers["Access-Control-Allow-Headers"] = "Content-Type, Authorization"
         
         return response
+
+
+class SettingsCORSMiddleware(StarletteCORSMiddleware):
+    """CORS for the origins in settings.CORS_ORIGINS.
+
+    Starlette builds the middleware stack on the first request, so the
+    origins are read then instead of while the app is created.
+    """
+
+    def __init__(self, app):
+        super().__init__(
+            app,
+            allow_origins=settings.CORS_ORIGINS,
+            allow_credentials=True,
+            allow_methods=["*"],
+            allow_headers=["*"],
+        )
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording per-route latency, response size and load.
+
+    Routes are labelled with their path template (``/api/products/{product_id}``)
+    so label cardinality stays bounded; unmatched paths share one label.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = [500]
+        size = [0]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            elif message["type"] == "http.response.body":
+                size[0] += len(message.get("body", b""))
+            await send(message)
+
+        REQUESTS_IN_FLIGHT.inc(amount=1)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            REQUESTS_IN_FLIGHT.inc(amount=-1)
+            route = scope.get("route")
+            label = getattr(route, "path", None) or "unmatched"
+            method = scope["method"]
+            REQUEST_LATENCY.observe(time.perf_counter() - started, method, label, str(status[0]))
+            RESPONSE_SIZE.observe(size[0], method, label)
+
+
+class ProfilerMiddleware:
+    """ASGI middleware that hands selected requests to the sampling profiler.
+
+    When profiling is disabled and no signing secret is configured this is a
+    single attribute check per request.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not (settings.PROFILER_ENABLED or settings.PROFILER_SECRET):
+            await self.app(scope, receive, send)
+            return
+
+        header = None
+        for name, value in scope["headers"]:
+            if name == b"x-profile":
+                header = value
+                break
+        if not profiler.should_profile(header):
+            await self.app(scope, receive, send)
+            return
+
+        frame = sys._getframe()
+        profiler.begin(frame, scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            profiler.end(frame)
+
+
+class CompressionMiddleware:
+    """ASGI middleware compressing complete response bodies.
+
+    The codec is negotiated from Accept-Encoding (zstd, br and gzip, as
+    installed). Bodies under COMPRESSION_MIN_SIZE, streamed responses,
+    responses that already carry a Content-Encoding and paths listed in
+    COMPRESSION_EXCLUDE_PATHS are passed through unchanged. Bodies over
+    COMPRESSION_OFFLOAD_SIZE are compressed in a worker thread so a large
+    catalog page does not stall the event loop.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.excluded = tuple(
+            path.strip() for path in settings.COMPRESSION_EXCLUDE_PATHS.split(",") if path.strip()
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.COMPRESSION_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        accept_encoding = ""
+        for name, value in scope["headers"]:
+            if name == b"accept-encoding":
+                accept_encoding = value.decode("latin-1")
+                break
+        encoding = compression.negotiate(accept_encoding) if accept_encoding else None
+        if encoding is None or scope["path"].startswith(self.excluded):
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start_message, passthrough
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            reason = None
+            if message.get("more_body", False):
+                reason = "streaming"
+            elif len(body) < settings.COMPRESSION_MIN_SIZE:
+                reason = "small"
+            elif any(name == b"content-encoding" for name, _ in start_message["headers"]):
+                reason = "encoded"
+            if reason is not None:
+                compression.COMPRESSION_SKIPPED.inc(reason)
+                passthrough = True
+                await send(start_message)
+                await send(message)
+                return
+
+            compressed, seconds = await self._compress(encoding, body)
+            compression.COMPRESSION_SECONDS.inc(encoding, amount=seconds)
+            if len(compressed) >= len(body):
+                compression.COMPRESSION_SKIPPED.inc("incompressible")
+                await send(start_message)
+                await send(message)
+                return
+            compression.COMPRESSION_INPUT.inc(encoding, amount=len(body))
+            compression.COMPRESSION_OUTPUT.inc(encoding, amount=len(compressed))
+
+            headers = [
+                (name, value) for name, value in start_message["headers"]
+                if name not in (b"content-length", b"vary")
+            ]
+            vary = [value for name, value in start_message["headers"] if name == b"vary"]
+            vary.append(b"Accept-Encoding")
+            headers += [
+                (b"content-encoding", encoding.encode()),
+                (b"content-length", str(len(compressed)).encode()),
+                (b"vary", b", ".join(vary)),
+            ]
+            await send(dict(start_message, headers=headers))
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_wrapper)
+
+    @staticmethod
+    async def _compress(encoding: str, body: bytes):
+        def run():
+            started = time.perf_counter()
+            compressed = compression.compress(encoding, body)
+            return compressed, time.perf_counter() - started
+        if len(body) >= settings.COMPRESSION_OFFLOAD_SIZE:
+            return await asyncio.to_thread(run)
+        return run()
+
+
+class AdmissionMiddleware:
+    """ASGI middleware applying rate limits, concurrency limits and load shedding.
+
+    Refused requests get 429 (rate limited) or 503 (overloaded) with a
+    Retry-After header and never reach the routes or Supabase.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.ADMISSION_ENABLED or scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+
+        admission = get_admission()
+        refusal, rule = admission.check(scope)
+        if refusal is not None:
+            status, reason, rule_name, retry_after = refusal
+            ADMISSION_REJECTED.inc(reason, rule_name)
+            detail = b"Too many requests" if status == 429 else b"Server busy, try again shortly"
+            body = b'{"detail":"' + detail + b'"}'
+            await send({
+                "type": "http.response.start",
+                "status": status,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"retry-after", retry_after),
+                ],
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        if rule is None:
+            await self.app(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            admission.release(rule)
@@ -1,8 +1,9 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional
 
 class PaymentRequest(BaseModel):
     product_id: str
+    quantity: int = Field(1, ge=1, le=100)
     amount: float
     currency: str = "USDT"
 
@@ -1,7 +1,35 @@
-from pydantic import BaseModel
-from typing import Optional
+import uuid
+from pydantic import BaseModel, Field, field_validator
+from typing import List, Optional
 from datetime import datetime
 
+# products.price is an integer column restricted to these USDT amounts
+PRODUCT_PRICES = (1, 2, 3)
+
+def _check_price(value: Optional[float]) -> Optional[int]:
+    if value is None:
+        return value
+    if value not in PRODUCT_PRICES:
+        raise ValueError(f"Price must be one of {', '.join(map(str, PRODUCT_PRICES))}")
+    return int(value)
+
+def _check_stock(value: Optional[int]) -> Optional[int]:
+    if value is not None and value < 0:
+        raise ValueError("Stock cannot be negative")
+    return value
+
+def _check_seller_id(value: str) -> str:
+    try:
+        return str(uuid.UUID(value))
+    except ValueError:
+        raise ValueError("Invalid seller id")
+
+class ProductFieldValidators:
+    """Database constraint checks shared by product create and update models"""
+    _check_price = field_validator("price", check_fields=False)(_check_price)
+    _check_stock = field_validator("stock", check_fields=False)(_check_stock)
+    _check_seller_id = field_validator("seller_id", check_fields=False)(_check_seller_id)
+
 class ProductBase(BaseModel):
     title: str
     description: str
@@ -9,10 +37,10 @@ class ProductBase(BaseModel):
     category: str
     stock: int
 
-class ProductCreate(ProductBase):
+class ProductCreate(ProductFieldValidators, ProductBase):
     seller_id: str
 
-class ProductUpdate(BaseModel):
+class ProductUpdate(ProductFieldValidators, BaseModel):
     title: Optional[str] = None
     description: Optional[str] = None
     price: Optional[float] = None
@@ -27,3 +55,6 @@ class ProductResponse(ProductBase):
 
     class Config:
         from_attributes = True
+
+class ProductBatchRequest(BaseModel):
+    ids: List[str] = Field(..., min_length=1, max_length=100)
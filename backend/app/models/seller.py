@@ -1,6 +1,29 @@
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, Field, field_validator
+from typing import List, Literal, Optional
 from datetime import datetime
+from app.utils import field_validator_for
+
+# Formatted seller fields: field -> (app.utils batch validator kind, message)
+SELLER_FIELD_FORMATS = {
+    "email": ("email", "Invalid email address"),
+    "mobile": ("phone", "Invalid mobile number"),
+    "pan_card": ("pan", "Invalid PAN format"),
+    "ifsc_code": ("ifsc", "Invalid IFSC code"),
+    "gstin": ("gstin", "Invalid GSTIN format"),
+}
+
+class SellerFieldValidators:
+    """Format checks for seller input; stored rows are returned as they are"""
+    _check_email = field_validator("email", check_fields=False)(
+        field_validator_for(*SELLER_FIELD_FORMATS["email"]))
+    _check_mobile = field_validator("mobile", check_fields=False)(
+        field_validator_for(*SELLER_FIELD_FORMATS["mobile"]))
+    _check_pan = field_validator("pan_card", check_fields=False)(
+        field_validator_for(*SELLER_FIELD_FORMATS["pan_card"]))
+    _check_ifsc = field_validator("ifsc_code", check_fields=False)(
+        field_validator_for(*SELLER_FIELD_FORMATS["ifsc_code"]))
+    _check_gstin = field_validator("gstin", check_fields=False)(
+        field_validator_for(*SELLER_FIELD_FORMATS["gstin"]))
 
 class SellerBase(BaseModel):
     name: str
@@ -19,10 +42,10 @@ class SellerBase(BaseModel):
     trademark_certificate_url: Optional[str] = None
     authorization_letter_url: Optional[str] = None
 
-class SellerCreate(SellerBase):
+class SellerCreate(SellerFieldValidators, SellerBase):
     user_id: str
 
-class SellerUpdate(BaseModel):
+class SellerUpdate(SellerFieldValidators, BaseModel):
     name: Optional[str] = None
     mobile: Optional[str] = None
     home_address: Optional[str] = None
@@ -48,3 +71,11 @@ class SellerResponse(SellerBase):
 
     class Config:
         from_attributes = True
+
+class SellerDecision(BaseModel):
+    seller_id: str
+    decision: Literal["approve", "reject"]
+    note: Optional[str] = None
+
+class BulkVerifyRequest(BaseModel):
+    decisions: List[SellerDecision] = Field(..., min_length=1, max_length=500)
@@ -0,0 +1,56 @@
+"""
+Keyset (cursor) pagination helpers for PostgREST queries
+"""
+
+import base64
+import json
+import uuid
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+MAX_PAGE_SIZE = 100
+
+
+def encode_cursor(row: dict) -> str:
+    """Build an opaque cursor pointing just after `row`"""
+    raw = json.dumps([row["created_at"], row["id"]], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """Decode a cursor into its (created_at, id) position.
+
+    Cursors come from clients and their values end up inside a PostgREST
+    filter, so both are parsed and re-rendered: an ISO timestamp and a UUID
+    cannot carry quotes or extra filter terms.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(created_at).isoformat(), str(uuid.UUID(row_id))
+    except Exception:
+        raise ValueError("Invalid pagination cursor")
+
+
+def apply_keyset(query, cursor: Optional[str], limit: int):
+    """Order newest first on (created_at, id) and seek past `cursor`.
+
+    One extra row is requested so paginate() can tell whether another page
+    exists without a count query.
+    """
+    # Both sort keys go in a single order parameter: "created_at.desc,id.desc"
+    query = query.order("created_at.desc,id", desc=True)
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        query = query.or_(
+            f'created_at.lt."{created_at}",'
+            f'and(created_at.eq."{created_at}",id.lt."{row_id}")'
+        )
+    return query.limit(limit + 1)
+
+
+def paginate(rows: List[dict], limit: int) -> dict:
+    """Trim the look-ahead row and build the page envelope"""
+    items = rows[:limit]
+    next_cursor = encode_cursor(items[-1]) if len(rows) > limit else None
+    return {"items": items, "next_cursor": next_cursor}
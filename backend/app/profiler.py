@@ -0,0 +1,138 @@
+"""
+Opt-in sampling profiler for request handlers
+"""
+
+import hashlib
+import hmac
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, Optional
+from app.config import settings
+
+MAX_STACKS_PER_ROUTE = 5000
+MAX_DEPTH = 128
+
+
+class SamplingProfiler:
+    """Samples the event loop thread's stack while chosen requests run.
+
+    A request is profiled when PROFILER_ENABLED is set and it wins the
+    PROFILER_SAMPLE_RATE draw, or when it carries a valid signed
+    ``X-Profile`` header. While any profiled request is in flight a daemon
+    thread snapshots the loop thread's stack every PROFILER_INTERVAL seconds.
+    A sample is kept only if the stack passes through a profiled request's
+    middleware frame; it is then folded into per-route collapsed stacks
+    ("a;b;c count"), the input format of flamegraph tools.
+    """
+
+    def __init__(self):
+        self._requests: Dict[int, dict] = {}
+        self._stacks: Dict[str, Counter] = {}
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._loop_thread_id: Optional[int] = None
+        self.samples = 0
+        self.profiled_requests = 0
+
+    def should_profile(self, header: Optional[bytes]) -> bool:
+        if header is not None and verify_profile_token(header.decode("latin-1")):
+            return True
+        return settings.PROFILER_ENABLED and random.random() < settings.PROFILER_SAMPLE_RATE
+
+    def begin(self, frame, scope: dict):
+        """Register a profiled request by its middleware frame"""
+        self._loop_thread_id = threading.get_ident()
+        self._requests[id(frame)] = scope
+        self.profiled_requests += 1
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+            self._thread.start()
+        self._wake.set()
+
+    def end(self, frame):
+        self._requests.pop(id(frame), None)
+        if not self._requests:
+            self._wake.clear()
+
+    def _run(self):
+        while True:
+            self._wake.wait()
+            time.sleep(settings.PROFILER_INTERVAL)
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is not None:
+                self._sample(frame)
+            del frame
+
+    def _sample(self, frame):
+        names = []
+        scope = None
+        depth = 0
+        while frame is not None and depth < MAX_DEPTH:
+            if scope is None:
+                scope = self._requests.get(id(frame))
+            code = frame.f_code
+            names.append(
+                f"{getattr(code, 'co_qualname', code.co_name)} "
+                f"({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+            )
+            frame = frame.f_back
+            depth += 1
+        if scope is None:
+            return
+        route = getattr(scope.get("route"), "path", None) or scope.get("path", "unmatched")
+        stacks = self._stacks.setdefault(route, Counter())
+        collapsed = ";".join(reversed(names))
+        if collapsed in stacks or len(stacks) < MAX_STACKS_PER_ROUTE:
+            stacks[collapsed] += 1
+            self.samples += 1
+
+    def collapsed(self, route: Optional[str] = None) -> str:
+        """Per-route samples in collapsed-stack format, route name as root"""
+        lines = []
+        for name, stacks in list(self._stacks.items()):
+            if route and name != route:
+                continue
+            for stack, count in stacks.most_common():
+                lines.append(f"{name};{stack} {count}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> dict:
+        return {
+            "enabled": settings.PROFILER_ENABLED,
+            "sample_rate": settings.PROFILER_SAMPLE_RATE,
+            "interval": settings.PROFILER_INTERVAL,
+            "profiled_requests": self.profiled_requests,
+            "samples": self.samples,
+            "routes": {
+                name: sum(stacks.values()) for name, stacks in list(self._stacks.items())
+            },
+        }
+
+    def reset(self):
+        self._stacks = {}
+        self.samples = 0
+        self.profiled_requests = 0
+
+
+def sign_profile_token(expires_at: int) -> str:
+    """Build an X-Profile header value valid until `expires_at` (unix time)"""
+    signature = hmac.new(
+        settings.PROFILER_SECRET.encode(), str(expires_at).encode(), hashlib.sha256
+    ).hexdigest()
+    return f"{expires_at}.{signature}"
+
+
+def verify_profile_token(token: str) -> bool:
+    if not settings.PROFILER_SECRET:
+        return False
+    expires_at, _, _ = token.partition(".")
+    if not expires_at.isdigit() or int(expires_at) < time.time():
+        return False
+    return hmac.compare_digest(sign_profile_token(int(expires_at)), token)
+
+
+profiler = SamplingProfiler()
@@ -0,0 +1,83 @@
+"""
+Retry and circuit breaker helpers for upstream HTTP calls
+"""
+
+import asyncio
+import random
+import time
+from typing import Awaitable, Callable, Tuple, Type
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is refused because the circuit is open"""
+
+
+class CircuitBreaker:
+    """Stop calling an upstream that keeps failing.
+
+    After `failure_threshold` consecutive failures the circuit opens and
+    calls fail immediately for `reset_timeout` seconds. The next call after
+    that is let through as a probe: success closes the circuit, failure
+    opens it again.
+    """
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = 0.0
+        self.rejected = 0
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self.failures < self.failure_threshold:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    async def call(self, fn: Callable[[], Awaitable]):
+        state = self.state
+        if state == "open" or (state == "half-open" and self._probing):
+            self.rejected += 1
+            raise CircuitOpenError(f"{self.name} is unavailable, try again later")
+        self._probing = state == "half-open"
+        try:
+            result = await fn()
+        except Exception:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            raise
+        finally:
+            self._probing = False
+        self.failures = 0
+        return result
+
+    def stats(self) -> dict:
+        return {
+            "name": self.name,
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "rejected": self.rejected,
+        }
+
+
+async def retry_with_backoff(
+    fn: Callable[[], Awaitable],
+    attempts: int,
+    base_delay: float = 0.1,
+    max_delay: float = 2.0,
+    retry_on: Tuple[Type[BaseException], ...] = (Exception,)
+):
+    """Call `fn`, retrying failures with full-jitter exponential backoff"""
+    for attempt in range(attempts):
+        try:
+            return await fn()
+        except retry_on:
+            if attempt == attempts - 1:
+                raise
+            delay = min(max_delay, base_delay * (2 ** attempt))
+            await asyncio.sleep(random.uniform(0, delay))
@@ -0,0 +1,34 @@
+from fastapi import APIRouter, HTTPException, Header, Query
+from fastapi.responses import PlainTextResponse
+from typing import Optional
+import hmac
+from app.config import settings
+from app.profiler import profiler
+
+router = APIRouter(prefix="/admin", tags=["admin"])
+
+def require_admin(token: Optional[str]):
+    if not settings.PROFILER_SECRET or not token or not hmac.compare_digest(token, settings.PROFILER_SECRET):
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+@router.get("/profiles")
+async def get_profiles(x_admin_token: Optional[str] = Header(None)):
+    """Summary of profiled requests and samples per route"""
+    require_admin(x_admin_token)
+    return profiler.summary()
+
+@router.get("/profiles/collapsed", response_class=PlainTextResponse)
+async def get_collapsed_profiles(
+    route: Optional[str] = Query(None),
+    x_admin_token: Optional[str] = Header(None)
+):
+    """Collapsed stacks per route, ready for flamegraph.pl or speedscope"""
+    require_admin(x_admin_token)
+    return PlainTextResponse(profiler.collapsed(route))
+
+@router.delete("/profiles")
+async def reset_profiles(x_admin_token: Optional[str] = Header(None)):
+    """Discard collected samples"""
+    require_admin(x_admin_token)
+    profiler.reset()
+    return {"message": "Profiles cleared"}
@@ -1,6 +1,7 @@
-from fastapi import APIRouter, HTTPException, Depends, status
+from fastapi import APIRouter, HTTPException, Depends, Query, status
 from app.models.auth import SignUpRequest, SignInRequest, AuthResponse
 from app.services.auth_service import AuthService
+from app.dependencies import get_access_token
 
 router = APIRouter(prefix="/api/auth", tags=["auth"])
 
@@ -32,10 +33,13 @@ async def sign_out(access_token: str):
         raise HTTPException(status_code=400, detail=str(e))
 
 @router.get("/user")
-async def get_user(access_token: str):
+async def get_user(
+    access_token: str = Depends(get_access_token),
+    remote: bool = Query(False)
+):
     """Get current user information"""
     try:
-        result = await AuthService.get_user(access_token)
+        result = await AuthService.get_user(access_token, remote)
         return result
     except Exception as e:
         raise HTTPException(status_code=401, detail=str(e))
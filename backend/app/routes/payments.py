@@ -1,27 +1,76 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query, Header, Request
+from typing import Optional
+import orjson
+from app.config import settings
 from app.models.payment import PaymentRequest, PaymentResponse, CryptomusCallback
-from app.services.payment_service import CryptomusService
+from app.services.payment_service import CryptomusService, IdempotencyConflictError
+from app.services.order_service import OrderStatusService
 
 router = APIRouter(prefix="/api/cryptomus", tags=["payments"])
 
 @router.post("/payment", response_model=PaymentResponse)
-async def create_payment(payment: PaymentRequest, user_id: str):
-    """Create a new payment request"""
+async def create_payment(
+    payment: PaymentRequest,
+    user_id: str,
+    idempotency_key: Optional[str] = Header(None, max_length=255)
+):
+    """Create a new payment request.
+
+    Send an ``Idempotency-Key`` header to make retries safe: a repeated key
+    returns the original payment instead of creating a second invoice, and
+    reusing a key for a different payment is refused with 409.
+    """
     try:
-        result = await CryptomusService.create_payment(payment, user_id)
+        result = await CryptomusService.create_payment(payment, user_id, idempotency_key)
         return result
+    except IdempotencyConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+async def read_body(request: Request, limit: int) -> bytes:
+    """Read a request body, giving up with 413 as soon as it passes `limit` bytes.
+
+    Chunked requests carry no Content-Length, so the limit is checked while
+    the body streams in rather than after it has all been buffered.
+    """
+    chunks = []
+    received = 0
+    async for chunk in request.stream():
+        received += len(chunk)
+        if received > limit:
+            raise HTTPException(status_code=413, detail="Callback body too large")
+        chunks.append(chunk)
+    return b"".join(chunks)
+
 @router.post("/callback")
-async def handle_callback(data: dict, signature: str):
-    """Handle payment callback from Cryptomus"""
+async def handle_callback(
+    request: Request,
+    signature: Optional[str] = Query(None),
+    sign: Optional[str] = Header(None)
+):
+    """Handle payment callback from Cryptomus.
+
+    The signature is checked against the raw body before any JSON parsing,
+    so forged or oversized callbacks are rejected cheaply.
+    """
+    content_length = request.headers.get("content-length", "")
+    if content_length.isdigit() and int(content_length) > settings.CALLBACK_MAX_BODY:
+        raise HTTPException(status_code=413, detail="Callback body too large")
+    body = await read_body(request, settings.CALLBACK_MAX_BODY)
+    
+    # Verify the callback signature
+    if not CryptomusService.verify_callback(body, sign or signature):
+        raise HTTPException(status_code=401, detail="Invalid signature")
+    
+    try:
+        data = orjson.loads(body)
+    except orjson.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="Invalid JSON body")
+    if not isinstance(data, dict):
+        raise HTTPException(status_code=400, detail="Invalid JSON body")
+    
     try:
-        # Verify the callback signature
-        is_valid = await CryptomusService.verify_callback(data, signature)
-        if not is_valid:
-            raise HTTPException(status_code=401, detail="Invalid signature")
-        
         # Process the callback
         result = await CryptomusService.process_payment_callback(data)
         return result
@@ -32,7 +81,24 @@ async def handle_callback(data: dict, signature: str):
 async def get_payment_status(order_id: str):
     """Get payment status for an order"""
     try:
-        # Implement based on your database schema
-        return {"order_id": order_id, "status": "pending"}
+        result = await OrderStatusService.get_status(order_id)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not result:
+        raise HTTPException(status_code=404, detail="Order not found")
+    return result
+
+@router.get("/status/{order_id}/wait")
+async def wait_for_payment_status(
+    order_id: str,
+    current: Optional[str] = Query(None),
+    timeout: float = Query(25, gt=0, le=settings.ORDER_STATUS_MAX_WAIT)
+):
+    """Long-poll until the order status differs from `current`"""
+    try:
+        result = await OrderStatusService.wait_for_change(order_id, current, timeout)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
+    if not result:
+        raise HTTPException(status_code=404, detail="Order not found")
+    return result
@@ -1,7 +1,15 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
 from typing import Optional
-from app.models.product import ProductCreate, ProductUpdate, ProductResponse
+import json
+from app.models.product import ProductCreate, ProductUpdate, ProductResponse, ProductBatchRequest
 from app.services.product_service import ProductService
+from app.services.search_service import search_index
+from app.services.import_service import iter_csv, iter_ndjson
+from app.pagination import MAX_PAGE_SIZE
+from app.http_cache import conditional_response
+from app.serialization import fast_response
+from app.config import settings
 
 router = APIRouter(prefix="/api/products", tags=["products"])
 
@@ -16,36 +24,105 @@ async def create_product(product: ProductCreate):
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+@router.post("/import")
+async def import_products(
+    request: Request,
+    seller_id: str = Query(...),
+    format: Optional[str] = Query(None, pattern="^(csv|ndjson)$")
+):
+    """Bulk import products from a streamed CSV or NDJSON body"""
+    if format is None:
+        content_type = request.headers.get("content-type", "")
+        format = "csv" if "csv" in content_type else "ndjson"
+    parser = iter_csv if format == "csv" else iter_ndjson
+    try:
+        result = await ProductService.import_products(seller_id, parser(request.stream()))
+        return result
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/seller/{seller_id}/export")
+async def export_seller_products(seller_id: str):
+    """Stream a seller's whole catalog as NDJSON"""
+    async def lines():
+        async for row in ProductService.iter_seller_products(seller_id):
+            yield json.dumps(row, default=str) + "\n"
+    return StreamingResponse(
+        lines(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="products-{seller_id}.ndjson"'}
+    )
+
+@router.post("/batch")
+async def get_products_batch(request: ProductBatchRequest):
+    """Get many products by ID in one request"""
+    try:
+        result = await ProductService.get_products(request.ids)
+        return fast_response(result)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/search")
+async def search_products(
+    q: str = Query(..., min_length=1, max_length=200),
+    category: Optional[str] = Query(None),
+    limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+    offset: int = Query(0, ge=0, le=1000)
+):
+    """Ranked full-text search over title, description, category and badge"""
+    try:
+        await search_index.ensure_built()
+        result = search_index.search(q, category, limit, offset)
+        return fast_response(result)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @router.get("/{product_id}", response_model=ProductResponse)
-async def get_product(product_id: str):
+async def get_product(product_id: str, request: Request):
     """Get product by ID"""
     try:
         result = await ProductService.get_product(product_id)
         if not result:
             raise HTTPException(status_code=404, detail="Product not found")
-        return result
+        return conditional_response(
+            request, result, settings.CACHE_CONTROL_PRODUCT, ProductResponse
+        )
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @router.get("/seller/{seller_id}")
-async def get_seller_products(seller_id: str):
-    """Get all products by a seller"""
+async def get_seller_products(
+    seller_id: str,
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None)
+):
+    """Get a page of products by a seller, newest first"""
     try:
-        result = await ProductService.get_seller_products(seller_id)
-        return result
+        result = await ProductService.get_seller_products(seller_id, limit, cursor)
+        return fast_response(result)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
-@router.get("/", response_model=list)
+@router.get("/")
 async def get_all_products(
+    request: Request,
     category: Optional[str] = Query(None),
-    limit: int = Query(50, ge=1, le=100),
-    offset: int = Query(0, ge=0)
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    offset: int = Query(0, ge=0),
+    paginate: str = Query("offset", pattern="^(offset|cursor)$"),
+    cursor: Optional[str] = Query(None)
 ):
-    """Get all products with optional filtering and pagination"""
+    """Get all products with optional filtering and pagination.
+
+    Offset mode returns a plain list. Cursor mode (``paginate=cursor`` or any
+    ``cursor`` value) returns ``{"items": [...], "next_cursor": ...}``.
+    """
     try:
-        result = await ProductService.get_all_products(category, limit, offset)
-        return result
+        if paginate == "cursor" or cursor:
+            result = await ProductService.get_products_page(category, limit, cursor)
+        else:
+            result = await ProductService.get_all_products(category, limit, offset)
+        return conditional_response(request, result, settings.CACHE_CONTROL_PRODUCT_LIST)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -1,7 +1,11 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Request
 from typing import Optional
-from app.models.seller import SellerCreate, SellerUpdate, SellerResponse
+from app.models.seller import SellerCreate, SellerUpdate, SellerResponse, BulkVerifyRequest
 from app.services.seller_service import SellerService
+from app.pagination import MAX_PAGE_SIZE
+from app.http_cache import conditional_response
+from app.serialization import fast_response
+from app.config import settings
 
 router = APIRouter(prefix="/api/sellers", tags=["sellers"])
 
@@ -17,13 +21,17 @@ async def create_seller(seller: SellerCreate):
         raise HTTPException(status_code=400, detail=str(e))
 
 @router.get("/{seller_id}", response_model=SellerResponse)
-async def get_seller(seller_id: str):
+async def get_seller(seller_id: str, request: Request):
     """Get seller profile by ID"""
     try:
         result = await SellerService.get_seller_by_id(seller_id)
         if not result:
             raise HTTPException(status_code=404, detail="Seller not found")
-        return result
+        # Returning a Response skips response_model; the projection onto
+        # SellerResponse fields keeps the field filtering
+        return conditional_response(
+            request, result, settings.CACHE_CONTROL_SELLER, SellerResponse
+        )
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -34,7 +42,7 @@ async def get_seller_by_user(user_id: str):
         result = await SellerService.get_seller_by_user_id(user_id)
         if not result:
             raise HTTPException(status_code=404, detail="Seller profile not found")
-        return result
+        return fast_response(result, SellerResponse)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -50,10 +58,20 @@ async def update_seller(seller_id: str, seller: SellerUpdate):
         raise HTTPException(status_code=400, detail=str(e))
 
 @router.get("/")
-async def get_all_sellers(status: Optional[str] = Query(None)):
-    """Get all sellers, optionally filtered by verification status"""
+async def get_all_sellers(
+    status: Optional[str] = Query(None),
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None),
+    include_summary: Optional[bool] = Query(None)
+):
+    """Get a page of sellers, optionally filtered by verification status.
+
+    The status summary is included on the first page unless disabled.
+    """
+    if include_summary is None:
+        include_summary = cursor is None
     try:
-        result = await SellerService.get_all_sellers(status)
+        result = await SellerService.get_all_sellers(status, limit, cursor, include_summary)
         return result
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -79,3 +97,12 @@ async def reject_seller(seller_id: str, reason: str):
         return {"message": "Seller rejected", "seller": result}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
+
+@router.post("/bulk-verify")
+async def bulk_verify_sellers(request: BulkVerifyRequest):
+    """Approve or reject many sellers at once (admin only)"""
+    try:
+        result = await SellerService.bulk_verify(request.decisions)
+        return result
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
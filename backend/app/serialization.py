@@ -0,0 +1,34 @@
+"""
+Fast JSON serialization for rows returned by PostgREST
+"""
+
+from functools import lru_cache
+from typing import Tuple, Type, Union
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel
+
+@lru_cache(maxsize=None)
+def fields_of(model: Type[BaseModel]) -> Tuple[str, ...]:
+    """Field allowlist of a response model"""
+    return tuple(model.model_fields)
+
+def project(content: Union[dict, list], model: Type[BaseModel]) -> Union[dict, list]:
+    """Keep only the response model's fields on a row, list or cursor page.
+
+    PostgREST rows are already JSON-shaped, so projecting them is all the
+    shaping they need; pydantic revalidation would only repeat work. The
+    allowlist still guarantees columns outside the model (bank details on
+    internal selects, new table columns) never reach a response.
+    """
+    fields = fields_of(model)
+    if isinstance(content, list):
+        return [{name: row.get(name) for name in fields} for row in content]
+    if "items" in content and "id" not in content:
+        return dict(content, items=project(content["items"], model))
+    return {name: content.get(name) for name in fields}
+
+def fast_response(content, model: Type[BaseModel] = None, headers: dict = None) -> ORJSONResponse:
+    """Serialize with orjson, bypassing response_model validation"""
+    if model is not None:
+        content = project(content, model)
+    return ORJSONResponse(content, headers=headers)
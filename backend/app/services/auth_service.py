@@ -1,20 +1,14 @@
-from supabase import create_client
-from app.config import settings
+from app.clients import get_auth_client, run_blocking
 from app.models.auth import SignUpRequest, SignInRequest
-
-def get_supabase():
-    return create_client(
-        settings.SUPABASE_URL,
-        settings.SUPABASE_ANON_KEY
-    )
+from app.services.token_service import TokenVerifier
 
 class AuthService:
     @staticmethod
     async def sign_up(request: SignUpRequest):
         """Sign up a new user"""
-        supabase = get_supabase()
+        supabase = get_auth_client()
         try:
-            response = supabase.auth.sign_up({
+            response = await run_blocking(supabase.auth.sign_up, {
                 "email": request.email,
                 "password": request.password
             })
@@ -29,9 +23,9 @@ class AuthService:
     @staticmethod
     async def sign_in(request: SignInRequest):
         """Sign in a user"""
-        supabase = get_supabase()
+        supabase = get_auth_client()
         try:
-            response = supabase.auth.sign_in_with_password({
+            response = await run_blocking(supabase.auth.sign_in_with_password, {
                 "email": request.email,
                 "password": request.password
             })
@@ -45,20 +39,40 @@ class AuthService:
     
     @staticmethod
     async def sign_out(access_token: str):
-        """Sign out a user"""
-        supabase = get_supabase()
+        """Sign out a user.
+
+        The token is also revoked locally so cached claims stop
+        authenticating it. Other workers keep accepting it until it
+        expires unless they verify remotely.
+        """
+        supabase = get_auth_client()
         try:
-            supabase.auth.sign_out()
+            # The shared auth client holds no user session, so revoke the
+            # caller's token explicitly
+            await run_blocking(supabase.auth.admin.sign_out, access_token)
+            TokenVerifier.revoke(access_token)
             return True
         except Exception as e:
             raise Exception(f"Error signing out: {str(e)}")
     
     @staticmethod
-    async def get_user(access_token: str):
-        """Get current user info"""
-        supabase = get_supabase()
+    async def get_user(access_token: str, remote: bool = False):
+        """Get current user info.
+
+        The token is verified in-process and its claims cached until expiry.
+        The auth server is only asked when the token cannot be verified
+        locally or when `remote` is set.
+        """
         try:
-            response = supabase.auth.get_user(access_token)
+            if not remote:
+                claims = await TokenVerifier.verify(access_token)
+                if claims is not None:
+                    return {
+                        "user_id": claims["sub"],
+                        "email": claims.get("email")
+                    }
+            supabase = get_auth_client()
+            response = await run_blocking(supabase.auth.get_user, access_token)
             return {
                 "user_id": response.user.id,
                 "email": response.user.email
@@ -0,0 +1,243 @@
+"""
+Durable journal for payment callbacks, applied to orders in batches
+"""
+
+import asyncio
+import json
+import logging
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+from app.config import settings
+from app.database import DatabaseModels
+from app.services.stock_service import StockService
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS callbacks (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    order_id TEXT NOT NULL,
+    status TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    received_at REAL NOT NULL,
+    applied_at REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    orphaned_at REAL,
+    dead_at REAL,
+    UNIQUE (order_id, status)
+);
+CREATE INDEX IF NOT EXISTS callbacks_pending ON callbacks (applied_at, seq);
+"""
+
+# Created after _connect adds orphaned_at and dead_at to journals that predate them
+ORPHANED_INDEX = """
+CREATE INDEX IF NOT EXISTS callbacks_orphaned ON callbacks (orphaned_at) WHERE orphaned_at IS NOT NULL
+"""
+DEAD_INDEX = """
+CREATE INDEX IF NOT EXISTS callbacks_dead ON callbacks (dead_at) WHERE dead_at IS NOT NULL
+"""
+
+PENDING = "applied_at IS NULL AND orphaned_at IS NULL AND dead_at IS NULL"
+
+class CallbackQueue:
+    """Append-only SQLite journal of verified payment callbacks.
+
+    A callback is acknowledged as soon as it is committed to the journal.
+    Repeats of the same (order_id, status) are ignored. A background worker
+    drains pending rows in batches, keeps only the latest status per order
+    and applies one bulk update per distinct status, releasing or committing
+    the orders' stock holds along the way. Callbacks whose order does not
+    exist are flagged orphaned and kept, not marked applied, so they are
+    neither retried forever nor pruned.
+
+    After a failed batch the worker retries one order at a time, so a
+    single failing order cannot hold back the callbacks behind it. Rows
+    that fail CALLBACK_MAX_ATTEMPTS times are dead-lettered: kept and
+    logged, but no longer retried.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        # A single thread owns the connection, which also serializes writes
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="callback-queue")
+        self.applied_total = 0
+        self.orphaned_total = 0
+        self.dead_total = 0
+        self.duplicates_total = 0
+        self.last_batch_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    async def _run(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, fn, *args)
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=FULL")
+            self._conn.executescript(SCHEMA)
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(callbacks)")}
+            for column in ("orphaned_at", "dead_at"):
+                if column not in columns:
+                    self._conn.execute(f"ALTER TABLE callbacks ADD COLUMN {column} REAL")
+            self._conn.execute(ORPHANED_INDEX)
+            self._conn.execute(DEAD_INDEX)
+        return self._conn
+
+    async def open(self):
+        await self._run(self._connect)
+
+    async def close(self):
+        def _close():
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+        await self._run(_close)
+
+    async def enqueue(self, order_id: str, status: str, payload: dict) -> bool:
+        """Durably record a callback. Returns False for a duplicate."""
+        def _insert():
+            cursor = self._connect().execute(
+                "INSERT OR IGNORE INTO callbacks (order_id, status, payload, received_at) VALUES (?, ?, ?, ?)",
+                (order_id, status, json.dumps(payload), time.time())
+            )
+            return cursor.rowcount == 1
+        inserted = await self._run(_insert)
+        if not inserted:
+            self.duplicates_total += 1
+        return inserted
+
+    async def apply_pending(self) -> int:
+        """Apply one batch of pending callbacks to orders"""
+        def _fetch():
+            rows = self._connect().execute(
+                f"SELECT seq, order_id, status, attempts FROM callbacks WHERE {PENDING} ORDER BY seq LIMIT ?",
+                (settings.CALLBACK_BATCH_SIZE,)
+            ).fetchall()
+            # A row that failed before is retried with only its own order
+            if rows and rows[0][3] > 0:
+                rows = [row for row in rows if row[1] == rows[0][1]]
+            return [row[:3] for row in rows]
+        rows = await self._run(_fetch)
+        if not rows:
+            return 0
+
+        # Rows are in arrival order, so the last status seen per order wins
+        latest = {}
+        for _, order_id, status in rows:
+            latest[order_id] = status
+        by_status = {}
+        for order_id, status in latest.items():
+            by_status.setdefault(status, []).append(order_id)
+
+        seqs = [row[0] for row in rows]
+        missing = set()
+        try:
+            for status, order_ids in by_status.items():
+                updated = await DatabaseModels.update_orders_status(order_ids, status)
+                found = {row["id"] for row in updated or []}
+                missing.update(order_id for order_id in order_ids if order_id not in found)
+                await StockService.apply_payment_status(order_ids, status)
+        except Exception as e:
+            self.last_error = str(e)
+            await self._run(self._mark, "UPDATE callbacks SET attempts = attempts + 1 WHERE seq IN ({})", seqs)
+            await self._dead_letter(seqs)
+            raise
+
+        now = time.time()
+        orphaned = [seq for seq, order_id, _ in rows if order_id in missing]
+        if orphaned:
+            logger.warning(f"Payment callbacks for unknown orders: {', '.join(sorted(missing))}")
+            await self._run(self._mark, "UPDATE callbacks SET orphaned_at = ? WHERE seq IN ({})", orphaned, now)
+            self.orphaned_total += len(orphaned)
+        applied = [seq for seq, order_id, _ in rows if order_id not in missing]
+        if applied:
+            await self._run(self._mark, "UPDATE callbacks SET applied_at = ? WHERE seq IN ({})", applied, now)
+        self.applied_total += len(applied)
+        self.last_batch_at = now
+        self.last_error = None
+        return len(rows)
+
+    async def _dead_letter(self, seqs: list):
+        """Stop retrying rows that have used up CALLBACK_MAX_ATTEMPTS"""
+        def _exhausted():
+            placeholders = ",".join("?" * len(seqs))
+            return self._connect().execute(
+                f"SELECT seq, order_id, status FROM callbacks WHERE seq IN ({placeholders}) AND attempts >= ?",
+                (*seqs, settings.CALLBACK_MAX_ATTEMPTS)
+            ).fetchall()
+        exhausted = await self._run(_exhausted)
+        if not exhausted:
+            return
+        logger.error(
+            f"Payment callbacks dead-lettered after {settings.CALLBACK_MAX_ATTEMPTS} attempts: "
+            f"{', '.join(f'{order_id} ({status})' for _, order_id, status in exhausted)}"
+        )
+        await self._run(
+            self._mark, "UPDATE callbacks SET dead_at = ? WHERE seq IN ({})",
+            [row[0] for row in exhausted], time.time()
+        )
+        self.dead_total += len(exhausted)
+
+    def _mark(self, sql: str, seqs: list, *params):
+        placeholders = ",".join("?" * len(seqs))
+        self._connect().execute(sql.format(placeholders), (*params, *seqs))
+
+    async def prune(self):
+        """Forget applied callbacks older than the de-duplication window"""
+        cutoff = time.time() - settings.CALLBACK_RETENTION_DAYS * 86400
+        await self._run(lambda: self._connect().execute(
+            "DELETE FROM callbacks WHERE applied_at IS NOT NULL AND applied_at < ?", (cutoff,)
+        ))
+
+    async def run_worker(self):
+        """Drain the journal until cancelled"""
+        last_prune = 0.0
+        while True:
+            try:
+                applied = await self.apply_pending()
+                if time.monotonic() - last_prune > 3600:
+                    await self.prune()
+                    last_prune = time.monotonic()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error applying payment callbacks: {str(e)}")
+                applied = 0
+            # Keep draining while full batches come back
+            if applied < settings.CALLBACK_BATCH_SIZE:
+                await asyncio.sleep(settings.CALLBACK_FLUSH_INTERVAL)
+
+    async def stats(self) -> dict:
+        """Queue depth and lag of the oldest pending callback"""
+        def _query():
+            conn = self._connect()
+            depth, oldest = conn.execute(
+                f"SELECT COUNT(*), MIN(received_at) FROM callbacks WHERE {PENDING}"
+            ).fetchone()
+            orphaned = conn.execute(
+                "SELECT COUNT(*) FROM callbacks WHERE orphaned_at IS NOT NULL"
+            ).fetchone()[0]
+            dead = conn.execute(
+                "SELECT COUNT(*) FROM callbacks WHERE dead_at IS NOT NULL"
+            ).fetchone()[0]
+            return depth, oldest, orphaned, dead
+        depth, oldest, orphaned, dead = await self._run(_query)
+        return {
+            "depth": depth,
+            "lag_seconds": round(time.time() - oldest, 3) if oldest else 0.0,
+            "orphaned": orphaned,
+            "dead_lettered": dead,
+            "applied_total": self.applied_total,
+            "orphaned_total": self.orphaned_total,
+            "dead_lettered_total": self.dead_total,
+            "duplicates_total": self.duplicates_total,
+            "last_batch_at": self.last_batch_at,
+            "last_error": self.last_error,
+        }
+
+callback_queue = CallbackQueue(settings.CALLBACK_QUEUE_PATH)
@@ -0,0 +1,100 @@
+"""
+Streaming parsers and chunked inserts for bulk catalog import
+"""
+
+import codecs
+import csv
+import json
+from typing import AsyncIterator, Callable, List, Tuple
+from app.clients import get_supabase, execute
+
+# SQLSTATE classes for data exceptions and integrity violations: errors
+# caused by the values of a row rather than by the request
+ROW_ERROR_CLASSES = ("22", "23")
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Split a byte stream into text lines without buffering the whole body"""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending.rstrip("\r")
+
+async def iter_ndjson(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, object]]:
+    """Yield (line number, parsed object or error message) per NDJSON line"""
+    line_number = 0
+    async for line in iter_lines(chunks):
+        line_number += 1
+        if not line.strip():
+            continue
+        try:
+            yield line_number, json.loads(line)
+        except ValueError as e:
+            yield line_number, f"Invalid JSON: {str(e)}"
+
+async def iter_csv(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, object]]:
+    """Yield (record number, row dict or error message) per CSV record.
+
+    Quoted fields may span lines: a record is complete once it holds an even
+    number of quote characters, which holds for RFC 4180 escaping ("").
+    """
+    header: List[str] = []
+    record: List[str] = []
+    quotes = 0
+    record_number = 0
+    async for line in iter_lines(chunks):
+        record.append(line)
+        quotes += line.count('"')
+        if quotes % 2:
+            continue
+        text = "\n".join(record)
+        record, quotes = [], 0
+        if not text.strip():
+            continue
+        try:
+            values = next(csv.reader([text]))
+        except csv.Error as e:
+            record_number += 1
+            yield record_number, f"Invalid CSV: {str(e)}"
+            continue
+        if not header:
+            header = [name.strip() for name in values]
+            continue
+        record_number += 1
+        if len(values) != len(header):
+            yield record_number, f"Expected {len(header)} columns, got {len(values)}"
+            continue
+        # Empty cells mean "not provided" so optional fields keep defaults
+        yield record_number, {name: value for name, value in zip(header, values) if value != ""}
+    if record:
+        yield record_number + 1, "Unterminated quoted field"
+
+async def insert_rows(
+    table: str,
+    rows: List[Tuple[int, dict]],
+    fail: Callable[[int, str], None]
+) -> List[dict]:
+    """Insert numbered rows in one request and return the rows inserted.
+
+    Postgres rejects a whole multi-row insert for one bad row. When that
+    happens the rows are split in half and each half retried, so a bad row
+    fails on its own after a few extra requests and the rest still go in.
+    Other errors fail every row through `fail(row_number, error)`.
+    """
+    supabase = get_supabase()
+    try:
+        response = await execute(supabase.table(table).insert([row for _, row in rows]))
+        return response.data or []
+    except Exception as e:
+        code = str(getattr(e, "code", None) or "")
+        if len(rows) > 1 and code.startswith(ROW_ERROR_CLASSES):
+            middle = len(rows) // 2
+            return await insert_rows(table, rows[:middle], fail) + await insert_rows(table, rows[middle:], fail)
+        for row_number, _ in rows:
+            fail(row_number, f"Insert failed: {str(e)}")
+        return []
@@ -0,0 +1,88 @@
+"""
+Order status lookups served from memory for polling clients
+"""
+
+import asyncio
+import time
+from typing import Optional
+from app.cache import TTLCache
+from app.config import settings
+from app.database import DatabaseModels
+
+order_status_cache = TTLCache(
+    "order_status",
+    ttl=settings.ORDER_STATUS_CACHE_TTL,
+    max_entries=settings.ORDER_STATUS_CACHE_SIZE
+)
+
+class OrderStatusService:
+    _waiters: dict = {}
+
+    @staticmethod
+    async def get_status(order_id: str) -> Optional[dict]:
+        """Get an order's payment status, reading the database at most once per TTL"""
+        cached = order_status_cache.get(order_id)
+        if cached is not None:
+            return cached
+        try:
+            order = await DatabaseModels.get_order_by_id(order_id)
+        except Exception as e:
+            raise Exception(f"Error fetching order status: {str(e)}")
+        if not order:
+            return None
+        result = {"order_id": order_id, "status": order.get("status")}
+        order_status_cache.set(order_id, result)
+        return result
+
+    @staticmethod
+    def remember(order_id: str, status: str):
+        """Cache the status of an order this worker just wrote"""
+        order_status_cache.set(order_id, {"order_id": order_id, "status": status})
+
+    @staticmethod
+    def set_status(order_id: str, status: str):
+        """Update the cached status in place and wake any waiting clients.
+
+        Called from the callback path before the order row is written, so
+        the entry is kept long enough to cover the journal's apply lag.
+        """
+        order_status_cache.set(
+            order_id,
+            {"order_id": order_id, "status": status},
+            ttl=settings.ORDER_STATUS_CALLBACK_TTL
+        )
+        waiting = OrderStatusService._waiters.get(order_id)
+        if waiting is not None:
+            waiting[0].set()
+
+    @staticmethod
+    async def wait_for_change(order_id: str, current: Optional[str], timeout: float) -> Optional[dict]:
+        """Long-poll until the status differs from `current` or `timeout` passes.
+
+        Waiters are woken by set_status() in this process. Callbacks handled
+        by another worker are picked up by re-reading the status every
+        ORDER_STATUS_RECHECK seconds.
+        """
+        deadline = time.monotonic() + timeout
+        waiters = OrderStatusService._waiters
+        waiting = waiters.setdefault(order_id, [asyncio.Event(), 0])
+        waiting[1] += 1
+        event = waiting[0]
+        try:
+            while True:
+                event.clear()
+                result = await OrderStatusService.get_status(order_id)
+                remaining = deadline - time.monotonic()
+                if result is None or result["status"] != current or remaining <= 0:
+                    return result
+                try:
+                    await asyncio.wait_for(
+                        event.wait(),
+                        timeout=min(remaining, settings.ORDER_STATUS_RECHECK)
+                    )
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            waiting[1] -= 1
+            if waiting[1] == 0:
+                waiters.pop(order_id, None)
@@ -1,23 +1,98 @@
 import hashlib
+import hmac
+import logging
 import base64
 import json
+import re
+import time
 import httpx
+from typing import Optional
+from app.cache import TTLCache, SingleFlight
+from app.clients import CryptomusClient
 from app.config import settings
+from app.database import DatabaseModels
+from app.ids import new_order_id
+from app.resilience import CircuitBreaker, retry_with_backoff
+from app.metrics import observe_upstream
+from app.services.callback_queue import callback_queue
+from app.services.order_service import OrderStatusService
+from app.services.stock_service import StockService
 from app.models.payment import PaymentRequest, PaymentResponse
-from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+cryptomus_breaker = CircuitBreaker(
+    "Cryptomus",
+    failure_threshold=settings.CRYPTOMUS_BREAKER_THRESHOLD,
+    reset_timeout=settings.CRYPTOMUS_BREAKER_RESET
+)
+
+# (user_id, Idempotency-Key) -> (request fingerprint, PaymentResponse)
+payment_idempotency_cache = TTLCache(
+    "payment_idempotency",
+    ttl=settings.PAYMENT_IDEMPOTENCY_TTL,
+    max_entries=settings.PAYMENT_IDEMPOTENCY_MAX_ENTRIES
+)
+payment_creations = SingleFlight("payment_creations")
+# (user_id, Idempotency-Key) -> request fingerprint of the creation in flight
+pending_fingerprints = {}
+
+SIGNATURE_PATTERN = re.compile(r"[0-9a-fA-F]{32}")
+# Cryptomus appends its signature to the body it signed as a last "sign" member
+EMBEDDED_SIGNATURE = re.compile(rb',\s*"sign"\s*:\s*"([0-9a-fA-F]{32})"(?=\s*}\s*$)')
+
+class UpstreamError(Exception):
+    """Retryable Cryptomus failure (rate limited or server error)"""
+
+class IdempotencyConflictError(Exception):
+    """Idempotency key reused with a different payment"""
 
 class CryptomusService:
     @staticmethod
     def generate_signature(payload: str, api_key: str) -> str:
         """Generate MD5 signature for Cryptomus API"""
-        message = base64.b64encode(payload.encode()).decode() + api_key
-        return hashlib.md5(message.encode()).hexdigest()
+        return CryptomusService.sign_bytes(payload.encode(), api_key)
     
     @staticmethod
-    async def create_payment(payment: PaymentRequest, user_id: str):
-        """Create a payment request with Cryptomus"""
+    def sign_bytes(payload: bytes, api_key: str) -> str:
+        """MD5 signature over the exact payload bytes"""
+        return hashlib.md5(base64.b64encode(payload) + api_key.encode()).hexdigest()
+    
+    @staticmethod
+    async def create_payment(payment: PaymentRequest, user_id: str, idempotency_key: Optional[str] = None):
+        """Create a payment request, at most once per idempotency key.
+
+        A retry carrying the same key gets the original PaymentResponse back,
+        and concurrent retries share one upstream call.
+        """
+        if not idempotency_key:
+            return await CryptomusService._create_payment(payment, user_id)
+        
+        key = (user_id, idempotency_key)
+        fingerprint = payment.model_dump_json()
+        cached = payment_idempotency_cache.get(key)
+        if cached is not None:
+            if cached[0] != fingerprint:
+                raise IdempotencyConflictError("Idempotency key was already used for a different payment")
+            return cached[1]
+        # A retry may only join a creation still in flight for the same payment
+        if pending_fingerprints.setdefault(key, fingerprint) != fingerprint:
+            raise IdempotencyConflictError("Idempotency key is in use for a different payment")
+        
+        async def create():
+            try:
+                result = await CryptomusService._create_payment(payment, user_id)
+                payment_idempotency_cache.set(key, (fingerprint, result))
+                return result
+            finally:
+                pending_fingerprints.pop(key, None)
+        return await payment_creations.do(key, create)
+    
+    @staticmethod
+    async def _create_payment(payment: PaymentRequest, user_id: str):
+        """Create a pending order and its Cryptomus payment request"""
         try:
-            order_id = f"order_{payment.product_id}_{int(datetime.now().timestamp())}"
+            order_id = new_order_id()
             
             payment_data = {
                 "amount": str(payment.amount),
@@ -26,7 +101,7 @@ class CryptomusService:
                 "url_return": f"{settings.SITE_URL}/store?payment=success",
                 "url_callback": f"{settings.API_URL}/api/cryptomus/callback",
                 "is_payment_multiple": False,
-                "lifetime": 7200,  # 2 hours
+                "lifetime": settings.CRYPTOMUS_PAYMENT_LIFETIME,
                 "to_currency": payment.currency,
             }
             
@@ -42,54 +117,124 @@ class CryptomusService:
                 "sign": signature
             }
             
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"{settings.CRYPTOMUS_API_URL}/payment",
-                    json=payment_data,
-                    headers=headers,
-                    timeout=10.0
+            # Hold the stock before the customer is sent to pay
+            await StockService.reserve(order_id, payment.product_id, payment.quantity)
+            try:
+                # Written before the invoice exists, so every callback finds its order
+                await DatabaseModels.create_order({
+                    "id": order_id,
+                    "user_id": user_id,
+                    "product_id": payment.product_id,
+                    "quantity": payment.quantity,
+                    "amount": payment.amount,
+                    "currency": payment.currency,
+                    "status": "pending"
+                })
+            except Exception:
+                await StockService.release([order_id])
+                raise
+            
+            client = CryptomusClient.get_instance()
+            
+            async def send():
+                # Send the exact bytes that were signed
+                started = time.perf_counter()
+                try:
+                    response = await client.post("/payment", content=payload, headers=headers)
+                except Exception:
+                    observe_upstream("cryptomus", "CryptomusService.create_payment", time.perf_counter() - started, True)
+                    raise
+                observe_upstream(
+                    "cryptomus", "CryptomusService.create_payment",
+                    time.perf_counter() - started, response.status_code != 200
                 )
-                
-                if response.status_code == 200:
-                    result = response.json()
-                    return PaymentResponse(
-                        payment_url=result.get("url"),
-                        order_id=order_id,
-                        status="pending"
+                if response.status_code == 429 or response.status_code >= 500:
+                    raise UpstreamError(f"Cryptomus API error: {response.status_code}")
+                return response
+            
+            try:
+                response = await cryptomus_breaker.call(
+                    lambda: retry_with_backoff(
+                        send,
+                        attempts=settings.CRYPTOMUS_RETRIES,
+                        retry_on=(httpx.TransportError, UpstreamError)
                     )
-                else:
-                    raise Exception(f"Cryptomus API error: {response.text}")
+                )
+            except Exception:
+                await CryptomusService._abandon(order_id)
+                raise
+            
+            if response.status_code == 200:
+                result = response.json()
+                # The client starts polling right away; answer from memory
+                OrderStatusService.remember(order_id, "pending")
+                return PaymentResponse(
+                    payment_url=result.get("url"),
+                    order_id=order_id,
+                    status="pending"
+                )
+            else:
+                await CryptomusService._abandon(order_id)
+                raise Exception(f"Cryptomus API error: {response.text}")
                     
         except Exception as e:
             raise Exception(f"Error creating payment: {str(e)}")
     
     @staticmethod
-    async def verify_callback(data: dict, signature: str) -> bool:
-        """Verify Cryptomus callback signature"""
+    async def _abandon(order_id: str):
+        """Release the stock and fail the order of a payment that was never created"""
         try:
-            payload = json.dumps(data)
-            expected_signature = CryptomusService.generate_signature(
-                payload,
-                settings.CRYPTOMUS_API_KEY
-            )
-            return signature == expected_signature
+            await StockService.release([order_id])
+            await DatabaseModels.update_order(order_id, {"status": "failed"})
         except Exception as e:
-            raise Exception(f"Error verifying callback: {str(e)}")
+            logger.error(f"Error abandoning order {order_id}: {str(e)}")
+    
+    @staticmethod
+    def verify_callback(body: bytes, signature: Optional[str] = None) -> bool:
+        """Verify a Cryptomus callback signature against the raw request body.
+
+        The signature comes from the ``sign`` header or query parameter, or
+        else from the ``sign`` member embedded in the body, which is cut out
+        of the bytes before hashing. Hashing the bytes as received avoids
+        re-serializing parsed JSON, whose key order and escaping need not
+        match what the sender signed.
+        """
+        if signature is None:
+            match = EMBEDDED_SIGNATURE.search(body)
+            if match is None:
+                return False
+            signature = match.group(1).decode()
+            body = body[:match.start()] + body[match.end():]
+        if not SIGNATURE_PATTERN.fullmatch(signature):
+            return False
+        expected_signature = CryptomusService.sign_bytes(body, settings.CRYPTOMUS_API_KEY)
+        return hmac.compare_digest(expected_signature, signature.lower())
     
     @staticmethod
     async def process_payment_callback(data: dict):
-        """Process payment callback from Cryptomus"""
+        """Queue a verified payment callback for the order update worker"""
         try:
             order_id = data.get("order_id")
             status = data.get("status")
+            if not order_id or not status:
+                raise Exception("Callback is missing order_id or status")
             
-            # Update order status in database
-            # This should be implemented based on your database schema
+            queued = await callback_queue.enqueue(order_id, status, data)
+            if queued:
+                OrderStatusService.set_status(order_id, status)
+                if not settings.BACKGROUND_TASKS:
+                    # No worker in this process, so apply the journal now. The
+                    # callback is already durable; a failed apply is retried
+                    # with the next callback.
+                    try:
+                        await callback_queue.apply_pending()
+                    except Exception as e:
+                        logger.error(f"Error applying payment callbacks: {str(e)}")
             
             return {
                 "order_id": order_id,
                 "status": status,
-                "processed": True
+                "queued": queued
             }
         except Exception as e:
             raise Exception(f"Error processing callback: {str(e)}")
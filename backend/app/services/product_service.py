@@ -1,60 +1,247 @@
-from supabase import create_client
+import asyncio
+import uuid
+from pydantic import ValidationError
+from app.clients import get_supabase, execute
+from app.cache import TTLCache, SingleFlight
 from app.config import settings
+from app.pagination import apply_keyset, paginate
+from app.services.import_service import insert_rows
+from app.services.search_service import search_index
+from app.services.seller_service import SellerService
 from app.models.product import ProductCreate, ProductUpdate
-from typing import Optional
+from typing import AsyncIterator, List, Optional, Tuple
 
-def get_supabase():
-    return create_client(
-        settings.SUPABASE_URL,
-        settings.SUPABASE_ANON_KEY
-    )
+product_cache = TTLCache(
+    "products",
+    ttl=settings.PRODUCT_CACHE_TTL,
+    max_entries=settings.PRODUCT_CACHE_MAX_ENTRIES,
+    max_bytes=settings.PRODUCT_CACHE_MAX_BYTES
+)
+product_fetches = SingleFlight("product_fetches")
+
+def invalidate_products(product_id: Optional[str] = None, seller_ids=()):
+    """Drop cached entries affected by a write to the products table"""
+    if product_id:
+        product_cache.invalidate(("product", product_id))
+    product_cache.invalidate_prefix("list")
+    for seller_id in seller_ids:
+        product_cache.invalidate_prefix("seller", seller_id)
 
 class ProductService:
     @staticmethod
     async def create_product(product: ProductCreate):
         supabase = get_supabase()
         try:
-            response = supabase.table("products").insert(product.dict()).execute()
+            response = await execute(supabase.table("products").insert(product.dict()))
+            invalidate_products(seller_ids=[product.seller_id])
+            for row in response.data or []:
+                search_index.add(row)
             return response.data[0] if response.data else None
         except Exception as e:
             raise Exception(f"Error creating product: {str(e)}")
     
     @staticmethod
     async def get_product(product_id: str):
-        supabase = get_supabase()
+        cached = product_cache.get(("product", product_id))
+        if cached is not None:
+            return cached
         try:
-            response = supabase.table("products").select("*").eq("id", product_id).execute()
-            return response.data[0] if response.data else None
+            return await product_fetches.do(product_id, lambda: ProductService._fetch_product(product_id))
         except Exception as e:
             raise Exception(f"Error fetching product: {str(e)}")
     
     @staticmethod
-    async def get_seller_products(seller_id: str):
+    async def _fetch_product(product_id: str):
+        # A write landing while the query runs bumps the generation, and the
+        # row read before it is then not cached
+        generation = product_cache.generation
+        supabase = get_supabase()
+        response = await execute(supabase.table("products").select("*").eq("id", product_id))
+        result = response.data[0] if response.data else None
+        if result:
+            product_cache.set(("product", product_id), result, generation=generation)
+        return result
+    
+    @staticmethod
+    async def get_products(product_ids: List[str]):
+        """Get many products by ID with at most one query for cache misses.
+
+        IDs that are not UUIDs cannot match a product, so they are reported
+        as missing without being sent to the database.
+        """
+        product_ids = list(dict.fromkeys(product_ids))
+        found = {}
+        # canonical UUID -> IDs as the caller spelled them
+        missing = {}
+        for product_id in product_ids:
+            cached = product_cache.get(("product", product_id))
+            if cached is not None:
+                found[product_id] = cached
+                continue
+            try:
+                canonical = str(uuid.UUID(product_id))
+            except ValueError:
+                continue
+            missing.setdefault(canonical, []).append(product_id)
+        if missing:
+            generation = product_cache.generation
+            supabase = get_supabase()
+            try:
+                response = await execute(supabase.table("products").select("*").in_("id", list(missing)))
+            except Exception as e:
+                raise Exception(f"Error fetching products: {str(e)}")
+            for row in response.data:
+                product_cache.set(("product", row["id"]), row, generation=generation)
+                for product_id in missing.get(row["id"], [row["id"]]):
+                    found[product_id] = row
+        return {
+            "items": [found[product_id] for product_id in product_ids if product_id in found],
+            "missing": [product_id for product_id in product_ids if product_id not in found]
+        }
+    
+    @staticmethod
+    async def get_seller_products(seller_id: str, limit: int = 50, cursor: Optional[str] = None):
+        key = ("seller", seller_id, limit, cursor)
+        cached = product_cache.get(key)
+        if cached is not None:
+            return cached
+        generation = product_cache.generation
         supabase = get_supabase()
         try:
-            response = supabase.table("products").select("*").eq("seller_id", seller_id).order("created_at", desc=True).execute()
-            return response.data
+            query = supabase.table("products").select("*").eq("seller_id", seller_id)
+            response = await execute(apply_keyset(query, cursor, limit))
+            result = paginate(response.data, limit)
+            product_cache.set(key, result, generation=generation)
+            return result
         except Exception as e:
             raise Exception(f"Error fetching products: {str(e)}")
     
     @staticmethod
     async def get_all_products(category: Optional[str] = None, limit: int = 50, offset: int = 0):
+        key = ("list", category, limit, offset)
+        cached = product_cache.get(key)
+        if cached is not None:
+            return cached
+        generation = product_cache.generation
         supabase = get_supabase()
         try:
             query = supabase.table("products").select("*")
             if category:
                 query = query.eq("category", category)
-            response = query.range(offset, offset + limit - 1).execute()
+            response = await execute(query.range(offset, offset + limit - 1))
+            product_cache.set(key, response.data, generation=generation)
             return response.data
         except Exception as e:
             raise Exception(f"Error fetching products: {str(e)}")
     
+    @staticmethod
+    async def get_products_page(category: Optional[str] = None, limit: int = 50, cursor: Optional[str] = None):
+        """Get one keyset page of products, newest first"""
+        key = ("list", category, limit, "cursor", cursor)
+        cached = product_cache.get(key)
+        if cached is not None:
+            return cached
+        generation = product_cache.generation
+        supabase = get_supabase()
+        try:
+            query = supabase.table("products").select("*")
+            if category:
+                query = query.eq("category", category)
+            response = await execute(apply_keyset(query, cursor, limit))
+            result = paginate(response.data, limit)
+            product_cache.set(key, result, generation=generation)
+            return result
+        except Exception as e:
+            raise Exception(f"Error fetching products: {str(e)}")
+    
+    @staticmethod
+    async def import_products(seller_id: str, records: AsyncIterator[Tuple[int, object]]):
+        """Validate and insert streamed rows in multi-row chunks.
+
+        Rows are validated against ProductCreate as they arrive and inserted
+        PRODUCT_IMPORT_CHUNK at a time, with up to PRODUCT_IMPORT_PARALLEL
+        inserts in flight while the next chunk is parsed. Every product is
+        assigned to `seller_id` regardless of what the row says, so the
+        seller is checked once up front; a row the database still rejects
+        fails on its own without taking its chunk down.
+        """
+        try:
+            seller_id = str(uuid.UUID(seller_id))
+        except ValueError:
+            raise Exception("Invalid seller id")
+        if not await SellerService.get_seller_by_id(seller_id):
+            raise Exception("Seller not found")
+        report = {"received": 0, "inserted": 0, "failed": 0, "errors": []}
+        pending = set()
+        
+        def fail(row_number: int, error: str):
+            report["failed"] += 1
+            if len(report["errors"]) < settings.PRODUCT_IMPORT_MAX_ERRORS:
+                report["errors"].append({"row": row_number, "error": error})
+        
+        async def insert(chunk):
+            inserted = await insert_rows("products", chunk, fail)
+            report["inserted"] += len(inserted)
+            for row in inserted:
+                search_index.add(row)
+        
+        async def flush(chunk):
+            if len(pending) >= settings.PRODUCT_IMPORT_PARALLEL:
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                pending.difference_update(done)
+            pending.add(asyncio.create_task(insert(chunk)))
+        
+        chunk = []
+        async for row_number, record in records:
+            report["received"] += 1
+            if not isinstance(record, dict):
+                fail(row_number, str(record) if isinstance(record, str) else "Row must be an object")
+                continue
+            try:
+                product = ProductCreate(**{**record, "seller_id": seller_id})
+            except ValidationError as e:
+                fail(row_number, "; ".join(
+                    f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}"
+                    for error in e.errors()
+                ))
+                continue
+            chunk.append((row_number, product.dict()))
+            if len(chunk) >= settings.PRODUCT_IMPORT_CHUNK:
+                await flush(chunk)
+                chunk = []
+        if chunk:
+            await flush(chunk)
+        if pending:
+            await asyncio.wait(pending)
+        
+        invalidate_products(seller_ids=[seller_id])
+        report["errors"].sort(key=lambda error: error["row"])
+        return report
+    
+    @staticmethod
+    async def iter_seller_products(seller_id: str, page_size: int = 1000):
+        """Yield a seller's products page by page, newest first"""
+        supabase = get_supabase()
+        cursor = None
+        while True:
+            query = supabase.table("products").select("*").eq("seller_id", seller_id)
+            response = await execute(apply_keyset(query, cursor, page_size))
+            page = paginate(response.data, page_size)
+            for row in page["items"]:
+                yield row
+            cursor = page["next_cursor"]
+            if not cursor:
+                break
+    
     @staticmethod
     async def update_product(product_id: str, product: ProductUpdate):
         supabase = get_supabase()
         try:
             update_data = {k: v for k, v in product.dict().items() if v is not None}
-            response = supabase.table("products").update(update_data).eq("id", product_id).execute()
+            response = await execute(supabase.table("products").update(update_data).eq("id", product_id))
+            invalidate_products(product_id, {row["seller_id"] for row in response.data or []})
+            for row in response.data or []:
+                search_index.add(row)
             return response.data[0] if response.data else None
         except Exception as e:
             raise Exception(f"Error updating product: {str(e)}")
@@ -63,7 +250,9 @@ class ProductService:
     async def delete_product(product_id: str):
         supabase = get_supabase()
         try:
-            response = supabase.table("products").delete().eq("id", product_id).execute()
+            response = await execute(supabase.table("products").delete().eq("id", product_id))
+            invalidate_products(product_id, {row["seller_id"] for row in response.data or []})
+            search_index.remove(product_id)
             return True
         except Exception as e:
             raise Exception(f"Error deleting product: {str(e)}")
@@ -0,0 +1,499 @@
+"""
+In-process full-text search index over the product catalog
+"""
+
+import asyncio
+import bisect
+import heapq
+import logging
+import math
+import re
+import time
+from collections import Counter, deque
+from itertools import repeat
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from app.cache import SingleFlight
+from app.clients import get_supabase, execute
+from app.config import settings
+from app.pagination import apply_keyset, paginate
+
+logger = logging.getLogger(__name__)
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Matches in the title count more than matches in the description
+FIELD_WEIGHTS = {"title": 3.0, "badge": 2.0, "category": 2.0, "description": 1.0}
+
+PRICE_BUCKETS = [(0, 1), (1, 2), (2, 3), (3, None)]
+PRICE_LABELS = [f"{low}+" if high is None else f"{low}-{high}" for low, high in PRICE_BUCKETS]
+
+# Too common to narrow a search down
+STOP_WORDS = frozenset({
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in",
+    "is", "it", "of", "on", "or", "the", "to", "with",
+})
+
+# Tokens in more products than this get a bitset and a ranking; result sets
+# up to this size are scored exhaustively
+DIRECT_SCORING_LIMIT = 1000
+
+def tokenize(text: Optional[str]) -> List[str]:
+    return TOKEN_PATTERN.findall(text.lower()) if text else []
+
+def price_bucket(price) -> str:
+    price = float(price or 0)
+    for low, high in PRICE_BUCKETS:
+        if high is None or price < high:
+            return f"{low}+" if high is None else f"{low}-{high}"
+    return "unknown"
+
+class SearchIndex:
+    """Inverted index with field-weighted TF-IDF ranking.
+
+    Postings map each token to {product_id: impact}, where impact is the
+    weighted term frequency divided by the square root of the document
+    length, so a product's score is the idf-weighted sum of its impacts. The
+    last query token also matches as a prefix so search-as-you-type works.
+
+    Queries with a rare term intersect postings and score every match.
+    Queries made only of common tokens never touch each match in Python:
+    every product has an ordinal, common tokens, categories and price
+    buckets keep a bitset of ordinals, and matches and facet counts are
+    bitwise ANDs and bit counts. Their top k comes from the threshold
+    algorithm over postings ranked by impact, which stops once no unseen
+    product can beat the current top k. Rankings are built on first use;
+    products changed since a ranking was built are scored up front until it
+    is rebuilt.
+    """
+
+    def __init__(self):
+        self._postings: Dict[str, Dict[str, float]] = {}
+        self._docs: Dict[str, dict] = {}
+        self._category_of: Dict[str, Optional[str]] = {}
+        self._price_of: Dict[str, str] = {}
+        # Bit i of a mask stands for the product with ordinal i
+        self._ordinals: Dict[str, int] = {}
+        self._ids: List[Optional[str]] = []
+        self._free: List[int] = []
+        self._masks: Dict[str, int] = {}
+        self._category_masks: Dict[Optional[str], int] = {}
+        self._price_masks: Dict[str, int] = {}
+        # token -> (product ids by descending impact, ids changed since)
+        self._rankings: Dict[str, Tuple[List[str], Set[str]]] = {}
+        self._sorted_tokens: Optional[List[str]] = None
+        # Writes made while a rebuild is running, replayed onto the new index
+        self._journal: Optional[list] = None
+        self._rebuilds = SingleFlight("search_rebuilds")
+        self.built_at: Optional[float] = None
+
+    def add(self, product: dict):
+        """Index a product row, replacing any previous version"""
+        if self._journal is not None:
+            self._journal.append((True, product))
+        self._add(product)
+
+    def remove(self, product_id: str):
+        if self._journal is not None:
+            self._journal.append((False, product_id))
+        self._remove(product_id)
+
+    def _add(self, product: dict, update_masks: bool = True):
+        product_id = product.get("id")
+        if not product_id:
+            return
+        self._remove(product_id)
+        weights = Counter()
+        for field, weight in FIELD_WEIGHTS.items():
+            for token in tokenize(product.get(field)):
+                weights[token] += weight
+        if self._free:
+            ordinal = self._free.pop()
+            self._ids[ordinal] = product_id
+        else:
+            ordinal = len(self._ids)
+            self._ids.append(product_id)
+        self._ordinals[product_id] = ordinal
+        # Dampen long documents so short titles that match rank higher
+        norm = math.sqrt(sum(weights.values())) or 1.0
+        for token, weight in weights.items():
+            postings = self._postings.get(token)
+            if postings is None:
+                postings = self._postings[token] = {}
+                self._sorted_tokens = None
+            postings[product_id] = weight / norm
+            if token in self._masks:
+                self._masks[token] |= 1 << ordinal
+            ranking = self._rankings.get(token)
+            if ranking is not None:
+                ranking[1].add(product_id)
+        category = product.get("category")
+        bucket = price_bucket(product.get("price"))
+        self._docs[product_id] = {"product": product, "tokens": list(weights)}
+        self._category_of[product_id] = category
+        self._price_of[product_id] = bucket
+        if update_masks:
+            bit = 1 << ordinal
+            self._category_masks[category] = self._category_masks.get(category, 0) | bit
+            self._price_masks[bucket] = self._price_masks.get(bucket, 0) | bit
+
+    def _remove(self, product_id: str):
+        doc = self._docs.pop(product_id, None)
+        if doc is None:
+            return
+        ordinal = self._ordinals.pop(product_id)
+        self._ids[ordinal] = None
+        self._free.append(ordinal)
+        keep = ~(1 << ordinal)
+        for token in doc["tokens"]:
+            postings = self._postings.get(token)
+            if postings is not None:
+                postings.pop(product_id, None)
+                if token in self._masks:
+                    self._masks[token] &= keep
+                if not postings:
+                    del self._postings[token]
+                    self._masks.pop(token, None)
+                    self._rankings.pop(token, None)
+                    self._sorted_tokens = None
+        for masks, key in (
+            (self._category_masks, self._category_of.pop(product_id)),
+            (self._price_masks, self._price_of.pop(product_id)),
+        ):
+            masks[key] &= keep
+            if not masks[key]:
+                del masks[key]
+
+    @staticmethod
+    def build(products: List[dict]) -> "SearchIndex":
+        """Build a standalone index from a catalog snapshot"""
+        fresh = SearchIndex()
+        # Growing a bitset one product at a time copies it every time, so
+        # the facet bitsets are made in one pass at the end
+        for product in products:
+            fresh._add(product, update_masks=False)
+        for masks, values in ((fresh._category_masks, fresh._category_of), (fresh._price_masks, fresh._price_of)):
+            groups: Dict[Optional[str], List[str]] = {}
+            for product_id, value in values.items():
+                groups.setdefault(value, []).append(product_id)
+            for value, product_ids in groups.items():
+                masks[value] = fresh._mask_of(product_ids)
+        # Prepare the common tokens now rather than on the first query
+        for token, postings in fresh._postings.items():
+            if len(postings) > DIRECT_SCORING_LIMIT:
+                fresh._mask(token)
+                fresh._ranking(token)
+        return fresh
+
+    def replace_all(self, fresh: "SearchIndex"):
+        """Swap in the contents of a freshly built index"""
+        self._postings = fresh._postings
+        self._docs = fresh._docs
+        self._category_of = fresh._category_of
+        self._price_of = fresh._price_of
+        self._ordinals = fresh._ordinals
+        self._ids = fresh._ids
+        self._free = fresh._free
+        self._masks = fresh._masks
+        self._category_masks = fresh._category_masks
+        self._price_masks = fresh._price_masks
+        self._rankings = fresh._rankings
+        self._sorted_tokens = None
+        self.built_at = time.time()
+
+    def _prefix_tokens(self, prefix: str) -> List[str]:
+        """Up to SEARCH_PREFIX_EXPANSION indexed tokens starting with `prefix`"""
+        if self._sorted_tokens is None:
+            self._sorted_tokens = sorted(self._postings)
+        tokens = self._sorted_tokens
+        start = bisect.bisect_left(tokens, prefix)
+        expanded = []
+        for token in tokens[start:start + settings.SEARCH_PREFIX_EXPANSION]:
+            if not token.startswith(prefix):
+                break
+            expanded.append(token)
+        return expanded
+
+    def _mask_of(self, product_ids: Iterable[str]) -> int:
+        # One "0"/"1" digit per ordinal, filled in and parsed without a Python loop
+        digits = bytearray(b"0") * len(self._ids)
+        deque(map(digits.__setitem__, map(self._ordinals.__getitem__, product_ids), repeat(ord("1"))), maxlen=0)
+        digits.reverse()
+        return int(digits, 2) if digits else 0
+
+    def _mask(self, token: str) -> int:
+        """Bitset of the products containing a common token, kept up to date once built"""
+        mask = self._masks.get(token)
+        if mask is None:
+            mask = self._masks[token] = self._mask_of(self._postings[token])
+        return mask
+
+    def _term_mask(self, tokens: List[str]) -> int:
+        """Bitset of the products matching any of `tokens`"""
+        mask = 0
+        rare = []
+        for token in tokens:
+            if token in self._masks or len(self._postings[token]) > DIRECT_SCORING_LIMIT:
+                mask |= self._mask(token)
+            else:
+                rare.extend(self._postings[token])
+        return mask | self._mask_of(rare) if rare else mask
+
+    def _members(self, mask: int) -> List[str]:
+        bits = format(mask, "b")
+        top = len(bits) - 1
+        return [self._ids[top - match.start()] for match in re.finditer("1", bits)]
+
+    def _ranking(self, token: str) -> Tuple[List[str], Set[str]]:
+        """Product ids for `token` by descending (impact, id), and the ids changed since.
+
+        The ranking is rebuilt once the changed products are more than an
+        eighth of the postings, or removed ones have left it twice too long.
+        """
+        postings = self._postings[token]
+        ranking = self._rankings.get(token)
+        if ranking is None or len(ranking[1]) * 8 > len(postings) or len(ranking[0]) > 2 * len(postings):
+            # Ties keep descending id order, matching how results are ordered
+            ranked = sorted(postings, reverse=True)
+            ranked.sort(key=postings.__getitem__, reverse=True)
+            ranking = self._rankings[token] = (ranked, set())
+        return ranking
+
+    def _ranked(self, token: str) -> Iterator[Tuple[float, str]]:
+        """(impact, product_id) for `token` in descending order, skipping changed products"""
+        postings = self._postings[token]
+        ranked, changed = self._ranking(token)
+        return (
+            (postings[product_id], product_id)
+            for product_id in ranked
+            if product_id in postings and product_id not in changed
+        )
+
+    @staticmethod
+    def _impact_of(postings_lists: List[Dict[str, float]]) -> Callable[[str], Optional[float]]:
+        """Impact of a query term on a product, or None; a prefix term takes its best token"""
+        if len(postings_lists) == 1:
+            return postings_lists[0].get
+        return lambda product_id: max(
+            (postings[product_id] for postings in postings_lists if product_id in postings), default=None
+        )
+
+    def _threshold_top(self, terms: list, category: Optional[str], k: int) -> List[Tuple[float, str]]:
+        """Top k (score, product_id) matching every term, walking ranked postings.
+
+        Each term's products are read in descending (impact, id) order,
+        round robin across terms. No unseen product can score more than the
+        sum of the impacts last read, so the walk stops once the k-th best
+        result beats that bound, or once any term runs out, since every
+        match has every term.
+        """
+        streams = []
+        changed = set()
+        for _, tokens, _ in terms:
+            streams.append(self._ranked(tokens[0]) if len(tokens) == 1 else heapq.merge(
+                *(self._ranked(token) for token in tokens), reverse=True
+            ))
+            for token in tokens:
+                changed |= self._rankings[token][1]
+        weighted = [(term[0], term[2]) for term in terms]
+        category_of = self._category_of
+        heap: List[Tuple[float, str]] = []
+        seen = set()
+
+        def consider(product_id: str):
+            seen.add(product_id)
+            if category and category_of.get(product_id) != category:
+                return
+            score = 0.0
+            for idf, impact_of in weighted:
+                impact = impact_of(product_id)
+                if impact is None:
+                    return
+                score += idf * impact
+            if len(heap) < k:
+                heapq.heappush(heap, (score, product_id))
+            elif (score, product_id) > heap[0]:
+                heapq.heapreplace(heap, (score, product_id))
+
+        # Changed products may sit anywhere in a stale ranking
+        for product_id in changed:
+            consider(product_id)
+        bounds = [math.inf] * len(streams)
+        last_ids = [""] * len(streams)
+        while True:
+            for index, stream in enumerate(streams):
+                entry = next(stream, None)
+                if entry is None:
+                    return heap
+                bounds[index] = weighted[index][0] * entry[0]
+                last_ids[index] = entry[1]
+                if entry[1] not in seen:
+                    consider(entry[1])
+            # An unseen product reaching the bound must also have a smaller
+            # id than every product last read, so it cannot win a tie
+            if len(heap) == k and heap[0] >= (sum(bounds), min(last_ids)):
+                return heap
+
+    def search(
+        self,
+        query: str,
+        category: Optional[str] = None,
+        limit: int = 20,
+        offset: int = 0
+    ) -> dict:
+        """Ranked search with facet counts by category and price bucket.
+
+        Stop words are ignored except as the last token, which may be the
+        start of a longer word.
+        """
+        empty = {"total": 0, "items": [], "facets": {"category": {}, "price": {}}}
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens:
+            return empty
+        last = tokens.pop()
+        tokens = [token for token in tokens if token not in STOP_WORDS]
+
+        expansions = [[token] if token in self._postings else [] for token in tokens]
+        if len(last) >= 2:
+            expansions.append(self._prefix_tokens(last))
+        else:
+            expansions.append([last] if last in self._postings else [])
+        if not all(expansions):
+            return empty
+
+        # (idf, tokens, impact) per query term, rarest first
+        doc_count = max(len(self._docs), 1)
+        terms = []
+        sizes = []
+        masks = {}
+        for expanded in expansions:
+            postings_lists = [self._postings[token] for token in expanded]
+            if len(expanded) == 1:
+                size = len(postings_lists[0])
+            elif sum(map(len, postings_lists)) <= DIRECT_SCORING_LIMIT:
+                size = len(set().union(*postings_lists))
+            else:
+                mask = masks[len(terms)] = self._term_mask(expanded)
+                size = mask.bit_count()
+            idf = math.log(1 + doc_count / (1 + size))
+            terms.append((idf, expanded, self._impact_of(postings_lists)))
+            sizes.append(size)
+        order = sorted(range(len(terms)), key=sizes.__getitem__)
+
+        def score(product_id: str) -> float:
+            return sum(idf * impact_of(product_id) for idf, _, impact_of in terms)
+
+        k = offset + limit
+        if sizes[order[0]] <= DIRECT_SCORING_LIMIT:
+            terms = [terms[index] for index in order]
+            # A rare term bounds the matches, so look at each one
+            matches = set().union(*(self._postings[token] for token in terms[0][1]))
+            for _, expanded, _ in terms[1:]:
+                matches = {
+                    product_id for product_id in matches
+                    if any(product_id in self._postings[token] for token in expanded)
+                }
+            category_counts = Counter(map(self._category_of.__getitem__, matches))
+            price_counts = Counter(map(self._price_of.__getitem__, matches))
+            candidates = [
+                product_id for product_id in matches
+                if not category or self._category_of[product_id] == category
+            ]
+            total = len(candidates)
+            top = heapq.nlargest(k, [(score(product_id), product_id) for product_id in candidates])
+        else:
+            mask = -1
+            for index in order:
+                mask &= masks[index] if index in masks else self._term_mask(terms[index][1])
+            terms = [terms[index] for index in order]
+            category_counts = Counter({
+                name: count for name, bits in self._category_masks.items()
+                if (count := (bits & mask).bit_count())
+            })
+            price_counts = Counter({
+                name: count for name, bits in self._price_masks.items()
+                if (count := (bits & mask).bit_count())
+            })
+            if category:
+                mask &= self._category_masks.get(category, 0)
+            total = mask.bit_count()
+            if total <= DIRECT_SCORING_LIMIT:
+                top = heapq.nlargest(k, [(score(product_id), product_id) for product_id in self._members(mask)])
+            else:
+                top = sorted(self._threshold_top(terms, category, k), reverse=True)
+        return {
+            "total": total,
+            "items": [
+                dict(self._docs[product_id]["product"], score=round(score, 4))
+                for score, product_id in top[offset:]
+            ],
+            "facets": {
+                "category": dict(category_counts.most_common()),
+                "price": {
+                    bucket: price_counts[bucket] for bucket in PRICE_LABELS if bucket in price_counts
+                },
+            },
+        }
+
+    def stats(self) -> dict:
+        return {
+            "documents": len(self._docs),
+            "tokens": len(self._postings),
+            "ranked_tokens": len(self._rankings),
+            "built_at": self.built_at,
+        }
+
+    async def rebuild(self):
+        """Load the whole catalog page by page and swap in a fresh index.
+
+        Writes made while the catalog loads may be missing from the pages
+        already read, so they are journalled and replayed onto the fresh
+        index before it is swapped in.
+        """
+        supabase = get_supabase()
+        products = []
+        cursor = None
+        page_size = 1000
+        self._journal = []
+        try:
+            while True:
+                query = supabase.table("products").select("*")
+                response = await execute(apply_keyset(query, cursor, page_size))
+                page = paginate(response.data, page_size)
+                products.extend(page["items"])
+                cursor = page["next_cursor"]
+                if not cursor:
+                    break
+            # Tokenizing a large catalog is CPU bound, so build it off the event
+            # loop and only swap it in on the loop
+            fresh = await asyncio.to_thread(SearchIndex.build, products)
+            for added, value in self._journal:
+                if added:
+                    fresh._add(value)
+                else:
+                    fresh._remove(value)
+            self.replace_all(fresh)
+        finally:
+            self._journal = None
+
+    async def ensure_built(self):
+        """Build the index on first use when no refresher has built it yet"""
+        if self.built_at is None:
+            await self._rebuilds.do("rebuild", self.rebuild)
+
+    async def run_refresher(self):
+        """Rebuild at startup and then every SEARCH_INDEX_REFRESH seconds.
+
+        Writes through ProductService update the index immediately; the
+        periodic rebuild picks up writes made by other workers or directly
+        in the database.
+        """
+        while True:
+            try:
+                await self._rebuilds.do("rebuild", self.rebuild)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error rebuilding search index: {str(e)}")
+            await asyncio.sleep(settings.SEARCH_INDEX_REFRESH)
+
+search_index = SearchIndex()
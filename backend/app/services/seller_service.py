@@ -1,48 +1,76 @@
-from supabase import create_client
+import uuid
+from app.clients import get_supabase, get_service_supabase, execute
+from app.cache import TTLCache
 from app.config import settings
-from app.models.seller import SellerCreate, SellerUpdate
+from app.models.seller import SellerCreate, SellerUpdate, SellerDecision
+from app.pagination import apply_keyset, paginate
 from typing import Optional, List
 
-class SupabaseClient:
-    _instance = None
-    
-    @staticmethod
-    def get_instance():
-        if SupabaseClient._instance is None:
-            SupabaseClient._instance = create_client(
-                settings.SUPABASE_URL,
-                settings.SUPABASE_ANON_KEY
-            )
-        return SupabaseClient._instance
+# Columns needed by list views; addresses, bank details and document URLs
+# are only returned by the detail routes
+SELLER_LIST_COLUMNS = "id,user_id,name,business_name,email,verification_status,created_at"
+
+# Profiles are stored once under ("id", seller_id); ("user", user_id) holds
+# only the seller id, or NOT_A_SELLER for users known to have no profile
+seller_cache = TTLCache(
+    "sellers",
+    ttl=settings.SELLER_CACHE_TTL,
+    max_entries=settings.SELLER_CACHE_MAX_ENTRIES
+)
+NOT_A_SELLER = "-"
 
-def get_supabase():
-    return SupabaseClient.get_instance()
+def cache_seller(seller: Optional[dict]):
+    if seller:
+        seller_cache.set(("id", seller["id"]), seller)
+        seller_cache.set(("user", seller["user_id"]), seller["id"])
+    return seller
+
+def invalidate_sellers(seller_ids=(), user_ids=()):
+    """Drop cached profiles and user aliases in one pass"""
+    seller_cache.invalidate_many(
+        [("id", seller_id) for seller_id in seller_ids] +
+        [("user", user_id) for user_id in user_ids]
+    )
 
 class SellerService:
     @staticmethod
     async def create_seller(seller: SellerCreate):
         supabase = get_supabase()
         try:
-            response = supabase.table("sellers").insert(seller.dict()).execute()
-            return response.data[0] if response.data else None
+            response = await execute(supabase.table("sellers").insert(seller.dict()))
+            invalidate_sellers(user_ids=[seller.user_id])
+            return cache_seller(response.data[0] if response.data else None)
         except Exception as e:
             raise Exception(f"Error creating seller: {str(e)}")
     
     @staticmethod
     async def get_seller_by_user_id(user_id: str):
+        seller_id = seller_cache.get(("user", user_id))
+        if seller_id == NOT_A_SELLER:
+            return None
+        if seller_id is not None:
+            cached = seller_cache.get(("id", seller_id))
+            if cached is not None:
+                return cached
         supabase = get_supabase()
         try:
-            response = supabase.table("sellers").select("*").eq("user_id", user_id).execute()
-            return response.data[0] if response.data else None
+            response = await execute(supabase.table("sellers").select("*").eq("user_id", user_id))
+            if not response.data:
+                seller_cache.set(("user", user_id), NOT_A_SELLER, ttl=settings.SELLER_NEGATIVE_CACHE_TTL)
+                return None
+            return cache_seller(response.data[0])
         except Exception as e:
             raise Exception(f"Error fetching seller: {str(e)}")
     
     @staticmethod
     async def get_seller_by_id(seller_id: str):
+        cached = seller_cache.get(("id", seller_id))
+        if cached is not None:
+            return cached
         supabase = get_supabase()
         try:
-            response = supabase.table("sellers").select("*").eq("id", seller_id).execute()
-            return response.data[0] if response.data else None
+            response = await execute(supabase.table("sellers").select("*").eq("id", seller_id))
+            return cache_seller(response.data[0] if response.data else None)
         except Exception as e:
             raise Exception(f"Error fetching seller: {str(e)}")
     
@@ -51,23 +79,43 @@ class SellerService:
         supabase = get_supabase()
         try:
             update_data = {k: v for k, v in seller.dict().items() if v is not None}
-            response = supabase.table("sellers").update(update_data).eq("id", seller_id).execute()
-            return response.data[0] if response.data else None
+            response = await execute(supabase.table("sellers").update(update_data).eq("id", seller_id))
+            invalidate_sellers(seller_ids=[seller_id])
+            return cache_seller(response.data[0] if response.data else None)
         except Exception as e:
             raise Exception(f"Error updating seller: {str(e)}")
     
     @staticmethod
-    async def get_all_sellers(status: Optional[str] = None):
+    async def get_all_sellers(
+        status: Optional[str] = None,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        include_summary: bool = False
+    ):
+        """Get one page of sellers with list-view columns only"""
         supabase = get_supabase()
         try:
-            query = supabase.table("sellers").select("*")
+            query = supabase.table("sellers").select(SELLER_LIST_COLUMNS)
             if status:
                 query = query.eq("verification_status", status)
-            response = query.execute()
-            return response.data
+            response = await execute(apply_keyset(query, cursor, limit))
+            result = paginate(response.data, limit)
+            if include_summary:
+                result["summary"] = await SellerService.get_status_summary()
+            return result
         except Exception as e:
             raise Exception(f"Error fetching sellers: {str(e)}")
     
+    @staticmethod
+    async def get_status_summary():
+        """Count sellers per verification status with one aggregate query"""
+        supabase = get_supabase()
+        try:
+            response = await execute(supabase.rpc("seller_status_counts", {}))
+            return {row["verification_status"]: row["total"] for row in response.data}
+        except Exception as e:
+            raise Exception(f"Error counting sellers: {str(e)}")
+    
     @staticmethod
     async def approve_seller(seller_id: str, notes: Optional[str] = None):
         supabase = get_supabase()
@@ -76,8 +124,9 @@ class SellerService:
                 "verification_status": "approved",
                 "verification_notes": notes
             }
-            response = supabase.table("sellers").update(update_data).eq("id", seller_id).execute()
-            return response.data[0] if response.data else None
+            response = await execute(supabase.table("sellers").update(update_data).eq("id", seller_id))
+            invalidate_sellers(seller_ids=[seller_id])
+            return cache_seller(response.data[0] if response.data else None)
         except Exception as e:
             raise Exception(f"Error approving seller: {str(e)}")
     
@@ -89,7 +138,55 @@ class SellerService:
                 "verification_status": "rejected",
                 "verification_notes": reason
             }
-            response = supabase.table("sellers").update(update_data).eq("id", seller_id).execute()
-            return response.data[0] if response.data else None
+            response = await execute(supabase.table("sellers").update(update_data).eq("id", seller_id))
+            invalidate_sellers(seller_ids=[seller_id])
+            return cache_seller(response.data[0] if response.data else None)
         except Exception as e:
             raise Exception(f"Error rejecting seller: {str(e)}")
+    
+    @staticmethod
+    async def bulk_verify(decisions: List[SellerDecision]):
+        """Approve or reject many sellers in one round trip"""
+        statuses = {"approve": "approved", "reject": "rejected"}
+        results = {}
+        payload = {}
+        order = []
+        for item in decisions:
+            try:
+                seller_id = str(uuid.UUID(item.seller_id))
+            except ValueError:
+                seller_id = item.seller_id
+                results[seller_id] = "invalid_id"
+            order.append(seller_id)
+            if seller_id in results:
+                continue
+            # A later decision for the same seller replaces an earlier one
+            payload[seller_id] = {
+                "seller_id": seller_id,
+                "status": statuses[item.decision],
+                "note": item.note
+            }
+        
+        updated = []
+        if payload:
+            supabase = get_service_supabase()
+            try:
+                response = await execute(supabase.rpc(
+                    "bulk_verify_sellers",
+                    {"decisions": list(payload.values())}
+                ))
+                updated = response.data or []
+            except Exception as e:
+                raise Exception(f"Error verifying sellers: {str(e)}")
+        
+        applied = {str(row["id"]): row["verification_status"] for row in updated}
+        invalidate_sellers(seller_ids=applied)
+        for seller_id in payload:
+            results[seller_id] = applied.get(seller_id, "not_found")
+        return {
+            "updated": len(applied),
+            "results": [
+                {"seller_id": seller_id, "status": results[seller_id]}
+                for seller_id in dict.fromkeys(order)
+            ]
+        }
@@ -0,0 +1,185 @@
+"""
+Stock reservations held for the lifetime of a checkout payment
+"""
+
+import asyncio
+import logging
+import time
+from typing import Dict, List, NamedTuple
+from app.clients import get_service_supabase, execute
+from app.cache import TTLCache
+from app.config import settings
+from app.services.product_service import invalidate_products
+
+logger = logging.getLogger(__name__)
+
+# Cryptomus statuses that end a payment without taking the goods
+RELEASE_STATUSES = {"cancel", "fail", "system_fail", "wrong_amount", "refund_paid"}
+COMMIT_STATUSES = {"paid", "paid_over"}
+
+# Smallest quantity the database just refused per product. A flash sale sends
+# many checkouts at the same row; rejecting locally for a moment keeps them
+# off the row lock.
+sold_out_cache = TTLCache("stock_sold_out", ttl=settings.STOCK_SOLD_OUT_TTL, max_entries=10000)
+
+class OutOfStockError(Exception):
+    """Not enough stock left to reserve"""
+
+class Reservation(NamedTuple):
+    product_id: str
+    quantity: int
+    expires_at: float
+
+class ReservationLedger:
+    """Holds placed by this worker, keyed by order id.
+
+    The database is the source of truth. The ledger tracks the holds this
+    worker is waiting on, so expiry and callbacks can reopen sold-out
+    products locally, and reports how much stock is held in flight.
+    """
+
+    def __init__(self):
+        self._holds: Dict[str, Reservation] = {}
+        self.reserved_total = 0
+        self.rejected_total = 0
+        self.released_total = 0
+        self.committed_total = 0
+        self.expired_total = 0
+
+    def add(self, order_id: str, reservation: Reservation):
+        self._holds[order_id] = reservation
+        self.reserved_total += 1
+
+    def pop_many(self, order_ids: List[str]) -> List[Reservation]:
+        return [
+            reservation for reservation in
+            (self._holds.pop(order_id, None) for order_id in order_ids)
+            if reservation is not None
+        ]
+
+    def pop_expired(self) -> List[Reservation]:
+        now = time.time()
+        expired = [order_id for order_id, hold in self._holds.items() if hold.expires_at < now]
+        self.expired_total += len(expired)
+        return self.pop_many(expired)
+
+    def stats(self) -> dict:
+        return {
+            "held_orders": len(self._holds),
+            "held_units": sum(hold.quantity for hold in self._holds.values()),
+            "reserved_total": self.reserved_total,
+            "rejected_total": self.rejected_total,
+            "released_total": self.released_total,
+            "committed_total": self.committed_total,
+            "expired_total": self.expired_total,
+            "sold_out_products": len(sold_out_cache),
+        }
+
+ledger = ReservationLedger()
+
+def reservation_lifetime() -> int:
+    """Seconds a hold lasts: the payment lifetime plus a grace period for late callbacks"""
+    return settings.CRYPTOMUS_PAYMENT_LIFETIME + settings.STOCK_RESERVATION_GRACE
+
+class StockService:
+    @staticmethod
+    async def reserve(order_id: str, product_id: str, quantity: int) -> int:
+        """Atomically take `quantity` units for an order. Returns the stock left."""
+        refused = sold_out_cache.get(product_id)
+        if refused is not None and quantity >= refused:
+            ledger.rejected_total += 1
+            raise OutOfStockError("Insufficient stock")
+
+        supabase = get_service_supabase()
+        lifetime = reservation_lifetime()
+        try:
+            response = await execute(supabase.rpc("reserve_stock", {
+                "p_order_id": order_id,
+                "p_product_id": product_id,
+                "p_quantity": quantity,
+                "p_lifetime_seconds": lifetime
+            }))
+        except Exception as e:
+            raise Exception(f"Error reserving stock: {str(e)}")
+
+        remaining = response.data
+        if remaining is None:
+            ledger.rejected_total += 1
+            sold_out_cache.set(product_id, min(quantity, refused or quantity))
+            raise OutOfStockError("Insufficient stock")
+
+        ledger.add(order_id, Reservation(product_id, quantity, time.time() + lifetime))
+        if remaining < quantity:
+            # Next checkout of this size will fail; stop showing stale stock
+            invalidate_products(product_id)
+        return remaining
+
+    @staticmethod
+    async def release(order_ids: List[str]) -> int:
+        """Return held stock for orders that will not be paid"""
+        if not order_ids:
+            return 0
+        supabase = get_service_supabase()
+        try:
+            response = await execute(supabase.rpc("release_stock", {"p_order_ids": order_ids}))
+        except Exception as e:
+            raise Exception(f"Error releasing stock: {str(e)}")
+
+        for reservation in ledger.pop_many(order_ids):
+            sold_out_cache.invalidate(reservation.product_id)
+            invalidate_products(reservation.product_id)
+        released = response.data or 0
+        ledger.released_total += released
+        return released
+
+    @staticmethod
+    async def commit(order_ids: List[str]) -> int:
+        """Keep the stock of paid orders for good"""
+        if not order_ids:
+            return 0
+        supabase = get_service_supabase()
+        try:
+            response = await execute(supabase.rpc("commit_stock", {"p_order_ids": order_ids}))
+        except Exception as e:
+            raise Exception(f"Error committing stock: {str(e)}")
+
+        ledger.pop_many(order_ids)
+        committed = response.data or 0
+        ledger.committed_total += committed
+        return committed
+
+    @staticmethod
+    async def apply_payment_status(order_ids: List[str], status: str):
+        """Release or commit holds according to a payment status"""
+        if status in RELEASE_STATUSES:
+            await StockService.release(order_ids)
+        elif status in COMMIT_STATUSES:
+            await StockService.commit(order_ids)
+
+    @staticmethod
+    async def release_expired() -> int:
+        """Release holds whose payment window has passed, in every worker"""
+        supabase = get_service_supabase()
+        try:
+            response = await execute(supabase.rpc("release_expired_stock", {}))
+        except Exception as e:
+            raise Exception(f"Error releasing expired stock: {str(e)}")
+
+        for reservation in ledger.pop_expired():
+            sold_out_cache.invalidate(reservation.product_id)
+            invalidate_products(reservation.product_id)
+        released = response.data or 0
+        ledger.released_total += released
+        return released
+
+    @staticmethod
+    async def run_sweeper():
+        """Release expired holds every STOCK_SWEEP_INTERVAL seconds"""
+        while True:
+            try:
+                await StockService.release_expired()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error sweeping stock reservations: {str(e)}")
+            await asyncio.sleep(settings.STOCK_SWEEP_INTERVAL)
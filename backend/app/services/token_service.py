@@ -0,0 +1,178 @@
+"""
+In-process verification of Supabase access tokens
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+import time
+from typing import Optional
+import httpx
+from Crypto.Hash import SHA256
+from Crypto.PublicKey import ECC, RSA
+from Crypto.Signature import DSS, pkcs1_15
+from app.cache import TTLCache
+from app.config import settings
+
+JWKS_REFRESH_INTERVAL = 60
+# Lifetime assumed for a revoked token whose expiry cannot be read
+DEFAULT_TOKEN_LIFETIME = 3600
+
+claims_cache = TTLCache(
+    "auth_claims",
+    ttl=DEFAULT_TOKEN_LIFETIME,
+    max_entries=settings.AUTH_CLAIMS_CACHE_SIZE
+)
+# Signed-out tokens, kept until they expire. Their signatures stay valid,
+# so without this list local verification would accept them again.
+revoked_tokens = TTLCache(
+    "auth_revoked",
+    ttl=DEFAULT_TOKEN_LIFETIME,
+    max_entries=settings.AUTH_CLAIMS_CACHE_SIZE
+)
+
+class InvalidTokenError(Exception):
+    """Raised when a token is malformed, forged or expired"""
+
+def _b64decode(segment: str) -> bytes:
+    return base64.urlsafe_b64decode(segment + "=" * (-len(segment) % 4))
+
+def token_key(token: str) -> str:
+    """Cache key for a token, so raw tokens are never held as keys"""
+    return hashlib.sha256(token.encode()).hexdigest()
+
+class TokenVerifier:
+    _jwks: dict = {}
+    _jwks_fetched_at = 0.0
+
+    @staticmethod
+    async def verify(token: str) -> Optional[dict]:
+        """Get verified claims for a token.
+
+        Returns cached claims when the token was seen before, otherwise checks
+        the signature against the JWT secret (HS256) or the project's JWKS
+        (RS256/ES256). Returns None when the token cannot be checked locally,
+        e.g. no secret is configured, so the caller can fall back to the auth
+        server. Raises InvalidTokenError for bad or expired tokens.
+        """
+        key = token_key(token)
+        if revoked_tokens.peek(key) is not None:
+            raise InvalidTokenError("Token has been revoked")
+        claims = claims_cache.get(key)
+        if claims is not None:
+            return claims
+        claims = await TokenVerifier._verify_signature(token)
+        if claims is None:
+            return None
+        TokenVerifier.check_claims(claims)
+        TokenVerifier.remember(token, claims)
+        return claims
+
+    @staticmethod
+    def remember(token: str, claims: dict):
+        """Cache verified claims until the token expires"""
+        ttl = claims.get("exp", 0) - time.time()
+        if ttl > 0:
+            claims_cache.set(token_key(token), claims, ttl=ttl)
+
+    @staticmethod
+    def revoke(token: str):
+        """Stop accepting a signed-out token in this process until it expires"""
+        key = token_key(token)
+        claims = claims_cache.peek(key)
+        if claims is None:
+            try:
+                claims = json.loads(_b64decode(token.split(".")[1]))
+            except Exception:
+                claims = {}
+        expires_at = claims.get("exp") if isinstance(claims, dict) else None
+        ttl = expires_at - time.time() if isinstance(expires_at, (int, float)) else DEFAULT_TOKEN_LIFETIME
+        if ttl > 0:
+            revoked_tokens.set(key, True, ttl=ttl)
+        claims_cache.invalidate(key)
+
+    @staticmethod
+    def check_claims(claims: dict):
+        now = time.time()
+        if "exp" not in claims or claims["exp"] <= now:
+            raise InvalidTokenError("Token has expired")
+        if claims.get("nbf", 0) > now + 5:
+            raise InvalidTokenError("Token is not yet valid")
+        audience = settings.SUPABASE_JWT_AUDIENCE
+        if audience:
+            aud = claims.get("aud")
+            allowed = aud if isinstance(aud, list) else [aud]
+            if audience not in allowed:
+                raise InvalidTokenError("Token audience is not accepted")
+        if not claims.get("sub"):
+            raise InvalidTokenError("Token has no subject")
+
+    @staticmethod
+    async def _verify_signature(token: str) -> Optional[dict]:
+        try:
+            header_segment, payload_segment, signature_segment = token.split(".")
+            header = json.loads(_b64decode(header_segment))
+            claims = json.loads(_b64decode(payload_segment))
+            signature = _b64decode(signature_segment)
+        except Exception:
+            raise InvalidTokenError("Malformed token")
+        signing_input = f"{header_segment}.{payload_segment}".encode()
+        alg = header.get("alg")
+
+        if alg == "HS256":
+            if not settings.SUPABASE_JWT_SECRET:
+                return None
+            expected = hmac.new(
+                settings.SUPABASE_JWT_SECRET.encode(), signing_input, hashlib.sha256
+            ).digest()
+            if not hmac.compare_digest(expected, signature):
+                raise InvalidTokenError("Invalid token signature")
+            return claims
+
+        if alg in ("RS256", "ES256"):
+            jwk = await TokenVerifier._get_jwk(header.get("kid"))
+            if jwk is None:
+                return None
+            digest = SHA256.new(signing_input)
+            try:
+                if alg == "RS256":
+                    public_key = RSA.construct((
+                        int.from_bytes(_b64decode(jwk["n"]), "big"),
+                        int.from_bytes(_b64decode(jwk["e"]), "big"),
+                    ))
+                    pkcs1_15.new(public_key).verify(digest, signature)
+                else:
+                    public_key = ECC.construct(
+                        curve="P-256",
+                        point_x=int.from_bytes(_b64decode(jwk["x"]), "big"),
+                        point_y=int.from_bytes(_b64decode(jwk["y"]), "big"),
+                    )
+                    DSS.new(public_key, "fips-186-3").verify(digest, signature)
+            except (ValueError, KeyError):
+                raise InvalidTokenError("Invalid token signature")
+            return claims
+
+        return None
+
+    @staticmethod
+    async def _get_jwk(kid: Optional[str]) -> Optional[dict]:
+        """Look up a signing key, refreshing the cached JWKS when stale"""
+        now = time.monotonic()
+        stale = now - TokenVerifier._jwks_fetched_at > settings.JWKS_CACHE_TTL
+        unknown = kid not in TokenVerifier._jwks
+        if stale or (unknown and now - TokenVerifier._jwks_fetched_at > JWKS_REFRESH_INTERVAL):
+            TokenVerifier._jwks_fetched_at = now
+            try:
+                async with httpx.AsyncClient(timeout=5.0) as client:
+                    response = await client.get(
+                        f"{settings.SUPABASE_URL}/auth/v1/.well-known/jwks.json",
+                        headers={"apikey": settings.SUPABASE_ANON_KEY}
+                    )
+                    response.raise_for_status()
+                    TokenVerifier._jwks = {
+                        key.get("kid"): key for key in response.json().get("keys", [])
+                    }
+            except Exception:
+                pass
+        return TokenVerifier._jwks.get(kid)
@@ -0,0 +1,137 @@
+"""
+Settings schema, imported on first use by app.config.get_settings
+"""
+
+import os
+from pydantic_settings import BaseSettings
+
+class Settings(BaseSettings):
+    # Supabase
+    SUPABASE_URL: str = os.getenv("NEXT_PUBLIC_SUPABASE_URL", "")
+    SUPABASE_ANON_KEY: str = os.getenv("NEXT_PUBLIC_SUPABASE_ANON_KEY", "")
+    SUPABASE_SERVICE_KEY: str = os.getenv("SUPABASE_SERVICE_ROLE_KEY", "")
+    SUPABASE_POOL_SIZE: int = int(os.getenv("SUPABASE_POOL_SIZE", "20"))
+    SUPABASE_POOL_KEEPALIVE: int = int(os.getenv("SUPABASE_POOL_KEEPALIVE", "10"))
+    SUPABASE_KEEPALIVE_EXPIRY: float = float(os.getenv("SUPABASE_KEEPALIVE_EXPIRY", "30"))
+    SUPABASE_TIMEOUT: float = float(os.getenv("SUPABASE_TIMEOUT", "10"))
+    SUPABASE_QUEUE_TIMEOUT: float = float(os.getenv("SUPABASE_QUEUE_TIMEOUT", "5"))
+    SUPABASE_JWT_SECRET: str = os.getenv("SUPABASE_JWT_SECRET", "")
+    SUPABASE_JWT_AUDIENCE: str = os.getenv("SUPABASE_JWT_AUDIENCE", "authenticated")
+    JWKS_CACHE_TTL: float = float(os.getenv("JWKS_CACHE_TTL", "600"))
+    AUTH_CLAIMS_CACHE_SIZE: int = int(os.getenv("AUTH_CLAIMS_CACHE_SIZE", "10000"))
+    
+    # Product catalog cache
+    PRODUCT_CACHE_TTL: float = float(os.getenv("PRODUCT_CACHE_TTL", "60"))
+    PRODUCT_CACHE_MAX_ENTRIES: int = int(os.getenv("PRODUCT_CACHE_MAX_ENTRIES", "5000"))
+    PRODUCT_CACHE_MAX_BYTES: int = int(os.getenv("PRODUCT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+    
+    # Seller profile cache
+    SELLER_CACHE_TTL: float = float(os.getenv("SELLER_CACHE_TTL", "120"))
+    SELLER_NEGATIVE_CACHE_TTL: float = float(os.getenv("SELLER_NEGATIVE_CACHE_TTL", "30"))
+    SELLER_CACHE_MAX_ENTRIES: int = int(os.getenv("SELLER_CACHE_MAX_ENTRIES", "20000"))
+    
+    # Bulk product import
+    PRODUCT_IMPORT_CHUNK: int = int(os.getenv("PRODUCT_IMPORT_CHUNK", "500"))
+    PRODUCT_IMPORT_PARALLEL: int = int(os.getenv("PRODUCT_IMPORT_PARALLEL", "2"))
+    PRODUCT_IMPORT_MAX_ERRORS: int = int(os.getenv("PRODUCT_IMPORT_MAX_ERRORS", "1000"))
+    
+    # Product search index
+    SEARCH_INDEX_REFRESH: float = float(os.getenv("SEARCH_INDEX_REFRESH", "300"))
+    SEARCH_PREFIX_EXPANSION: int = int(os.getenv("SEARCH_PREFIX_EXPANSION", "50"))
+    
+    # Cryptomus
+    CRYPTOMUS_MERCHANT_ID: str = os.getenv("CRYPTOMUS_MERCHANT_ID", "")
+    CRYPTOMUS_API_KEY: str = os.getenv("CRYPTOMUS_API_KEY", "")
+    CRYPTOMUS_API_URL: str = os.getenv("CRYPTOMUS_API_URL", "https://api.cryptomus.com/v1")
+    CRYPTOMUS_PAYMENT_LIFETIME: int = int(os.getenv("CRYPTOMUS_PAYMENT_LIFETIME", "7200"))
+    CRYPTOMUS_HTTP2: bool = os.getenv("CRYPTOMUS_HTTP2", "true").lower() == "true"
+    CRYPTOMUS_POOL_SIZE: int = int(os.getenv("CRYPTOMUS_POOL_SIZE", "20"))
+    CRYPTOMUS_POOL_KEEPALIVE: int = int(os.getenv("CRYPTOMUS_POOL_KEEPALIVE", "10"))
+    CRYPTOMUS_KEEPALIVE_EXPIRY: float = float(os.getenv("CRYPTOMUS_KEEPALIVE_EXPIRY", "60"))
+    CRYPTOMUS_TIMEOUT: float = float(os.getenv("CRYPTOMUS_TIMEOUT", "10"))
+    CRYPTOMUS_POOL_TIMEOUT: float = float(os.getenv("CRYPTOMUS_POOL_TIMEOUT", "2"))
+    CRYPTOMUS_RETRIES: int = int(os.getenv("CRYPTOMUS_RETRIES", "3"))
+    CRYPTOMUS_BREAKER_THRESHOLD: int = int(os.getenv("CRYPTOMUS_BREAKER_THRESHOLD", "5"))
+    CRYPTOMUS_BREAKER_RESET: float = float(os.getenv("CRYPTOMUS_BREAKER_RESET", "30"))
+    
+    # Payment callback queue
+    CALLBACK_QUEUE_PATH: str = os.getenv("CALLBACK_QUEUE_PATH", "callback_queue.db")
+    CALLBACK_BATCH_SIZE: int = int(os.getenv("CALLBACK_BATCH_SIZE", "200"))
+    CALLBACK_FLUSH_INTERVAL: float = float(os.getenv("CALLBACK_FLUSH_INTERVAL", "0.5"))
+    CALLBACK_RETENTION_DAYS: int = int(os.getenv("CALLBACK_RETENTION_DAYS", "7"))
+    CALLBACK_MAX_ATTEMPTS: int = int(os.getenv("CALLBACK_MAX_ATTEMPTS", "5"))
+    CALLBACK_MAX_BODY: int = int(os.getenv("CALLBACK_MAX_BODY", str(64 * 1024)))
+    
+    # Order status cache
+    ORDER_STATUS_CACHE_TTL: float = float(os.getenv("ORDER_STATUS_CACHE_TTL", "2"))
+    ORDER_STATUS_CALLBACK_TTL: float = float(os.getenv("ORDER_STATUS_CALLBACK_TTL", "60"))
+    ORDER_STATUS_CACHE_SIZE: int = int(os.getenv("ORDER_STATUS_CACHE_SIZE", "20000"))
+    ORDER_STATUS_RECHECK: float = float(os.getenv("ORDER_STATUS_RECHECK", "3"))
+    ORDER_STATUS_MAX_WAIT: float = float(os.getenv("ORDER_STATUS_MAX_WAIT", "30"))
+    
+    # Site
+    SITE_URL: str = os.getenv("NEXT_PUBLIC_SITE_URL", "http://localhost:3000")
+    API_URL: str = os.getenv("API_URL", "http://localhost:8000")
+    
+    # Payment creation
+    ID_NODE: int = int(os.getenv("ID_NODE", "-1"))
+    PAYMENT_IDEMPOTENCY_TTL: float = float(os.getenv("PAYMENT_IDEMPOTENCY_TTL", "86400"))
+    PAYMENT_IDEMPOTENCY_MAX_ENTRIES: int = int(os.getenv("PAYMENT_IDEMPOTENCY_MAX_ENTRIES", "100000"))
+    
+    # Stock reservations
+    STOCK_RESERVATION_GRACE: int = int(os.getenv("STOCK_RESERVATION_GRACE", "600"))
+    STOCK_SWEEP_INTERVAL: float = float(os.getenv("STOCK_SWEEP_INTERVAL", "60"))
+    STOCK_SOLD_OUT_TTL: float = float(os.getenv("STOCK_SOLD_OUT_TTL", "1"))
+    
+    # HTTP caching (Cache-Control per route)
+    CACHE_CONTROL_PRODUCT_LIST: str = os.getenv("CACHE_CONTROL_PRODUCT_LIST", "public, max-age=30, stale-while-revalidate=60")
+    CACHE_CONTROL_PRODUCT: str = os.getenv("CACHE_CONTROL_PRODUCT", "public, max-age=60, stale-while-revalidate=300")
+    CACHE_CONTROL_SELLER: str = os.getenv("CACHE_CONTROL_SELLER", "private, no-cache")
+    
+    # Response compression
+    COMPRESSION_ENABLED: bool = os.getenv("COMPRESSION_ENABLED", "true").lower() == "true"
+    COMPRESSION_ENCODINGS: str = os.getenv("COMPRESSION_ENCODINGS", "zstd,br,gzip")
+    COMPRESSION_MIN_SIZE: int = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+    COMPRESSION_OFFLOAD_SIZE: int = int(os.getenv("COMPRESSION_OFFLOAD_SIZE", str(64 * 1024)))
+    COMPRESSION_EXCLUDE_PATHS: str = os.getenv("COMPRESSION_EXCLUDE_PATHS", "")
+    COMPRESSION_GZIP_LEVEL: int = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+    COMPRESSION_BROTLI_QUALITY: int = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "5"))
+    COMPRESSION_ZSTD_LEVEL: int = int(os.getenv("COMPRESSION_ZSTD_LEVEL", "3"))
+    
+    # Admission control: "path-prefix=rate:burst" token buckets per client,
+    # "path-prefix=max-in-flight" concurrency limits
+    ADMISSION_ENABLED: bool = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+    RATE_LIMIT_RULES: str = os.getenv(
+        "RATE_LIMIT_RULES",
+        "/api/auth/sign-in=0.2:5,/api/auth/sign-up=0.1:3,/api/=20:40"
+    )
+    RATE_LIMIT_MAX_CLIENTS: int = int(os.getenv("RATE_LIMIT_MAX_CLIENTS", "100000"))
+    CONCURRENCY_LIMITS: str = os.getenv("CONCURRENCY_LIMITS", "/api/products=200,/api/sellers=100")
+    LOAD_SHED_LATENCY: float = float(os.getenv("LOAD_SHED_LATENCY", "2.0"))
+    # "path-prefix=upstream+upstream": the upstreams each route's shedding follows
+    LOAD_SHED_UPSTREAMS: str = os.getenv(
+        "LOAD_SHED_UPSTREAMS", "/api/cryptomus/payment=cryptomus+supabase,/api/=supabase"
+    )
+    ADMISSION_EXEMPT_PATHS: str = os.getenv("ADMISSION_EXEMPT_PATHS", "/health,/metrics,/stats,/api/cryptomus/callback")
+    # Anonymous clients are only rate limited by IP when this is set.
+    # TRUSTED_PROXY_HOPS counts the proxies in front of the API that append
+    # to X-Forwarded-For; 0 means clients connect directly.
+    TRUST_PROXY_HEADERS: bool = os.getenv("TRUST_PROXY_HEADERS", "false").lower() == "true"
+    TRUSTED_PROXY_HOPS: int = int(os.getenv("TRUSTED_PROXY_HOPS", "1"))
+    
+    # Sampling profiler
+    PROFILER_ENABLED: bool = os.getenv("PROFILER_ENABLED", "false").lower() == "true"
+    PROFILER_SAMPLE_RATE: float = float(os.getenv("PROFILER_SAMPLE_RATE", "0.01"))
+    PROFILER_INTERVAL: float = float(os.getenv("PROFILER_INTERVAL", "0.005"))
+    PROFILER_SECRET: str = os.getenv("PROFILER_SECRET", "")
+    
+    # Run the callback worker, search refresher and stock sweeper in-process.
+    # Serverless deployments turn this off and the work is done on demand.
+    BACKGROUND_TASKS: bool = os.getenv("BACKGROUND_TASKS", "true").lower() == "true"
+    
+    # CORS
+    CORS_ORIGINS: list = ["http://localhost:3000", "http://localhost:8000"]
+    
+    class Config:
+        env_file = ".env.local"
+        case_sensitive = True
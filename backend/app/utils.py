@@ -3,33 +3,83 @@ Utility functions for the backend
 """
 
 import re
-from typing import Optional
+from typing import Callable, Dict, Iterable, List, Optional
+
+EMAIL_PATTERN = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+# Accept various phone formats
+PHONE_PATTERN = re.compile(r'^\+?1?\d{9,15}$')
+GSTIN_PATTERN = re.compile(r'^\d{2}[A-Z]{5}\d{4}[A-Z]{1}[A-Z0-9]{1}[Z]{1}[A-Z0-9]{1}$')
+PAN_PATTERN = re.compile(r'^[A-Z]{5}[0-9]{4}[A-Z]{1}$')
+IFSC_PATTERN = re.compile(r'^[A-Z]{4}0[A-Z0-9]{6}$')
+
+def _normalize_phone(phone: str) -> str:
+    return phone.replace("-", "").replace(" ", "")
 
 def validate_email(email: str) -> bool:
     """Validate email format"""
-    pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-    return re.match(pattern, email) is not None
+    return EMAIL_PATTERN.match(email) is not None
 
 def validate_phone(phone: str) -> bool:
     """Validate phone number format"""
-    # Accept various phone formats
-    pattern = r'^\+?1?\d{9,15}$'
-    return re.match(pattern, phone.replace("-", "").replace(" ", "")) is not None
+    return PHONE_PATTERN.match(_normalize_phone(phone)) is not None
 
 def validate_gstin(gstin: str) -> bool:
     """Validate GSTIN format (Indian GST number)"""
-    pattern = r'^\d{2}[A-Z]{5}\d{4}[A-Z]{1}[A-Z0-9]{1}[Z]{1}[A-Z0-9]{1}$'
-    return re.match(pattern, gstin.upper()) is not None if gstin else True
+    return GSTIN_PATTERN.match(gstin.upper()) is not None if gstin else True
 
 def validate_pan(pan: str) -> bool:
     """Validate PAN format (Indian PAN number)"""
-    pattern = r'^[A-Z]{5}[0-9]{4}[A-Z]{1}$'
-    return re.match(pattern, pan.upper()) is not None
+    return PAN_PATTERN.match(pan.upper()) is not None
 
 def validate_ifsc(ifsc: str) -> bool:
     """Validate IFSC code format (Indian bank IFSC)"""
-    pattern = r'^[A-Z]{4}0[A-Z0-9]{6}$'
-    return re.match(pattern, ifsc.upper()) is not None
+    return IFSC_PATTERN.match(ifsc.upper()) is not None
+
+# Batch validation: (pattern, normalizer, whether empty values pass)
+BATCH_VALIDATORS = {
+    "email": (EMAIL_PATTERN, None, False),
+    "phone": (PHONE_PATTERN, _normalize_phone, False),
+    "gstin": (GSTIN_PATTERN, str.upper, True),
+    "pan": (PAN_PATTERN, str.upper, False),
+    "ifsc": (IFSC_PATTERN, str.upper, False),
+}
+
+def _batch_matches(kind: str, values: Iterable[Optional[str]]) -> List[bool]:
+    pattern, normalize, allow_empty = BATCH_VALIDATORS[kind]
+    match = pattern.match
+    values = ["" if value is None else value for value in values]
+    if normalize is not None:
+        values = list(map(normalize, values))
+    results = [match(value) is not None for value in values]
+    if allow_empty:
+        results = [ok or not value for ok, value in zip(results, values)]
+    return results
+
+def find_invalid(kind: str, values: Iterable[Optional[str]]) -> List[int]:
+    """Validate a whole column of values; return the indexes that fail.
+
+    `kind` is one of "email", "phone", "gstin", "pan" or "ifsc". Each value
+    is checked the same way as the matching validate_* function.
+    """
+    return [index for index, ok in enumerate(_batch_matches(kind, values)) if not ok]
+
+def find_invalid_columns(columns: Dict[str, Iterable[Optional[str]]]) -> Dict[str, List[int]]:
+    """Validate several columns at once, e.g. {"pan": [...], "ifsc": [...]}"""
+    return {kind: find_invalid(kind, values) for kind, values in columns.items()}
+
+def field_validator_for(kind: str, message: str) -> Callable[[Optional[str]], Optional[str]]:
+    """Build a pydantic field validator backed by a precompiled pattern"""
+    pattern, normalize, allow_empty = BATCH_VALIDATORS[kind]
+
+    def check(value: Optional[str]) -> Optional[str]:
+        if value is None or (allow_empty and not value):
+            return value
+        normalized = normalize(value) if normalize is not None else value
+        if pattern.match(normalized) is None:
+            raise ValueError(message)
+        return value
+
+    return check
 
 def sanitize_string(value: str, max_length: Optional[int] = None) -> str:
     """Sanitize string input"""
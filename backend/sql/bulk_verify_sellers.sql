@@ -0,0 +1,20 @@
+-- Apply many seller verification decisions in one statement.
+-- `decisions` is a JSON array of {"seller_id", "status", "note"} objects.
+-- Returns the rows that were updated; ids that match no seller are absent.
+-- Used by POST /api/sellers/bulk-verify, which calls it with the service
+-- role key; other roles may not call it.
+create or replace function public.bulk_verify_sellers(decisions jsonb)
+returns table (id uuid, verification_status text)
+language sql
+volatile
+as $$
+  update public.sellers s
+  set verification_status = d.status,
+      verification_notes = d.note
+  from jsonb_to_recordset(decisions) as d(seller_id uuid, status text, note text)
+  where s.id = d.seller_id
+  returning s.id, s.verification_status::text;
+$$;
+
+revoke execute on function public.bulk_verify_sellers(jsonb) from public, anon, authenticated;
+grant execute on function public.bulk_verify_sellers(jsonb) to service_role;
@@ -0,0 +1,32 @@
+-- Orders created at checkout and updated from payment callbacks.
+-- The backend writes orders with the service role key, which bypasses row
+-- level security; buyers may only read their own orders.
+-- Used by DatabaseModels (app/database.py) and the payment callback queue.
+
+create table if not exists public.orders (
+  id text primary key,
+  user_id uuid not null,
+  product_id uuid not null,
+  quantity integer not null check (quantity > 0),
+  amount numeric(12, 2) not null,
+  currency text not null default 'USDT',
+  status text not null default 'pending',
+  created_at timestamp with time zone default now(),
+  updated_at timestamp with time zone default now()
+);
+
+create index if not exists orders_user_created on public.orders (user_id, created_at desc);
+
+alter table public.orders enable row level security;
+
+drop policy if exists "Users can view their own orders" on public.orders;
+create policy "Users can view their own orders"
+  on public.orders
+  for select
+  using (auth.uid() = user_id);
+
+drop trigger if exists update_orders_updated_at on public.orders;
+create trigger update_orders_updated_at
+  before update on public.orders
+  for each row
+  execute function update_updated_at_column();
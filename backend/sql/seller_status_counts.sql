@@ -0,0 +1,13 @@
+-- Count sellers per verification status in a single aggregate query.
+-- Used by GET /api/sellers/ for the admin review queue summary.
+create or replace function public.seller_status_counts()
+returns table (verification_status text, total bigint)
+language sql
+stable
+as $$
+  select verification_status::text, count(*) as total
+  from public.sellers
+  group by verification_status;
+$$;
+
+grant execute on function public.seller_status_counts() to anon, authenticated;
@@ -0,0 +1,131 @@
+-- Stock holds for checkout.
+-- A reservation takes stock with a conditional decrement, so concurrent
+-- checkouts can never drive products.stock below zero: the row lock makes
+-- competing updates re-check `stock >= quantity` one at a time.
+-- The functions run as their owner and only the service role may call them;
+-- the backend calls them with the service role key.
+-- Used by StockService (app/services/stock_service.py).
+
+alter table public.products add column if not exists stock integer not null default 0;
+
+create table if not exists public.stock_reservations (
+  order_id text primary key,
+  product_id uuid not null references public.products(id) on delete cascade,
+  quantity integer not null check (quantity > 0),
+  status text not null default 'held' check (status in ('held', 'committed', 'released')),
+  expires_at timestamp with time zone not null,
+  created_at timestamp with time zone default now()
+);
+
+create index if not exists stock_reservations_held
+  on public.stock_reservations (expires_at) where status = 'held';
+
+-- No policies: holds are only read and written through the functions below
+alter table public.stock_reservations enable row level security;
+
+-- Hold `p_quantity` units for an order. Returns the remaining stock, or null
+-- when there is not enough. Repeating a call for the same order is a no-op.
+create or replace function public.reserve_stock(
+  p_order_id text, p_product_id uuid, p_quantity integer, p_lifetime_seconds integer
+)
+returns integer
+language plpgsql
+volatile
+security definer
+set search_path = public
+as $$
+declare
+  remaining integer;
+begin
+  insert into public.stock_reservations (order_id, product_id, quantity, expires_at)
+  values (p_order_id, p_product_id, p_quantity, now() + make_interval(secs => p_lifetime_seconds))
+  on conflict (order_id) do nothing;
+  if not found then
+    select stock into remaining from public.products where id = p_product_id;
+    return remaining;
+  end if;
+
+  update public.products
+  set stock = stock - p_quantity
+  where id = p_product_id and stock >= p_quantity
+  returning stock into remaining;
+  if not found then
+    delete from public.stock_reservations where order_id = p_order_id;
+    return null;
+  end if;
+  return remaining;
+end;
+$$;
+
+-- Return held stock for failed or cancelled orders. Returns the number of
+-- reservations released; orders that are not held are ignored.
+create or replace function public.release_stock(p_order_ids text[])
+returns integer
+language plpgsql
+volatile
+security definer
+set search_path = public
+as $$
+declare
+  released integer;
+begin
+  with freed as (
+    update public.stock_reservations
+    set status = 'released'
+    where order_id = any(p_order_ids) and status = 'held'
+    returning product_id, quantity
+  ), totals as (
+    select product_id, sum(quantity)::integer as quantity, count(*)::integer as orders
+    from freed group by product_id
+  ), restocked as (
+    update public.products p
+    set stock = p.stock + t.quantity
+    from totals t
+    where p.id = t.product_id
+    returning t.orders
+  )
+  select coalesce(sum(orders), 0) into released from restocked;
+  return released;
+end;
+$$;
+
+-- Mark paid orders so their stock is never released.
+create or replace function public.commit_stock(p_order_ids text[])
+returns integer
+language sql
+volatile
+security definer
+set search_path = public
+as $$
+  with committed as (
+    update public.stock_reservations
+    set status = 'committed'
+    where order_id = any(p_order_ids) and status = 'held'
+    returning 1
+  )
+  select count(*)::integer from committed;
+$$;
+
+-- Release every hold whose payment window has passed.
+create or replace function public.release_expired_stock()
+returns integer
+language sql
+volatile
+security definer
+set search_path = public
+as $$
+  select public.release_stock(array(
+    select order_id from public.stock_reservations
+    where status = 'held' and expires_at < now()
+  ));
+$$;
+
+revoke execute on function public.reserve_stock(text, uuid, integer, integer) from public, anon, authenticated;
+revoke execute on function public.release_stock(text[]) from public, anon, authenticated;
+revoke execute on function public.commit_stock(text[]) from public, anon, authenticated;
+revoke execute on function public.release_expired_stock() from public, anon, authenticated;
+
+grant execute on function public.reserve_stock(text, uuid, integer, integer) to service_role;
+grant execute on function public.release_stock(text[]) to service_role;
+grant execute on function public.commit_stock(text[]) to service_role;
+grant execute on function public.release_expired_stock() to service_role;
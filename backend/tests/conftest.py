@@ -0,0 +1,74 @@
+import os
+import tempfile
+
+# Settings are read from the environment on first use, so configure the
+# process before anything imports app.config
+os.environ.setdefault("NEXT_PUBLIC_SUPABASE_URL", "http://127.0.0.1:9")
+os.environ.setdefault("NEXT_PUBLIC_SUPABASE_ANON_KEY", "eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoiYW5vbiJ9.anon")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoic2VydmljZV9yb2xlIn0.service")
+os.environ.setdefault("CRYPTOMUS_API_KEY", "test-api-key")
+os.environ.setdefault("CRYPTOMUS_MERCHANT_ID", "test-merchant")
+os.environ.setdefault("CALLBACK_QUEUE_PATH", os.path.join(tempfile.mkdtemp(), "callback_queue.db"))
+
+import pytest
+from app.config import settings
+from tests.stubs import StubServer
+
+
+@pytest.fixture
+def supabase_stub(monkeypatch):
+    """Start a stub PostgREST server and point the Supabase clients at it.
+
+    Call the fixture with a handler (and optional latency) to get the
+    running StubServer back.
+    """
+    from app.clients import SupabaseClient
+    servers = []
+
+    def start(handler, latency: float = 0.0) -> StubServer:
+        server = StubServer(handler, latency).start()
+        servers.append(server)
+        SupabaseClient.shutdown()
+        monkeypatch.setattr(settings, "SUPABASE_URL", server.url)
+        return server
+
+    yield start
+    SupabaseClient.shutdown()
+    for server in servers:
+        server.stop()
+
+
+@pytest.fixture
+def cryptomus_stub(monkeypatch):
+    """Start a mock Cryptomus API and point the Cryptomus client at it.
+
+    Call the fixture (optionally with the status every payment request
+    gets) to get the running StubServer back. The circuit breaker starts
+    closed in every test.
+    """
+    from app.clients import CryptomusClient
+    from app.resilience import CircuitBreaker
+    from app.services import payment_service
+    servers = []
+    # The client is bound to the event loop of the test that created it
+    CryptomusClient._client = None
+
+    def start(status: int = 200, latency: float = 0.002) -> StubServer:
+        def handler(method, path, params, body):
+            if status != 200:
+                return status, {"message": "upstream error"}
+            return 200, {"url": f"https://pay.example/{body['order_id']}"}
+
+        server = StubServer(handler, latency).start()
+        servers.append(server)
+        monkeypatch.setattr(settings, "CRYPTOMUS_API_URL", f"{server.url}/v1")
+        monkeypatch.setattr(settings, "CRYPTOMUS_HTTP2", False)
+        return server
+
+    monkeypatch.setattr(payment_service, "cryptomus_breaker", CircuitBreaker(
+        "Cryptomus", settings.CRYPTOMUS_BREAKER_THRESHOLD, settings.CRYPTOMUS_BREAKER_RESET
+    ))
+    yield start
+    CryptomusClient._client = None
+    for server in servers:
+        server.stop()
@@ -0,0 +1,113 @@
+"""
+Local HTTP stand-ins for upstream services used by the tests
+"""
+
+import json
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Optional, Tuple
+
+# handler(method, path, params, body) -> (status, payload); payload is
+# encoded as JSON unless it is already bytes
+Handler = Callable[[str, str, dict, Optional[object]], Tuple[int, object]]
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # The default backlog of 5 drops bursts of new connections, which then
+    # retry a second later
+    request_queue_size = 256
+
+
+class StubServer:
+    """Threaded HTTP server on an ephemeral localhost port.
+
+    Every request sleeps `latency` seconds before the handler runs, to model
+    a remote round trip. The server counts requests and the peak number
+    handled at once, and keeps the Authorization headers it was sent.
+    """
+
+    def __init__(self, handler: Handler, latency: float = 0.0):
+        self.handler = handler
+        self.latency = latency
+        self.requests = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.authorizations = set()
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "StubServer":
+        stub = self
+
+        class RequestHandler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body are written separately; without this the
+            # body waits on a delayed ACK
+            disable_nagle_algorithm = True
+
+            def _handle(self):
+                parsed = urllib.parse.urlsplit(self.path)
+                length = int(self.headers.get("content-length") or 0)
+                raw = self.rfile.read(length) if length else b""
+                body = json.loads(raw) if raw else None
+                params = dict(urllib.parse.parse_qsl(parsed.query))
+                with stub._lock:
+                    stub.requests += 1
+                    stub.authorizations.add(self.headers.get("authorization"))
+                    stub.in_flight += 1
+                    stub.peak_in_flight = max(stub.peak_in_flight, stub.in_flight)
+                try:
+                    if stub.latency:
+                        time.sleep(stub.latency)
+                    status, payload = stub.handler(self.command, parsed.path, params, body)
+                finally:
+                    with stub._lock:
+                        stub.in_flight -= 1
+                content = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            do_GET = do_POST = do_PATCH = do_DELETE = _handle
+
+            def log_message(self, *args):
+                pass
+
+        self._server = _Server(("127.0.0.1", 0), RequestHandler)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+def postgrest_path(path: str) -> str:
+    """Table or rpc name from a PostgREST URL path, e.g. "products" or "rpc/reserve_stock" """
+    return path.split("/rest/v1/", 1)[-1]
+
+
+def filter_rows(rows, params: dict) -> list:
+    """Apply the eq. and in.() column filters of a PostgREST query to rows"""
+    selected = list(rows)
+    for column, condition in params.items():
+        if condition.startswith("eq."):
+            selected = [row for row in selected if str(row.get(column)) == condition[3:]]
+        elif condition.startswith("in.("):
+            values = {value.strip('"') for value in condition[4:-1].split(",")}
+            selected = [row for row in selected if str(row.get(column)) in values]
+    return selected
@@ -0,0 +1,74 @@
+"""
+Admission control: client addresses behind proxies and load shedding by
+the upstreams each route waits on
+"""
+
+from app import metrics
+from app.admission import AdmissionController, client_key
+from app.config import settings
+from app.metrics import DecayingAverage
+
+
+def scope(path: str = "/api/products/", forwarded: bytes = None) -> dict:
+    headers = [(b"x-forwarded-for", forwarded)] if forwarded is not None else []
+    return {"path": path, "headers": headers, "client": ("10.0.0.1", 5000)}
+
+
+def test_forwarded_address_is_read_from_the_right(monkeypatch):
+    # The client wrote "6.6.6.6"; the two proxies appended the rest
+    forwarded = b"6.6.6.6, 203.0.113.7, 10.0.0.2"
+    monkeypatch.setattr(settings, "TRUST_PROXY_HEADERS", True)
+    assert client_key(scope(forwarded=forwarded)) == "ip:10.0.0.2"
+    monkeypatch.setattr(settings, "TRUSTED_PROXY_HOPS", 2)
+    assert client_key(scope(forwarded=forwarded)) == "ip:203.0.113.7"
+    assert client_key(scope(forwarded=b"203.0.113.7")) == "ip:203.0.113.7"
+    assert client_key(scope(forwarded=b"")) == "ip:10.0.0.1"
+    # No proxy: the socket address is the client's, whatever the header says
+    monkeypatch.setattr(settings, "TRUSTED_PROXY_HOPS", 0)
+    assert client_key(scope(forwarded=forwarded)) == "ip:10.0.0.1"
+
+
+def test_anonymous_clients_share_no_bucket_without_proxy_trust(monkeypatch, caplog):
+    monkeypatch.setattr(settings, "RATE_LIMIT_RULES", "/api/=1:2")
+    assert client_key(scope(forwarded=b"6.6.6.6")) is None
+    with caplog.at_level("WARNING", logger="app.admission"):
+        controller = AdmissionController()
+    assert "TRUST_PROXY_HEADERS" in caplog.text
+    # Every anonymous client arrives from the proxy's address; none is refused
+    for _ in range(10):
+        refusal, rule = controller.check(scope())
+        assert refusal is None
+        if rule is not None:
+            controller.release(rule)
+
+    monkeypatch.setattr(settings, "TRUST_PROXY_HEADERS", True)
+    controller = AdmissionController()
+    refusals = [controller.check(scope(forwarded=b"203.0.113.7"))[0] for _ in range(3)]
+    assert [refusal and refusal[1] for refusal in refusals] == [None, None, "rate_limited"]
+
+
+def slow(monkeypatch, upstream: str):
+    average = DecayingAverage(window=60.0, weight=1.0)
+    average.observe(100.0)
+    monkeypatch.setitem(metrics.UPSTREAM_LATENCY_EWMA, upstream, average)
+
+
+def test_only_routes_waiting_on_a_slow_upstream_are_shed(monkeypatch):
+    monkeypatch.setattr(settings, "LOAD_SHED_LATENCY", 1.0)
+    slow(monkeypatch, "cryptomus")
+    controller = AdmissionController()
+
+    refusal, _ = controller.check(scope("/api/cryptomus/payment"))
+    assert refusal[:3] == (503, "load_shed", "/api/cryptomus/payment")
+    for path in ("/api/products/", "/api/cryptomus/status/order_1", "/health"):
+        refusal, rule = controller.check(scope(path))
+        assert refusal is None
+        if rule is not None:
+            controller.release(rule)
+    assert controller.stats()["shed_probability"]["cryptomus"] == 1.0
+
+    slow(monkeypatch, "supabase")
+    controller = AdmissionController()
+    refusal, _ = controller.check(scope("/api/products/"))
+    assert refusal[:3] == (503, "load_shed", "/api/")
+    assert controller.check(scope("/health")) == (None, None)
@@ -0,0 +1,69 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import time
+import uuid
+import pytest
+from app.admission import client_key
+from app.config import settings
+from app.services.auth_service import AuthService
+from app.services.token_service import TokenVerifier, claims_cache, token_key
+
+SECRET = "test-jwt-secret"
+
+
+def b64(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).decode().rstrip("=")
+
+
+def make_token(user_id: str, lifetime: int = 600) -> str:
+    header = b64(json.dumps({"alg": "HS256", "typ": "JWT"}).encode())
+    payload = b64(json.dumps({
+        "sub": user_id, "aud": "authenticated", "exp": int(time.time()) + lifetime
+    }).encode())
+    signature = hmac.new(SECRET.encode(), f"{header}.{payload}".encode(), hashlib.sha256).digest()
+    return f"{header}.{payload}.{b64(signature)}"
+
+
+def test_sign_out_stops_local_verification(supabase_stub, monkeypatch):
+    monkeypatch.setattr(settings, "SUPABASE_JWT_SECRET", SECRET)
+    logouts = []
+
+    def handler(method, path, params, body):
+        if path == "/auth/v1/logout":
+            logouts.append(method)
+            return 204, b""
+        return 404, {"message": "not found"}
+
+    supabase_stub(handler)
+    user_id = str(uuid.uuid4())
+    token = make_token(user_id)
+    scope = {"headers": [(b"authorization", f"Bearer {token}".encode())], "client": ("10.0.0.1", 5000)}
+
+    async def main():
+        user = await AuthService.get_user(token)
+        assert user["user_id"] == user_id
+        assert client_key(scope) == f"user:{user_id}"
+
+        await AuthService.sign_out(token)
+        assert logouts == ["POST"]
+        assert claims_cache.peek(token_key(token)) is None
+        # Rate limits no longer key on the signed-out user
+        assert client_key(scope) != f"user:{user_id}"
+        with pytest.raises(Exception, match="revoked"):
+            await AuthService.get_user(token)
+
+        # Other tokens of the same user are unaffected
+        other = make_token(user_id, lifetime=300)
+        assert (await AuthService.get_user(other))["user_id"] == user_id
+
+    asyncio.run(main())
+
+
+def test_revoke_unverified_token_uses_its_expiry():
+    token = make_token(str(uuid.uuid4()), lifetime=120)
+    TokenVerifier.revoke(token)
+    with pytest.raises(Exception, match="revoked"):
+        asyncio.run(TokenVerifier.verify(token))
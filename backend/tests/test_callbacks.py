@@ -0,0 +1,127 @@
+"""
+Payment callbacks: body limits and embedded signatures on streamed
+requests, and the cost of verifying signatures on raw bodies
+"""
+
+import asyncio
+import time
+import httpx
+import orjson
+from fastapi import FastAPI
+from app.config import settings
+from app.routes import payments
+from app.services.payment_service import CryptomusService
+
+TARGET_RATE = 10_000
+
+
+def callback_body(index: int) -> bytes:
+    return orjson.dumps({
+        "type": "payment", "uuid": f"uuid-{index}", "order_id": f"order_{index}", "amount": "15.00",
+        "payment_amount": "15.00", "merchant_amount": "14.70", "network": "tron", "currency": "USDT",
+        "payer_currency": "USDT", "status": "paid", "is_final": True, "additional_data": None,
+    })
+
+
+def post(**kwargs) -> httpx.Response:
+    app = FastAPI()
+    app.include_router(payments.router)
+
+    async def main():
+        async with httpx.AsyncClient(app=app, base_url="http://test") as client:
+            return await client.post("/api/cryptomus/callback", **kwargs)
+
+    return asyncio.run(main())
+
+
+def test_chunked_body_over_the_limit_is_refused_while_streaming(monkeypatch):
+    monkeypatch.setattr(settings, "CALLBACK_MAX_BODY", 1024)
+    sent = []
+
+    async def chunks():
+        for _ in range(1000):
+            sent.append(1)
+            yield b"x" * 256
+
+    # A streamed body has no Content-Length
+    response = post(content=chunks())
+    assert response.status_code == 413
+    assert len(sent) <= 5
+
+
+def embedded_sign_body(order_id: str = "order_1") -> bytes:
+    """A callback as Cryptomus sends it: `sign` is the last member of the body.
+
+    The signature covers the body without that member, byte for byte,
+    including PHP-style escaped slashes.
+    """
+    unsigned = (
+        b'{"type":"payment","uuid":"uuid-1","order_id":"' + order_id.encode() +
+        b'","amount":"15.00","status":"paid","is_final":true,'
+        b'"url_callback":"https:\\/\\/shop.example.com\\/api\\/cryptomus\\/callback"}'
+    )
+    signature = CryptomusService.sign_bytes(unsigned, settings.CRYPTOMUS_API_KEY)
+    return unsigned[:-1] + b', "sign": "' + signature.encode() + b'"}'
+
+
+def streamed(body: bytes, size: int = 16):
+    """Send `body` in small chunks with no Content-Length"""
+    async def chunks():
+        for start in range(0, len(body), size):
+            yield body[start:start + size]
+    return chunks()
+
+
+def test_streamed_body_with_embedded_signature(monkeypatch):
+    received = []
+
+    async def process(data):
+        received.append(data)
+        return {"order_id": data["order_id"], "status": data["status"], "queued": True}
+
+    monkeypatch.setattr(CryptomusService, "process_payment_callback", process)
+    body = embedded_sign_body()
+    assert CryptomusService.verify_callback(body)
+
+    response = post(content=streamed(body))
+    assert response.status_code == 200
+    assert received[0]["order_id"] == "order_1"
+    assert received[0]["url_callback"] == "https://shop.example.com/api/cryptomus/callback"
+
+    # Any change to the signed bytes, or to the signature, is refused
+    tampered = body.replace(b'"amount":"15.00"', b'"amount":"99.00"')
+    assert post(content=streamed(tampered)).status_code == 401
+    forged = body[:-35] + b'"' + b"0" * 32 + b'"}'
+    assert post(content=streamed(forged)).status_code == 401
+    # The signature must be the body's last member
+    moved = b'{"sign": "' + body[-34:-2] + b'", ' + body[1:body.rindex(b", ")] + b"}"
+    assert post(content=streamed(moved)).status_code == 401
+    assert len(received) == 1
+
+
+def test_signature_is_checked_before_parsing():
+    body = b"{not json"
+    assert post(content=body, headers={"sign": "0" * 32}).status_code == 401
+    signature = CryptomusService.sign_bytes(body, settings.CRYPTOMUS_API_KEY)
+    assert post(content=body, headers={"sign": signature}).status_code == 400
+
+
+def test_verification_keeps_up_with_10k_callbacks_per_second():
+    bodies = [callback_body(index) for index in range(20_000)]
+    signatures = [CryptomusService.sign_bytes(body, settings.CRYPTOMUS_API_KEY) for body in bodies]
+
+    started = time.perf_counter()
+    for body, signature in zip(bodies, signatures):
+        assert CryptomusService.verify_callback(body, signature)
+        orjson.loads(body)
+    accepted = len(bodies) / (time.perf_counter() - started)
+
+    started = time.perf_counter()
+    for body in bodies:
+        assert not CryptomusService.verify_callback(body, "0" * 32)
+    forged = len(bodies) / (time.perf_counter() - started)
+
+    print(f"\nverify and parse {accepted:,.0f} callbacks/s ({1e6 / accepted:.1f}us each), "
+          f"reject forged {forged:,.0f}/s; {TARGET_RATE:,}/s uses {TARGET_RATE / accepted:.0%} of a core")
+    assert accepted > TARGET_RATE
+    assert forged > TARGET_RATE
@@ -0,0 +1,122 @@
+"""
+Accept-Encoding negotiation and the response compression middleware
+"""
+
+import asyncio
+import gzip
+import orjson
+import pytest
+from app import compression
+from app.config import settings
+from app.middleware.middleware import CompressionMiddleware
+
+BODY = orjson.dumps([{"id": index, "title": "Desk lamp", "price": 25} for index in range(200)])
+
+
+def counted(counter, *labels) -> float:
+    return counter._values.get(labels, 0.0)
+
+
+def respond(chunks, headers=()):
+    """ASGI app sending `chunks` as the body, streamed when there are several"""
+    async def app(scope, receive, send):
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-type", b"application/json"), *headers],
+        })
+        for index, chunk in enumerate(chunks):
+            await send({"type": "http.response.body", "body": chunk, "more_body": index < len(chunks) - 1})
+    return app
+
+
+def run(app, accept_encoding=None, path="/api/products/"):
+    """Drive the middleware directly so the raw, still-encoded messages are seen"""
+    headers = [(b"accept-encoding", accept_encoding.encode())] if accept_encoding is not None else []
+    scope = {"type": "http", "method": "GET", "path": path, "headers": headers}
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(CompressionMiddleware(app)(scope, receive, send))
+    start, *bodies = messages
+    return dict(start["headers"]), [message["body"] for message in bodies]
+
+
+@pytest.mark.parametrize("accept_encoding,expected", [
+    ("gzip, br", "br"),
+    ("br;q=0, gzip", "gzip"),
+    ("gzip;q=0.8, br;q=0.9", "br"),
+    ("gzip;q=0.9, br;q=0.8", "gzip"),
+    ("GZIP", "gzip"),
+    ("gzip;q=0", None),
+    ("br;q=0, gzip;q=0", None),
+    ("*;q=0.5, gzip;q=0", "zstd"),
+    ("identity", None),
+    ("gzip;q=oops", None),
+])
+def test_negotiation_honours_q_values_and_server_preference(monkeypatch, accept_encoding, expected):
+    # Fixed preference so the cases do not depend on which codecs are installed
+    monkeypatch.setattr(compression, "preference", lambda: ["zstd", "br", "gzip"])
+    assert compression.negotiate(accept_encoding) == expected
+
+
+def test_only_installed_codecs_are_offered():
+    assert "gzip" in compression.preference()
+    assert set(compression.preference()) <= set(compression.available_codecs())
+    if "br" not in compression.available_codecs():
+        assert compression.negotiate("br") is None
+
+
+def test_large_bodies_are_compressed_and_counted():
+    input_before = counted(compression.COMPRESSION_INPUT, "gzip")
+    output_before = counted(compression.COMPRESSION_OUTPUT, "gzip")
+
+    original = [(b"vary", b"Origin"), (b"content-length", str(len(BODY)).encode())]
+    headers, bodies = run(respond([BODY], original), "gzip")
+    (compressed,) = bodies
+    assert headers[b"content-encoding"] == b"gzip"
+    assert headers[b"content-length"] == str(len(compressed)).encode()
+    assert headers[b"vary"] == b"Origin, Accept-Encoding"
+    assert gzip.decompress(compressed) == BODY
+    # Bytes saved are input minus output for the encoding
+    assert counted(compression.COMPRESSION_INPUT, "gzip") - input_before == len(BODY)
+    assert counted(compression.COMPRESSION_OUTPUT, "gzip") - output_before == len(compressed)
+    assert len(compressed) < len(BODY)
+
+
+@pytest.mark.parametrize("accept_encoding", [None, "", "gzip;q=0", "identity"])
+def test_clients_that_do_not_accept_a_codec_get_identity(accept_encoding):
+    headers, bodies = run(respond([BODY]), accept_encoding)
+    assert b"content-encoding" not in headers
+    assert b"vary" not in headers
+    assert bodies == [BODY]
+
+
+@pytest.mark.parametrize("reason,chunks,extra_headers", [
+    ("small", [b'{"status":"healthy"}'], []),
+    ("encoded", [BODY], [(b"content-encoding", b"identity")]),
+    ("streaming", [BODY[:2000], BODY[2000:]], []),
+])
+def test_skipped_responses_pass_through_unchanged(reason, chunks, extra_headers):
+    before = counted(compression.COMPRESSION_SKIPPED, reason)
+    headers, bodies = run(respond(chunks, extra_headers), "gzip")
+    assert headers.get(b"content-encoding") in (None, b"identity")
+    assert b"vary" not in headers
+    assert bodies == chunks
+    assert counted(compression.COMPRESSION_SKIPPED, reason) - before == 1
+
+
+def test_excluded_paths_and_the_disabled_flag_pass_through(monkeypatch):
+    monkeypatch.setattr(settings, "COMPRESSION_EXCLUDE_PATHS", "/metrics, /api/cryptomus/status")
+    headers, bodies = run(respond([BODY]), "gzip", path="/api/cryptomus/status/order_A/wait")
+    assert b"content-encoding" not in headers and bodies == [BODY]
+
+    monkeypatch.setattr(settings, "COMPRESSION_EXCLUDE_PATHS", "")
+    monkeypatch.setattr(settings, "COMPRESSION_ENABLED", False)
+    headers, bodies = run(respond([BODY]), "gzip")
+    assert b"content-encoding" not in headers and bodies == [BODY]
@@ -0,0 +1,110 @@
+"""
+Checkout latency against a local mock Cryptomus server: a fresh
+httpx.AsyncClient per payment (the old behaviour) versus the pooled client
+"""
+
+import asyncio
+import json
+import statistics
+import time
+import httpx
+import pytest
+from app.clients import CryptomusClient
+from app.config import settings
+from app.models.payment import PaymentRequest
+from app.database import DatabaseModels
+from app.services.payment_service import CryptomusService
+from app.services.stock_service import StockService
+
+PAYMENTS = 100
+CONCURRENCY = 10
+
+
+@pytest.fixture(autouse=True)
+def no_database_writes(monkeypatch):
+    async def noop(*args):
+        return None
+
+    # Stock holds and orders have their own tests; keep Supabase out of these
+    monkeypatch.setattr(StockService, "reserve", noop)
+    monkeypatch.setattr(StockService, "release", noop)
+    monkeypatch.setattr(DatabaseModels, "create_order", noop)
+    monkeypatch.setattr(DatabaseModels, "update_order", noop)
+
+
+async def fresh_client_payment(payment: PaymentRequest):
+    """Checkout as it was before the pooled client: one AsyncClient per payment"""
+    payment_data = {
+        "amount": str(payment.amount),
+        "currency": payment.currency,
+        "order_id": f"order_{time.time_ns()}",
+        "lifetime": settings.CRYPTOMUS_PAYMENT_LIFETIME,
+    }
+    headers = {
+        "merchant": settings.CRYPTOMUS_MERCHANT_ID,
+        "sign": CryptomusService.generate_signature(json.dumps(payment_data), settings.CRYPTOMUS_API_KEY),
+    }
+    async with httpx.AsyncClient() as client:
+        response = await client.post(
+            f"{settings.CRYPTOMUS_API_URL}/payment", json=payment_data, headers=headers, timeout=10.0
+        )
+        assert response.status_code == 200
+        return response.json()
+
+
+async def measure(create) -> list:
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+    latencies = []
+
+    async def one(index: int):
+        async with semaphore:
+            started = time.perf_counter()
+            await create(PaymentRequest(product_id=f"product-{index}", amount=2))
+            latencies.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(one(index) for index in range(PAYMENTS)))
+    return latencies
+
+
+def percentile(values: list, share: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * share))]
+
+
+def test_pooled_client_checkout_latency(cryptomus_stub):
+    cryptomus_stub()
+
+    async def main():
+        before = await measure(fresh_client_payment)
+        after = await measure(lambda payment: CryptomusService.create_payment(payment, "user-1"))
+        await CryptomusClient.shutdown()
+        return before, after
+
+    before, after = asyncio.run(main())
+    for label, latencies in (("fresh client", before), ("pooled client", after)):
+        print(f"\n{label}: p50 {statistics.median(latencies) * 1000:.1f}ms "
+              f"p99 {percentile(latencies, 0.99) * 1000:.1f}ms")
+    assert statistics.median(after) < statistics.median(before)
+    assert percentile(after, 0.99) < percentile(before, 0.99)
+
+
+def test_breaker_stops_calling_a_failing_upstream(cryptomus_stub, monkeypatch):
+    monkeypatch.setattr(settings, "CRYPTOMUS_RETRIES", 2)
+    server = cryptomus_stub(status=503)
+    threshold = settings.CRYPTOMUS_BREAKER_THRESHOLD
+
+    async def main():
+        errors = []
+        for _ in range(threshold + 5):
+            try:
+                await CryptomusService.create_payment(PaymentRequest(product_id="p", amount=1), "user-1")
+            except Exception as e:
+                errors.append(e)
+        await CryptomusClient.shutdown()
+        return errors
+
+    errors = asyncio.run(main())
+    assert len(errors) == threshold + 5
+    # Each failing checkout retried once; after that the circuit was open
+    assert server.requests == threshold * 2
+    assert all("unavailable" in str(error) for error in errors[threshold:])
@@ -0,0 +1,43 @@
+"""
+Per-route request metrics recorded by MetricsMiddleware
+"""
+
+import asyncio
+import httpx
+from fastapi import FastAPI
+from app.metrics import REQUEST_LATENCY, RESPONSE_SIZE, render
+from app.middleware.middleware import MetricsMiddleware
+
+
+def observed(histogram, *labels) -> int:
+    """Observations recorded under exactly these label values"""
+    series = histogram._series.get(labels)
+    return sum(series[:-1]) if series else 0
+
+
+def test_requests_are_labelled_by_route_template():
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get("/api/widgets/{widget_id}")
+    async def get_widget(widget_id: str):
+        return {"id": widget_id}
+
+    template = ("GET", "/api/widgets/{widget_id}", "200")
+    before = observed(REQUEST_LATENCY, *template)
+    unmatched_before = observed(REQUEST_LATENCY, "GET", "unmatched", "404")
+
+    async def main():
+        async with httpx.AsyncClient(app=app, base_url="http://test") as client:
+            for widget_id in ("1", "2", "3"):
+                assert (await client.get(f"/api/widgets/{widget_id}")).status_code == 200
+            assert (await client.get("/api/widgets/1/oops")).status_code == 404
+
+    asyncio.run(main())
+    assert observed(REQUEST_LATENCY, *template) - before == 3
+    assert observed(RESPONSE_SIZE, "GET", "/api/widgets/{widget_id}") >= 3
+    # Raw paths never become labels; unknown paths share one
+    assert observed(REQUEST_LATENCY, "GET", "unmatched", "404") - unmatched_before == 1
+    labels = {route for _, route, _ in REQUEST_LATENCY._series}
+    assert not {"/api/widgets/1", "/api/widgets/2", "/api/widgets/3", "/api/widgets/1/oops"} & labels
+    assert 'route="/api/widgets/{widget_id}"' in render()
@@ -0,0 +1,210 @@
+"""
+Orders are written at checkout and updated from journalled callbacks
+"""
+
+import asyncio
+import sqlite3
+import uuid
+import httpx
+import orjson
+import pytest
+from fastapi import FastAPI
+from app.config import settings
+from app.models.payment import PaymentRequest
+from app.routes import payments
+from app.services.callback_queue import CallbackQueue
+from app.services.payment_service import CryptomusService
+from tests.stubs import filter_rows, postgrest_path
+
+
+class OrdersTable:
+    """In-memory orders table and stock RPCs behind the stub PostgREST server"""
+
+    def __init__(self):
+        self.orders = {}
+        self.released = []
+        # Orders whose stock release fails, as an RPC error would
+        self.release_fails = set()
+
+    def handler(self, method, path, params, body):
+        name = postgrest_path(path)
+        if name == "orders":
+            if method == "POST":
+                rows = body if isinstance(body, list) else [body]
+                for row in rows:
+                    self.orders[row["id"]] = dict(row)
+                return 201, rows
+            selected = filter_rows(self.orders.values(), params)
+            if method == "PATCH":
+                for row in selected:
+                    row.update(body)
+            return 200, selected
+        if name == "rpc/reserve_stock":
+            return 200, 10
+        if name in ("rpc/release_stock", "rpc/commit_stock"):
+            if name == "rpc/release_stock":
+                if self.release_fails.intersection(body["p_order_ids"]):
+                    return 500, {"message": "release_stock failed"}
+                self.released.extend(body["p_order_ids"])
+            return 200, len(body["p_order_ids"])
+        return 404, {"message": f"unknown path {name}"}
+
+
+@pytest.fixture
+def orders(supabase_stub):
+    table = OrdersTable()
+    supabase_stub(table.handler)
+    return table
+
+
+def test_payment_creates_pending_order(orders, cryptomus_stub):
+    cryptomus_stub()
+    user_id = str(uuid.uuid4())
+    product_id = str(uuid.uuid4())
+    payment = PaymentRequest(product_id=product_id, quantity=2, amount=4)
+
+    result = asyncio.run(CryptomusService.create_payment(payment, user_id))
+    assert orders.orders[result.order_id] == {
+        "id": result.order_id,
+        "user_id": user_id,
+        "product_id": product_id,
+        "quantity": 2,
+        "amount": 4.0,
+        "currency": "USDT",
+        "status": "pending",
+    }
+
+
+def test_failed_invoice_fails_the_order(orders, cryptomus_stub):
+    cryptomus_stub(status=400)
+    payment = PaymentRequest(product_id=str(uuid.uuid4()), amount=1)
+
+    with pytest.raises(Exception, match="Cryptomus API error"):
+        asyncio.run(CryptomusService.create_payment(payment, str(uuid.uuid4())))
+    (order,) = orders.orders.values()
+    assert order["status"] == "failed"
+    assert orders.released == [order["id"]]
+
+
+def test_callbacks_for_unknown_orders_are_kept(orders, tmp_path):
+    orders.orders["order_A"] = {"id": "order_A", "status": "pending"}
+    queue = CallbackQueue(str(tmp_path / "callbacks.db"))
+
+    async def main():
+        await queue.enqueue("order_A", "paid", {"order_id": "order_A"})
+        await queue.enqueue("order_X", "paid", {"order_id": "order_X"})
+        assert await queue.apply_pending() == 2
+        stats = await queue.stats()
+        # Nothing left to retry, and the unknown order's callback is not pruned
+        assert await queue.apply_pending() == 0
+        await queue.prune()
+        remaining = (await queue.stats())["orphaned"]
+        await queue.close()
+        return stats, remaining
+
+    stats, remaining = asyncio.run(main())
+    assert orders.orders["order_A"]["status"] == "paid"
+    assert stats["depth"] == 0
+    assert stats["orphaned"] == 1
+    assert stats["applied_total"] == 1
+    assert stats["orphaned_total"] == 1
+    assert remaining == 1
+
+
+def test_callbacks_failing_every_attempt_are_dead_lettered(orders, tmp_path, monkeypatch, caplog):
+    monkeypatch.setattr(settings, "CALLBACK_MAX_ATTEMPTS", 3)
+    orders.orders["order_A"] = {"id": "order_A", "status": "pending"}
+    orders.orders["order_B"] = {"id": "order_B", "status": "pending"}
+    orders.release_fails.add("order_A")
+    queue = CallbackQueue(str(tmp_path / "callbacks.db"))
+
+    async def main():
+        await queue.enqueue("order_A", "fail", {"order_id": "order_A"})
+        await queue.enqueue("order_B", "cancel", {"order_id": "order_B"})
+        failures = 0
+        for _ in range(10):
+            try:
+                if await queue.apply_pending() == 0:
+                    break
+            except Exception:
+                failures += 1
+        stats = await queue.stats()
+        await queue.close()
+        return failures, stats
+
+    with caplog.at_level("ERROR", logger="app.services.callback_queue"):
+        failures, stats = asyncio.run(main())
+    # The first batch fails for both orders; retries then isolate order_A
+    assert failures == 3
+    assert orders.released == ["order_B"]
+    assert stats["depth"] == 0
+    assert stats["dead_lettered"] == 1
+    assert stats["dead_lettered_total"] == 1
+    assert stats["applied_total"] == 1
+    assert "order_A (fail)" in caplog.text
+
+
+def test_journal_without_orphaned_column_is_upgraded(tmp_path):
+    path = str(tmp_path / "old.db")
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE callbacks (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            order_id TEXT NOT NULL,
+            status TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            received_at REAL NOT NULL,
+            applied_at REAL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            UNIQUE (order_id, status)
+        );
+        INSERT INTO callbacks (order_id, status, payload, received_at) VALUES ('order_A', 'paid', '{}', 0);
+    """)
+    conn.close()
+    queue = CallbackQueue(path)
+
+    async def main():
+        stats = await queue.stats()
+        await queue.close()
+        return stats
+
+    stats = asyncio.run(main())
+    assert stats["depth"] == 1
+    assert stats["orphaned"] == 0
+    assert stats["dead_lettered"] == 0
+
+
+def test_new_order_status_can_be_polled(orders, cryptomus_stub, monkeypatch):
+    cryptomus_stub()
+    monkeypatch.setattr(settings, "BACKGROUND_TASKS", False)
+    app = FastAPI()
+    app.include_router(payments.router)
+
+    async def main():
+        async with httpx.AsyncClient(app=app, base_url="http://test") as client:
+            created = await client.post(
+                "/api/cryptomus/payment",
+                params={"user_id": str(uuid.uuid4())},
+                json={"product_id": str(uuid.uuid4()), "amount": 1}
+            )
+            order_id = created.json()["order_id"]
+            status = await client.get(f"/api/cryptomus/status/{order_id}")
+            waiting = asyncio.create_task(client.get(
+                f"/api/cryptomus/status/{order_id}/wait", params={"current": "pending", "timeout": 5}
+            ))
+            await asyncio.sleep(0.05)
+            body = orjson.dumps({"order_id": order_id, "status": "paid"})
+            callback = await client.post(
+                "/api/cryptomus/callback", content=body,
+                headers={"sign": CryptomusService.sign_bytes(body, settings.CRYPTOMUS_API_KEY)}
+            )
+            changed = await waiting
+            return order_id, status, callback, changed
+
+    order_id, status, callback, changed = asyncio.run(main())
+    assert status.status_code == 200
+    assert status.json() == {"order_id": order_id, "status": "pending"}
+    assert callback.status_code == 200
+    assert changed.status_code == 200
+    assert changed.json() == {"order_id": order_id, "status": "paid"}
+    assert orders.orders[order_id]["status"] == "paid"
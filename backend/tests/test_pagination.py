@@ -0,0 +1,57 @@
+import base64
+import json
+import uuid
+import pytest
+from app.pagination import apply_keyset, decode_cursor, encode_cursor
+
+
+class RecordingQuery:
+    """Collects the PostgREST parameters a query builder would send"""
+
+    def __init__(self):
+        self.params = []
+
+    def order(self, column, desc=False):
+        self.params.append(("order", column, desc))
+        return self
+
+    def or_(self, filters):
+        self.params.append(("or", filters))
+        return self
+
+    def limit(self, count):
+        self.params.append(("limit", count))
+        return self
+
+
+def raw_cursor(values) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip("=")
+
+
+def test_cursor_round_trip():
+    row = {"created_at": "2024-01-10T08:30:00.12345+00:00", "id": str(uuid.uuid4())}
+    created_at, row_id = decode_cursor(encode_cursor(row))
+    assert created_at == "2024-01-10T08:30:00.123450+00:00"
+    assert row_id == row["id"]
+
+
+@pytest.mark.parametrize("values", [
+    ['2024",status.eq.inactive,id.gt."0', str(uuid.uuid4())],
+    ["2024-01-10T00:00:00+00:00", 'x",status.eq.inactive,id.gt."0'],
+    ["2024-01-10T00:00:00+00:00"],
+    [20240110, str(uuid.uuid4())],
+])
+def test_crafted_cursor_is_rejected(values):
+    with pytest.raises(ValueError):
+        decode_cursor(raw_cursor(values))
+    with pytest.raises(ValueError):
+        apply_keyset(RecordingQuery(), raw_cursor(values), 10)
+
+
+def test_keyset_filter_holds_only_parsed_values():
+    row_id = str(uuid.uuid4())
+    query = apply_keyset(RecordingQuery(), raw_cursor(["2024-01-10 00:00:00+00", row_id.upper()]), 10)
+    assert ("or",
+            'created_at.lt."2024-01-10T00:00:00+00:00",'
+            f'and(created_at.eq."2024-01-10T00:00:00+00:00",id.lt."{row_id}")') in query.params
+    assert ("limit", 11) in query.params
@@ -0,0 +1,102 @@
+"""
+Order ids and Idempotency-Key handling at checkout
+"""
+
+import asyncio
+import itertools
+import uuid
+import httpx
+import pytest
+from fastapi import FastAPI
+from app import ids
+from app.database import DatabaseModels
+from app.ids import SEQUENCE_BITS, IdGenerator
+from app.models.payment import PaymentRequest
+from app.routes import payments
+from app.services.payment_service import CryptomusService, IdempotencyConflictError, PaymentResponse
+from app.services.stock_service import StockService
+
+PRODUCT_ID = str(uuid.uuid4())
+
+
+@pytest.fixture(autouse=True)
+def no_database_writes(monkeypatch):
+    async def noop(*args):
+        return None
+
+    monkeypatch.setattr(StockService, "reserve", noop)
+    monkeypatch.setattr(StockService, "release", noop)
+    monkeypatch.setattr(DatabaseModels, "create_order", noop)
+    monkeypatch.setattr(DatabaseModels, "update_order", noop)
+
+
+def test_ids_keep_ascending_across_a_sequence_wrap(monkeypatch):
+    generator = IdGenerator(node=7)
+    generator._sequence = itertools.count((1 << SEQUENCE_BITS) - 5)
+    # Every id in the same millisecond
+    monkeypatch.setattr(ids.time, "time_ns", lambda: 1_700_000_000_000_000_000)
+    generated = [generator.new_id() for _ in range(20)]
+    assert generated == sorted(generated)
+    assert len(set(generated)) == len(generated)
+
+
+def test_ids_are_unique_and_sorted_by_creation():
+    generator = IdGenerator(node=7)
+    generated = [generator.new_id() for _ in range(100_000)]
+    assert generated == sorted(generated)
+    assert len(set(generated)) == len(generated)
+
+
+def test_replay_returns_the_stored_payment(cryptomus_stub):
+    server = cryptomus_stub()
+    user_id = str(uuid.uuid4())
+    payment = PaymentRequest(product_id=PRODUCT_ID, amount=1)
+
+    async def main():
+        first = await CryptomusService.create_payment(payment, user_id, "key-1")
+        again = await CryptomusService.create_payment(payment, user_id, "key-1")
+        return first, again
+
+    first, again = asyncio.run(main())
+    assert again == first
+    assert server.requests == 1
+
+
+def test_concurrent_reuse_with_a_different_body_is_refused(cryptomus_stub):
+    server = cryptomus_stub(latency=0.05)
+    user_id = str(uuid.uuid4())
+
+    async def main():
+        return await asyncio.gather(
+            CryptomusService.create_payment(PaymentRequest(product_id=PRODUCT_ID, amount=1), user_id, "key-1"),
+            CryptomusService.create_payment(PaymentRequest(product_id=PRODUCT_ID, amount=3), user_id, "key-1"),
+            CryptomusService.create_payment(PaymentRequest(product_id=PRODUCT_ID, amount=1), user_id, "key-1"),
+            return_exceptions=True,
+        )
+
+    first, different, same = asyncio.run(main())
+    assert isinstance(first, PaymentResponse)
+    assert isinstance(different, IdempotencyConflictError)
+    assert same == first
+    assert server.requests == 1
+
+
+def test_sequential_reuse_with_a_different_body_is_refused(cryptomus_stub):
+    server = cryptomus_stub()
+    app = FastAPI()
+    app.include_router(payments.router)
+    params = {"user_id": str(uuid.uuid4())}
+    headers = {"Idempotency-Key": "key-1"}
+
+    async def main():
+        async with httpx.AsyncClient(app=app, base_url="http://test") as client:
+            body = {"product_id": PRODUCT_ID, "amount": 1}
+            first = await client.post("/api/cryptomus/payment", params=params, headers=headers, json=body)
+            body = {"product_id": PRODUCT_ID, "amount": 3}
+            second = await client.post("/api/cryptomus/payment", params=params, headers=headers, json=body)
+            return first, second
+
+    first, second = asyncio.run(main())
+    assert first.status_code == 200
+    assert second.status_code == 409
+    assert server.requests == 1
@@ -0,0 +1,107 @@
+"""
+Bulk product import against a stub PostgREST server that enforces the
+products table's constraints
+"""
+
+import asyncio
+import uuid
+import pytest
+from app.config import settings
+from app.services.product_service import ProductService
+from app.services.seller_service import seller_cache
+from tests.stubs import filter_rows, postgrest_path
+
+SELLER_ID = str(uuid.uuid4())
+
+
+class ProductsTable:
+    """Rejects a whole insert when any row has a duplicate title, as a unique index would"""
+
+    def __init__(self):
+        self.rows = []
+        self.inserts = 0
+        self.fail_with = None
+
+    def handler(self, method, path, params, body):
+        name = postgrest_path(path)
+        if name == "sellers":
+            return 200, filter_rows([{"id": SELLER_ID, "user_id": str(uuid.uuid4())}], params)
+        assert name == "products" and method == "POST"
+        self.inserts += 1
+        if self.fail_with is not None:
+            return self.fail_with
+        titles = {row["title"] for row in self.rows}
+        for row in body:
+            if row["title"] in titles:
+                return 409, {"code": "23505", "message": "duplicate key value violates unique constraint"}
+            titles.add(row["title"])
+        inserted = [dict(row, id=str(uuid.uuid4())) for row in body]
+        self.rows.extend(inserted)
+        return 201, inserted
+
+
+@pytest.fixture
+def products(supabase_stub, monkeypatch):
+    monkeypatch.setattr(settings, "PRODUCT_IMPORT_CHUNK", 16)
+    seller_cache.clear()
+    table = ProductsTable()
+    supabase_stub(table.handler)
+    return table
+
+
+def run_import(records, seller_id=SELLER_ID):
+    async def stream():
+        for row_number, record in enumerate(records, 1):
+            yield row_number, record
+
+    return asyncio.run(ProductService.import_products(seller_id, stream()))
+
+
+def product(index, **overrides):
+    return dict({
+        "title": f"Product {index}", "description": "A product", "price": 1 + index % 3,
+        "category": "Digital", "stock": 5,
+    }, **overrides)
+
+
+def test_bad_row_fails_alone(products):
+    rows = [product(index) for index in range(16)]
+    rows[9] = product(3)
+    report = run_import(rows)
+    assert report["inserted"] == 15
+    assert report["failed"] == 1
+    assert report["errors"][0]["row"] == 10
+    assert "duplicate key" in report["errors"][0]["error"]
+    # The chunk and each half containing the bad row, down to the row itself
+    assert products.inserts == 1 + 2 * 4
+
+
+def test_constraints_are_checked_before_insert(products):
+    report = run_import([
+        product(0, price=2.5),
+        product(1, price=4),
+        product(2, stock=-1),
+        product(3, price="2"),
+    ])
+    assert report["inserted"] == 1
+    assert [error["row"] for error in report["errors"]] == [1, 2, 3]
+    assert "Price must be one of 1, 2, 3" in report["errors"][0]["error"]
+    assert "Stock cannot be negative" in report["errors"][2]["error"]
+    assert products.rows[0]["price"] == 2
+    assert products.inserts == 1
+
+
+def test_request_errors_fail_the_chunk_without_retries(products):
+    products.fail_with = (503, {"message": "unavailable"})
+    report = run_import([product(index) for index in range(5)])
+    assert report["inserted"] == 0
+    assert report["failed"] == 5
+    assert products.inserts == 1
+
+
+def test_unknown_seller_is_rejected_up_front(products):
+    with pytest.raises(Exception, match="Seller not found"):
+        run_import([product(0)], seller_id=str(uuid.uuid4()))
+    with pytest.raises(Exception, match="Invalid seller id"):
+        run_import([product(0)], seller_id="not-a-seller")
+    assert products.inserts == 0
@@ -0,0 +1,161 @@
+"""
+Product lookups and the product cache against a stub PostgREST server
+"""
+
+import asyncio
+import threading
+import uuid
+import httpx
+import pytest
+from fastapi import FastAPI
+from app.models.product import ProductUpdate
+from app.routes import products as product_routes
+from app.services.product_service import ProductService, product_cache
+from tests.stubs import filter_rows, postgrest_path
+
+
+def test_batch_lookup_reports_malformed_ids_as_missing(supabase_stub):
+    product_cache.clear()
+    known = str(uuid.uuid4())
+    queries = []
+
+    def handler(method, path, params, body):
+        assert postgrest_path(path) == "products"
+        queries.append(params["id"])
+        return 200, filter_rows([{"id": known, "title": "Known"}], params)
+
+    server = supabase_stub(handler)
+    absent = str(uuid.uuid4())
+    result = asyncio.run(ProductService.get_products(
+        ["not-a-uuid", known.upper(), absent, "1);drop table products;--"]
+    ))
+    assert result["items"] == [{"id": known, "title": "Known"}]
+    assert result["missing"] == ["not-a-uuid", absent, "1);drop table products;--"]
+    # Only well-formed IDs reach the database, in canonical form
+    assert queries == [f"in.({known},{absent})"]
+
+    result = asyncio.run(ProductService.get_products(["nope"]))
+    assert result == {"items": [], "missing": ["nope"]}
+    assert server.requests == 1
+
+
+class ProductsTable:
+    """Products behind the stub server; reads can be held until a write lands"""
+
+    def __init__(self, rows):
+        self.rows = {row["id"]: row for row in rows}
+        self.hold_reads = threading.Event()
+        self.read_held = threading.Event()
+        self.release_reads = threading.Event()
+        self.release_reads.set()
+        self.version = 0
+
+    def handler(self, method, path, params, body):
+        assert postgrest_path(path) == "products"
+        selected = filter_rows(self.rows.values(), params)
+        if method == "PATCH":
+            # As the updated_at trigger would
+            self.version += 1
+            for row in selected:
+                row.update(body, updated_at=f"2024-01-02T00:00:{self.version:02d}+00:00")
+            return 200, selected
+        if method == "DELETE":
+            for row in selected:
+                del self.rows[row["id"]]
+            return 200, selected
+        # The rows are read now, but answered once the reads are released
+        snapshot = [dict(row) for row in selected]
+        if self.hold_reads.is_set():
+            self.read_held.set()
+            self.release_reads.wait(5)
+        return 200, snapshot
+
+
+@pytest.fixture
+def products(supabase_stub):
+    product_cache.clear()
+    table = ProductsTable([{
+        "id": str(uuid.uuid4()), "seller_id": str(uuid.uuid4()), "title": "Lamp", "description": "Brass",
+        "category": "home", "price": 1, "stock": 5,
+        "created_at": "2024-01-01T00:00:00+00:00", "updated_at": "2024-01-01T00:00:00+00:00",
+    }])
+    supabase_stub(table.handler)
+    yield table
+    product_cache.clear()
+
+
+def test_update_and_delete_drop_cached_products(products):
+    (product,) = products.rows.values()
+
+    async def main():
+        assert (await ProductService.get_product(product["id"]))["title"] == "Lamp"
+        assert (await ProductService.get_products_page())["items"][0]["title"] == "Lamp"
+        await ProductService.update_product(product["id"], ProductUpdate(title="Desk lamp"))
+        assert (await ProductService.get_product(product["id"]))["title"] == "Desk lamp"
+        assert (await ProductService.get_products_page())["items"][0]["title"] == "Desk lamp"
+        await ProductService.delete_product(product["id"])
+        assert await ProductService.get_product(product["id"]) is None
+        assert (await ProductService.get_products_page())["items"] == []
+
+    asyncio.run(main())
+
+
+def test_fetch_that_started_before_an_update_is_not_cached(products):
+    (product,) = products.rows.values()
+    products.hold_reads.set()
+    products.release_reads.clear()
+
+    async def main():
+        # The read takes the old row, then the update lands before it returns
+        fetch = asyncio.ensure_future(ProductService.get_product(product["id"]))
+        assert await asyncio.to_thread(products.read_held.wait, 5)
+        products.hold_reads.clear()
+        await ProductService.update_product(product["id"], ProductUpdate(price=3))
+        products.release_reads.set()
+        assert (await fetch)["price"] == 1
+        return await ProductService.get_product(product["id"])
+
+    assert asyncio.run(main())["price"] == 3
+    assert product_cache.stats()["stale_sets"] == 1
+
+
+@pytest.mark.parametrize("path", ["/api/products/{id}", "/api/products/", "/api/products/?paginate=cursor"])
+def test_conditional_get_revalidates_until_the_product_changes(products, path):
+    (product,) = products.rows.values()
+    path = path.format(id=product["id"])
+    app = FastAPI()
+    app.include_router(product_routes.router)
+
+    async def main():
+        async with httpx.AsyncClient(app=app, base_url="http://test") as client:
+            async def get(if_none_match=None):
+                headers = {"If-None-Match": if_none_match} if if_none_match else {}
+                return await client.get(path, headers=headers)
+
+            first = await get()
+            etag = first.headers["etag"]
+            matches = [
+                await get(etag),
+                # Weak comparison: the strong form of a weak tag still matches
+                await get(etag.removeprefix("W/")),
+                await get(f'"stale", {etag}'),
+                await get("*"),
+            ]
+            mismatch = await get('W/"stale"')
+            await client.put(f"/api/products/{product['id']}", json={"title": "Desk lamp"})
+            updated = await get(etag)
+            return first, matches, mismatch, updated
+
+    first, matches, mismatch, updated = asyncio.run(main())
+    assert first.status_code == 200
+    assert first.headers["etag"].startswith('W/"')
+    assert first.headers["cache-control"]
+    for response in matches:
+        assert response.status_code == 304
+        assert response.content == b""
+        assert response.headers["etag"] == first.headers["etag"]
+    assert mismatch.status_code == 200
+    assert mismatch.content == first.content
+    assert updated.status_code == 200
+    assert updated.headers["etag"] != first.headers["etag"]
+    assert "Desk lamp" in updated.text
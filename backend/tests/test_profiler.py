@@ -0,0 +1,91 @@
+"""
+When the sampling profiler runs, and what it records
+"""
+
+import asyncio
+import time
+import httpx
+import pytest
+from fastapi import FastAPI
+from app import profiler as profiler_module
+from app.config import settings
+from app.middleware.middleware import ProfilerMiddleware
+from app.profiler import profiler, sign_profile_token
+
+
+@pytest.fixture
+def app():
+    profiler.reset()
+    app = FastAPI()
+    app.add_middleware(ProfilerMiddleware)
+
+    @app.get("/api/widgets/{widget_id}")
+    async def get_widget(widget_id: str):
+        # Hold the event loop so the sampler thread sees this handler
+        deadline = time.perf_counter() + 0.05
+        while time.perf_counter() < deadline:
+            pass
+        return {"id": widget_id}
+
+    yield app
+    profiler.reset()
+
+
+def profiled(app, headers=None, count=1) -> int:
+    """Number of `count` requests the profiler took"""
+    before = profiler.profiled_requests
+
+    async def main():
+        async with httpx.AsyncClient(app=app, base_url="http://test") as client:
+            for index in range(count):
+                response = await client.get(f"/api/widgets/{index}", headers=headers or {})
+                assert response.status_code == 200
+
+    asyncio.run(main())
+    return profiler.profiled_requests - before
+
+
+def test_profiling_is_off_by_default(app, monkeypatch):
+    monkeypatch.setattr(settings, "PROFILER_ENABLED", False)
+    monkeypatch.setattr(settings, "PROFILER_SECRET", "")
+    monkeypatch.setattr(settings, "PROFILER_SAMPLE_RATE", 1.0)
+    assert profiled(app, count=3) == 0
+    # Without a secret no header can turn it on
+    assert profiled(app, headers={"X-Profile": f"{int(time.time()) + 60}.anything"}) == 0
+
+
+def test_sampling_fraction_applies_only_when_enabled(app, monkeypatch):
+    monkeypatch.setattr(settings, "PROFILER_SAMPLE_RATE", 0.5)
+    draws = iter([0.3, 0.7, 0.3, 0.7])
+    monkeypatch.setattr(profiler_module.random, "random", lambda: next(draws))
+
+    monkeypatch.setattr(settings, "PROFILER_ENABLED", True)
+    assert profiled(app, count=2) == 1
+    monkeypatch.setattr(settings, "PROFILER_ENABLED", False)
+    # Disabled: the draws are not even taken
+    assert profiled(app, count=2) == 0
+    assert next(draws) == 0.3
+
+
+def test_signed_header_profiles_one_request(app, monkeypatch):
+    monkeypatch.setattr(settings, "PROFILER_ENABLED", False)
+    monkeypatch.setattr(settings, "PROFILER_SECRET", "profiling-secret")
+    token = sign_profile_token(int(time.time()) + 60)
+    expired = sign_profile_token(int(time.time()) - 1)
+
+    assert profiled(app, headers={"X-Profile": token}) == 1
+    forged = token.partition(".")[0] + "." + "0" * 64
+    assert profiled(app, headers={"X-Profile": forged}) == 0
+    assert profiled(app, headers={"X-Profile": expired}) == 0
+    assert profiled(app) == 0
+
+
+def test_samples_are_grouped_by_route_template(app, monkeypatch):
+    monkeypatch.setattr(settings, "PROFILER_ENABLED", True)
+    monkeypatch.setattr(settings, "PROFILER_SAMPLE_RATE", 1.0)
+    monkeypatch.setattr(settings, "PROFILER_INTERVAL", 0.001)
+    assert profiled(app, count=3) == 3
+    routes = profiler.summary()["routes"]
+    assert list(routes) == ["/api/widgets/{widget_id}"]
+    assert routes["/api/widgets/{widget_id}"] > 0
+    assert "get_widget" in profiler.collapsed("/api/widgets/{widget_id}")
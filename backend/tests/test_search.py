@@ -0,0 +1,217 @@
+"""
+Search index: latency on a 100k product catalog, agreement with exhaustive
+scoring, and writes made while the index is rebuilt
+"""
+
+import asyncio
+import itertools
+import math
+import random
+import statistics
+import time
+import uuid
+from collections import Counter
+import pytest
+from app.services import search_service
+from app.services.search_service import (
+    FIELD_WEIGHTS, PRICE_LABELS, STOP_WORDS, SearchIndex, price_bucket, tokenize
+)
+from tests.stubs import postgrest_path
+
+CATEGORIES = ["Electronics", "Clothing", "Home", "Garden", "Toys", "Sports", "Books", "Beauty", "Auto", "Food"]
+COMMON_WORDS = ["red", "shirt", "cotton", "the", "and", "for", "new", "pro", "black", "with"]
+VOCABULARY = [f"w{index}" for index in range(5000)]
+# Zipf-like word frequencies
+CUMULATIVE_WEIGHTS = list(itertools.accumulate(1 / rank for rank in range(1, len(VOCABULARY) + 1)))
+
+
+def synthetic_catalog(count: int, seed: int = 7) -> list:
+    rng = random.Random(seed)
+
+    def words(common: int, rare: int) -> str:
+        return " ".join(
+            rng.sample(COMMON_WORDS, rng.randint(0, common))
+            + rng.choices(VOCABULARY, cum_weights=CUMULATIVE_WEIGHTS, k=rng.randint(1, rare))
+        )
+
+    return [
+        {
+            "id": f"{index:08d}",
+            "title": words(3, 6),
+            "description": words(6, 60),
+            "category": rng.choice(CATEGORIES),
+            "badge": rng.choice([None, "new", "sale"]),
+            "price": rng.choice([1, 2, 3]),
+        }
+        for index in range(count)
+    ]
+
+
+def exhaustive_search(products: list, query: str, category=None, limit: int = 20, offset: int = 0) -> dict:
+    """Score every product the slow, obvious way"""
+    docs = {}
+    for product in products:
+        weights = Counter()
+        for field, weight in FIELD_WEIGHTS.items():
+            for token in tokenize(product.get(field)):
+                weights[token] += weight
+        norm = math.sqrt(sum(weights.values()))
+        docs[product["id"]] = (product, {token: weight / norm for token, weight in weights.items()})
+
+    tokens = list(dict.fromkeys(tokenize(query)))
+    last = tokens.pop()
+    terms = [[token] for token in tokens if token not in STOP_WORDS]
+    vocabulary = sorted({token for _, impacts in docs.values() for token in impacts})
+    if len(last) >= 2:
+        terms.append([token for token in vocabulary if token.startswith(last)][:50])
+    else:
+        terms.append([last])
+
+    def impact(impacts, term):
+        values = [impacts[token] for token in term if token in impacts]
+        return max(values) if values else None
+
+    idf = []
+    for term in terms:
+        having = sum(1 for _, impacts in docs.values() if impact(impacts, term) is not None)
+        idf.append(math.log(1 + len(docs) / (1 + having)))
+    matches = [
+        (product, impacts) for product, impacts in docs.values()
+        if all(impact(impacts, term) is not None for term in terms)
+    ]
+    selected = [
+        (sum(weight * impact(impacts, term) for weight, term in zip(idf, terms)), product["id"])
+        for product, impacts in matches
+        if not category or product.get("category") == category
+    ]
+    selected.sort(reverse=True)
+    prices = Counter(price_bucket(product.get("price")) for product, _ in matches)
+    return {
+        "total": len(selected),
+        "scores": {product_id: score for score, product_id in selected},
+        "top": selected[offset:offset + limit],
+        "facets": {
+            "category": dict(Counter(product.get("category") for product, _ in matches)),
+            "price": {bucket: prices[bucket] for bucket in PRICE_LABELS if bucket in prices},
+        },
+    }
+
+
+def assert_same_results(result: dict, expected: dict):
+    assert result["total"] == expected["total"]
+    assert result["facets"]["category"] == expected["facets"]["category"]
+    assert list(result["facets"]["category"].values()) == sorted(expected["facets"]["category"].values(), reverse=True)
+    assert result["facets"]["price"] == expected["facets"]["price"]
+    # Products with equal scores may come back in a different order
+    assert [item["score"] for item in result["items"]] == pytest.approx(
+        [round(score, 4) for score, _ in expected["top"]], abs=1e-4
+    )
+    for item in result["items"]:
+        assert item["score"] == pytest.approx(expected["scores"][item["id"]], abs=1e-4)
+
+
+@pytest.fixture(scope="module")
+def large_index():
+    return SearchIndex.build(synthetic_catalog(100_000))
+
+
+@pytest.mark.parametrize("query,category", [
+    ("red", None),
+    ("red shirt", None),
+    ("the red", None),
+    ("red", "Toys"),
+    ("black cotton shirt", None),
+    ("sh", None),
+    ("cotton w3", None),
+    ("w1", None),
+    ("w100 w200", None),
+])
+def test_search_latency_on_100k_products(large_index, query, category):
+    timings = []
+    for _ in range(5):
+        started = time.perf_counter()
+        result = large_index.search(query, category, limit=20)
+        timings.append(time.perf_counter() - started)
+    median = statistics.median(timings)
+    print(f"\n{query!r} category={category}: {result['total']} matches, median {median * 1000:.1f}ms")
+    assert result["items"]
+    assert median < 0.05
+
+
+def test_ranked_search_matches_exhaustive_scoring(monkeypatch):
+    # Push most queries through the bitset and threshold paths
+    monkeypatch.setattr(search_service, "DIRECT_SCORING_LIMIT", 40)
+    products = synthetic_catalog(3000, seed=11)
+    index = SearchIndex.build(products)
+    rng = random.Random(3)
+    queries = [
+        ("red", None), ("red shirt", "Toys"), ("the cotton", None), ("new pro", None),
+        ("black with", "Books"), ("w1", None), ("red w", None), ("shirt w12", None), ("w4 w5", None),
+    ]
+
+    def check():
+        for query, category in queries:
+            for offset in (0, 25):
+                expected = exhaustive_search(products, query, category, limit=25, offset=offset)
+                assert_same_results(index.search(query, category, limit=25, offset=offset), expected)
+
+    check()
+    # Changed and removed products leave the rankings and bitsets stale
+    by_id = {product["id"]: product for product in products}
+    for product_id in rng.sample(sorted(by_id), 300):
+        index.remove(product_id)
+        del by_id[product_id]
+    for product in synthetic_catalog(600, seed=12)[:300]:
+        product = dict(product, id=f"new-{product['id']}")
+        index.add(product)
+        by_id[product["id"]] = product
+    for product_id in rng.sample(sorted(by_id), 300):
+        changed = dict(by_id[product_id], title="red red shirt", category=rng.choice(CATEGORIES), price=3)
+        index.add(changed)
+        by_id[product_id] = changed
+    products = list(by_id.values())
+    check()
+
+
+def test_pages_do_not_overlap_when_scores_tie():
+    products = [
+        {"id": f"{index:04d}", "title": "red shirt", "category": "Clothing", "price": 1}
+        for index in range(3000)
+    ]
+    index = SearchIndex.build(products)
+    pages = [index.search("red shirt", limit=50, offset=offset)["items"] for offset in range(0, 200, 50)]
+    ids = [item["id"] for page in pages for item in page]
+    assert ids == [item["id"] for item in index.search("red shirt", limit=100, offset=0)["items"]] + \
+        [item["id"] for item in index.search("red shirt", limit=100, offset=100)["items"]]
+    assert len(set(ids)) == 200
+
+
+def test_writes_during_rebuild_are_kept(supabase_stub, monkeypatch):
+    rows = [
+        {"id": str(uuid.uuid4()), "title": title, "created_at": "2024-01-01T00:00:00", "price": 1}
+        for title in ("red shirt", "blue lamp", "green mug")
+    ]
+
+    def handler(method, path, params, body):
+        assert postgrest_path(path) == "products"
+        return 200, rows
+
+    supabase_stub(handler)
+    index = SearchIndex()
+    index.add(rows[0])
+    added = {"id": str(uuid.uuid4()), "title": "yellow kite", "price": 2}
+    execute = search_service.execute
+
+    async def execute_during_writes(query):
+        response = await execute(query)
+        # A product is created and another deleted while the catalog loads
+        index.add(added)
+        index.remove(rows[1]["id"])
+        return response
+
+    monkeypatch.setattr(search_service, "execute", execute_during_writes)
+    asyncio.run(index.rebuild())
+    assert [item["id"] for item in index.search("kite")["items"]] == [added["id"]]
+    assert index.search("lamp")["total"] == 0
+    assert index.search("mug")["total"] == 1
+    assert index.stats()["documents"] == 3
@@ -0,0 +1,71 @@
+"""
+Response serialization: pydantic response_model validation versus the
+orjson fast path on 100-row pages
+"""
+
+import asyncio
+import time
+import uuid
+from typing import List
+import httpx
+from fastapi import FastAPI
+from app.models.product import ProductResponse
+from app.models.seller import SellerResponse
+from app.serialization import fast_response, project
+
+ROWS = 100
+REQUESTS = 200
+
+
+def product_rows(count: int) -> list:
+    return [
+        {
+            "id": str(uuid.uuid4()), "seller_id": str(uuid.uuid4()), "title": f"Product {index}",
+            "description": "A digital product " * 10, "price": 1 + index % 3, "category": "Digital",
+            "stock": 10, "status": "active", "badge": None, "image": None,
+            "created_at": "2024-01-01T00:00:00+00:00", "updated_at": "2024-01-02T00:00:00+00:00",
+        }
+        for index in range(count)
+    ]
+
+
+def requests_per_second(app: FastAPI, path: str) -> float:
+    async def main():
+        async with httpx.AsyncClient(app=app, base_url="http://test") as client:
+            assert (await client.get(path)).status_code == 200
+            started = time.perf_counter()
+            for _ in range(REQUESTS):
+                await client.get(path)
+            return REQUESTS / (time.perf_counter() - started)
+
+    return asyncio.run(main())
+
+
+def test_fast_path_throughput_on_100_row_pages():
+    rows = product_rows(ROWS)
+    app = FastAPI()
+
+    @app.get("/validated", response_model=List[ProductResponse])
+    async def validated():
+        return rows
+
+    @app.get("/fast")
+    async def fast():
+        return fast_response(rows, ProductResponse)
+
+    before = requests_per_second(app, "/validated")
+    after = requests_per_second(app, "/fast")
+    print(f"\n{ROWS}-row page on one core: response_model {before:,.0f} req/s, "
+          f"fast path {after:,.0f} req/s ({after / before:.1f}x)")
+    assert after > before
+
+
+def test_fast_path_keeps_only_model_fields():
+    seller = {
+        name: "x" for name in SellerResponse.model_fields
+    } | {"verification_notes": None, "internal_risk_score": 0.7, "bank_ifsc_verified_by": "ops"}
+    body = project(seller, SellerResponse)
+    assert set(body) == set(SellerResponse.model_fields)
+    page = project({"items": product_rows(2), "next_cursor": None}, ProductResponse)
+    assert all(set(row) == set(ProductResponse.model_fields) for row in page["items"])
+    assert "status" not in page["items"][0]
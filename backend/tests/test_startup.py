@@ -0,0 +1,68 @@
+"""
+Cold start: import time, time to first response, and what a cold instance
+loads, measured in a fresh interpreter
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+# Seconds, on a CI-class core; the whole cold start before routers load
+IMPORT_BUDGET = 1.5
+FIRST_RESPONSE_BUDGET = 2.0
+
+COLD_START = """
+import json, os, sys, time
+started = time.perf_counter()
+import app.main
+imported = time.perf_counter() - started
+from app.config import get_settings
+settings_built = get_settings.cache_info().misses
+eager = sorted(name for name in ("pydantic_settings",) if name in sys.modules)
+loaded = sorted(name for name in sys.modules if name.startswith(("supabase", "app.services", "app.routes")))
+
+import asyncio, httpx
+async def main():
+    async with httpx.AsyncClient(app=app.main.app, base_url="http://test") as client:
+        first = await client.get("/health")
+        first_response = time.perf_counter() - started
+        monitored = [(await client.get(path)).status_code for path in ("/stats", "/metrics")]
+        return first.status_code, first_response, monitored
+status, first_response, monitored = asyncio.run(main())
+print(json.dumps({
+    "import": imported,
+    "first_response": first_response,
+    "status": status,
+    "monitored": monitored,
+    "loaded": loaded,
+    "settings_built": settings_built,
+    "eager": eager,
+    "loaded_after_stats": sorted(
+        name for name in sys.modules if name.startswith(("supabase", "app.services", "app.routes"))
+    ),
+    "journal": os.path.exists(os.environ["CALLBACK_QUEUE_PATH"]),
+}))
+"""
+
+
+def test_cold_start_stays_within_budget(tmp_path):
+    env = dict(os.environ, BACKGROUND_TASKS="false", CALLBACK_QUEUE_PATH=str(tmp_path / "callbacks.db"))
+    backend = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.run(
+        [sys.executable, "-c", COLD_START], cwd=backend, env=env,
+        capture_output=True, text=True, check=True
+    ).stdout
+    result = json.loads(output.splitlines()[-1])
+    print(f"\nimport {result['import'] * 1000:.0f}ms, first response {result['first_response'] * 1000:.0f}ms")
+
+    assert result["status"] == 200 and result["monitored"] == [200, 200]
+    assert result["loaded"] == []
+    # Importing reads no settings; they load with the first request
+    assert result["settings_built"] == 0
+    assert result["eager"] == []
+    # Monitoring a cold instance does not load services or open the journal
+    assert result["loaded_after_stats"] == []
+    assert not result["journal"]
+    assert result["import"] < IMPORT_BUDGET
+    assert result["first_response"] < FIRST_RESPONSE_BUDGET
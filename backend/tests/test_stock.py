@@ -0,0 +1,239 @@
+"""
+Stock reservations against a stub PostgREST server whose RPCs take stock
+with a locked conditional decrement, as the database functions do, and
+sql/stock_reservations.sql itself when TEST_DATABASE_URL names a scratch
+Postgres database
+"""
+
+import asyncio
+import os
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from app.config import settings
+from app.services import stock_service
+from app.services.stock_service import OutOfStockError, ReservationLedger, StockService, sold_out_cache
+from tests.stubs import postgrest_path
+
+PRODUCT_ID = str(uuid.uuid4())
+
+
+class StockTable:
+    """One product's stock and the stock_reservations rows for it"""
+
+    def __init__(self, stock: int):
+        self.stock = stock
+        self.holds = {}
+        self.lowest = stock
+        self._lock = threading.Lock()
+
+    def handler(self, method, path, params, body):
+        name = postgrest_path(path)
+        with self._lock:
+            if name == "rpc/reserve_stock":
+                return 200, self.reserve(body)
+            if name == "rpc/release_stock":
+                return 200, self.release(body["p_order_ids"])
+            if name == "rpc/commit_stock":
+                return 200, self.set_status(body["p_order_ids"], "committed")
+            if name == "rpc/release_expired_stock":
+                now = time.time()
+                return 200, self.release([
+                    order_id for order_id, hold in self.holds.items()
+                    if hold["status"] == "held" and hold["expires_at"] < now
+                ])
+        return 404, {"message": f"unknown path {name}"}
+
+    def reserve(self, body):
+        if body["p_order_id"] in self.holds:
+            return self.stock
+        if self.stock < body["p_quantity"]:
+            return None
+        self.stock -= body["p_quantity"]
+        self.lowest = min(self.lowest, self.stock)
+        self.holds[body["p_order_id"]] = {
+            "quantity": body["p_quantity"], "status": "held",
+            "expires_at": time.time() + body["p_lifetime_seconds"],
+        }
+        return self.stock
+
+    def set_status(self, order_ids, status):
+        changed = [
+            order_id for order_id in order_ids
+            if order_id in self.holds and self.holds[order_id]["status"] == "held"
+        ]
+        for order_id in changed:
+            self.holds[order_id]["status"] = status
+        return len(changed)
+
+    def release(self, order_ids):
+        held = [order_id for order_id in order_ids if self.holds.get(order_id, {}).get("status") == "held"]
+        self.stock += sum(self.holds[order_id]["quantity"] for order_id in held)
+        return self.set_status(held, "released")
+
+    def units(self, status: str) -> int:
+        return sum(hold["quantity"] for hold in self.holds.values() if hold["status"] == status)
+
+
+@pytest.fixture
+def stock(supabase_stub, monkeypatch):
+    monkeypatch.setattr(stock_service, "ledger", ReservationLedger())
+    sold_out_cache.clear()
+
+    def start(units: int):
+        table = StockTable(units)
+        table.server = supabase_stub(table.handler)
+        return table
+
+    yield start
+    sold_out_cache.clear()
+
+
+def test_concurrent_checkouts_never_oversell(stock):
+    # This covers the service: refusals, the ledger and the role used. The
+    # stub takes stock in Python under a lock, so the SQL's
+    # `update ... where stock >= p_quantity` guard is NOT exercised here;
+    # test_reserve_stock_sql_never_oversells runs it against Postgres.
+    table = stock(300)
+    rng = random.Random(5)
+    orders = [(f"order_{index}", rng.randint(1, 3)) for index in range(2000)]
+
+    async def reserve(order_id, quantity):
+        try:
+            await StockService.reserve(order_id, PRODUCT_ID, quantity)
+            return quantity
+        except OutOfStockError:
+            return 0
+
+    async def main():
+        return await asyncio.gather(*(reserve(order_id, quantity) for order_id, quantity in orders))
+
+    started = time.perf_counter()
+    taken = asyncio.run(main())
+    elapsed = time.perf_counter() - started
+    print(f"\n{len(orders)} concurrent checkouts for 300 units: {sum(map(bool, taken))} reserved, "
+          f"{table.server.requests} database calls, {len(orders) / elapsed:,.0f} checkouts/s")
+
+    assert table.lowest >= 0
+    assert sum(taken) == 300 - table.stock == table.units("held")
+    stats = stock_service.ledger.stats()
+    assert stats["held_units"] == sum(taken)
+    assert stats["reserved_total"] + stats["rejected_total"] == len(orders)
+    assert table.server.authorizations == {f"Bearer {settings.SUPABASE_SERVICE_KEY}"}
+
+
+def test_reserve_release_and_commit(stock):
+    table = stock(5)
+
+    async def main():
+        assert await StockService.reserve("order_A", PRODUCT_ID, 2) == 3
+        assert await StockService.reserve("order_B", PRODUCT_ID, 3) == 0
+        # Retrying an order does not take stock twice
+        assert await StockService.reserve("order_A", PRODUCT_ID, 2) == 0
+        with pytest.raises(OutOfStockError):
+            await StockService.reserve("order_C", PRODUCT_ID, 1)
+
+        await StockService.apply_payment_status(["order_A"], "cancel")
+        assert table.stock == 2
+        # The refusal cached for order_C is dropped once stock comes back
+        assert await StockService.reserve("order_C", PRODUCT_ID, 1) == 1
+
+        await StockService.apply_payment_status(["order_B"], "paid")
+        # A late failure callback cannot return stock that was paid for
+        assert await StockService.release(["order_A", "order_B"]) == 0
+
+    asyncio.run(main())
+    assert table.stock == 1
+    assert {order_id: hold["status"] for order_id, hold in table.holds.items()} == {
+        "order_A": "released", "order_B": "committed", "order_C": "held",
+    }
+    stats = stock_service.ledger.stats()
+    assert stats["held_orders"] == 1 and stats["held_units"] == 1
+    assert (stats["released_total"], stats["committed_total"]) == (1, 1)
+
+
+def test_expired_holds_are_released(stock, monkeypatch):
+    stock(4)
+    monkeypatch.setattr(settings, "CRYPTOMUS_PAYMENT_LIFETIME", 0)
+    monkeypatch.setattr(settings, "STOCK_RESERVATION_GRACE", -1)
+
+    async def main():
+        await StockService.reserve("order_A", PRODUCT_ID, 4)
+        with pytest.raises(OutOfStockError):
+            await StockService.reserve("order_B", PRODUCT_ID, 1)
+        assert await StockService.release_expired() == 1
+        assert await StockService.reserve("order_B", PRODUCT_ID, 1) == 3
+
+    asyncio.run(main())
+    assert stock_service.ledger.stats()["expired_total"] == 1
+
+
+# Roles that exist on Supabase; created on a plain Postgres so the grants apply
+SUPABASE_ROLES = """
+do $$
+declare
+  role_name text;
+begin
+  foreach role_name in array array['anon', 'authenticated', 'service_role'] loop
+    if not exists (select 1 from pg_roles where rolname = role_name) then
+      execute format('create role %I nologin', role_name);
+    end if;
+  end loop;
+end;
+$$;
+create table if not exists public.products (id uuid primary key);
+"""
+
+
+def test_reserve_stock_sql_never_oversells():
+    """Concurrent reserve_stock calls on one product in a real database.
+
+    Set TEST_DATABASE_URL to a disposable database to run this; it installs
+    sql/stock_reservations.sql there. Skipped otherwise.
+    """
+    url = os.environ.get("TEST_DATABASE_URL")
+    if not url:
+        pytest.skip("TEST_DATABASE_URL is not set")
+    psycopg = pytest.importorskip("psycopg")
+    backend = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with open(os.path.join(backend, "sql", "stock_reservations.sql")) as file:
+        schema = file.read()
+
+    product_id = str(uuid.uuid4())
+    with psycopg.connect(url, autocommit=True) as conn:
+        conn.execute(SUPABASE_ROLES)
+        conn.execute(schema)
+        conn.execute("insert into public.products (id, stock) values (%s, 300)", (product_id,))
+    rng = random.Random(5)
+    orders = [(f"sql_order_{product_id}_{index}", rng.randint(1, 3)) for index in range(2000)]
+    workers = 32
+
+    def checkout(worker: int) -> list:
+        """One session reserving every `workers`-th order"""
+        taken = []
+        with psycopg.connect(url, autocommit=True) as conn:
+            for order_id, quantity in orders[worker::workers]:
+                remaining = conn.execute(
+                    "select public.reserve_stock(%s, %s, %s, 60)", (order_id, product_id, quantity)
+                ).fetchone()[0]
+                taken.append(quantity if remaining is not None else 0)
+        return taken
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            taken = [quantity for batch in pool.map(checkout, range(workers)) for quantity in batch]
+        with psycopg.connect(url, autocommit=True) as conn:
+            stock = conn.execute("select stock from public.products where id = %s", (product_id,)).fetchone()[0]
+            held = conn.execute(
+                "select coalesce(sum(quantity), 0) from public.stock_reservations where product_id = %s",
+                (product_id,)
+            ).fetchone()[0]
+    finally:
+        with psycopg.connect(url, autocommit=True) as conn:
+            conn.execute("delete from public.products where id = %s", (product_id,))
+
+    assert stock >= 0
+    assert sum(taken) == 300 - stock == held